@@ -24,33 +24,58 @@ Perubahan KECIL dan TERPUSAT (agar tidak mengirim lot lama):
 # IMPORTS
 # -----------------------------------------
 import os
-import json
 import time
 import html
 import logging
+import sys
+import itertools
 import traceback
-from typing import Optional, List, Dict, Any, Set
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Any, Set, Callable, Tuple
 from datetime import datetime
 
 import requests
 from dotenv import load_dotenv
 
+from filters import FilterEngine, rules_from_env
+import jsoncodec
+from caption_budget import CAPTION_LIMIT, MESSAGE_LIMIT, visible_len, fit_items, clip_plain
+from subscribers import registry_from_env
+import retry
+from retry import CircuitOpenError, LIST_POLICY, DETAIL_POLICY, PHOTO_POLICY, TELEGRAM_POLICY
+from archive import LotArchive, ARCHIVE_FILE
+from reminders import ReminderScheduler, REMINDER_OFFSETS, parse_end, default_path as default_reminders_path
+from delivery_queue import DeliveryQueue, DeliveryWorker, QUEUE_FILE, drain
+from pipeline import Pipeline, Stage
+from fetch_plan import FetchPlanner, FieldCoverage, DETAIL, DETAIL_RETRY, default_path as default_plan_path
+from digest import DIGEST_ALBUM_SIZE, use_digest, group_lots, pack_digest, digest_id
+from sharding import LeaseKeeper, coordinator_from_env, targets_from_env, seed_marker
+from memory_budget import budget_from_env
+from dedupe import DEDUPE_MODE, index_from_env as dedupe_index_from_env
+from seen_filter import SeenFilter, SeenHistory
+from freshness import tracker_from_env as freshness_tracker_from_env
+
 # -----------------------------------------
 # CONFIGURATION
 # -----------------------------------------
 load_dotenv()
 
 # Endpoint untuk mengambil list (sudah digunakan sebelumnya dan stabil)
-API_URL = (
+API_URL = os.getenv("API_URL", (
     "https://api.lelang.go.id/api/v1/landing-page-kpknl/6705ef6e-f64f-11ed-b3e2-5620a0c2ec5a/"
     "katalog-lot-lelang?namakategori[]=Mobil&namakategori[]=Motor"
-)
+))
 
 # Detail endpoint (pakai lotLelangId)
-DETAIL_URL = "https://api.lelang.go.id/api/v1/landing-page/info/{}"  # {} = lotLelangId
+DETAIL_URL = os.getenv("DETAIL_URL", "https://api.lelang.go.id/api/v1/landing-page/info/{}")  # {} = lotLelangId
 
 # Photo base host (foto di-field fileUrl biasanya relatif, prefix ini)
-BASE_PHOTO_URL = "https://file.lelang.go.id"
+BASE_PHOTO_URL = os.getenv("BASE_PHOTO_URL", "https://file.lelang.go.id")
+
+# Halaman yang dikunjungi dulu untuk cookie, dan base Bot API Telegram
+# (bisa diarahkan ke server lokal untuk test / Bot API server sendiri)
+SITE_URL = os.getenv("SITE_URL", "https://lelang.go.id")
+TELEGRAM_API = os.getenv("TELEGRAM_API", "https://api.telegram.org").rstrip("/")
 
 # Telegram
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
@@ -71,6 +96,29 @@ USER_AGENT = (
 # Timeout untuk HTTP
 HTTP_TIMEOUT = int(os.getenv("HTTP_TIMEOUT", "18"))
 
+# Pipeline per-lot: jumlah thread tahap detail / foto, ukuran antrian antar tahap,
+# dan jumlah download foto paralel per lot
+DETAIL_WORKERS = int(os.getenv("DETAIL_WORKERS", "2"))
+PHOTO_STAGE_WORKERS = int(os.getenv("PHOTO_STAGE_WORKERS", "2"))
+PIPELINE_QUEUE = int(os.getenv("PIPELINE_QUEUE", "4"))
+PHOTO_DOWNLOAD_WORKERS = int(os.getenv("PHOTO_DOWNLOAD_WORKERS", str(MAX_PHOTOS_UPLOAD)))
+
+# Batas memori run (MEMORY_BUDGET_MB, MAX_INFLIGHT_LOTS, PHOTO_BYTES_BUDGET_MB, MAX_PHOTO_MB)
+MEMORY = budget_from_env()
+
+# Deteksi lot yang hampir sama (dilelang ulang / KPKNL lain): off|flag|suppress|note
+DEDUPE = dedupe_index_from_env()
+
+# Timestamp per lot (first seen -> detail -> foto -> antrian -> terkirim); FRESHNESS_FILE="" = mati
+FRESHNESS = freshness_tracker_from_env()
+
+# Hedge detail GET: kalau > N detik belum balas, kirim request kedua (0 = mati)
+DETAIL_HEDGE_AFTER = float(os.getenv("DETAIL_HEDGE_AFTER", "0")) or None
+
+# Filter rule (opsional). Hanya aktif kalau FILTER_RULES_FILE diset; tanpa itu
+# semua lot dari API_URL dikirim seperti sebelumnya.
+FILTER = FilterEngine(rules_from_env() if os.getenv("FILTER_RULES_FILE") else [])
+
 # Logging config (format mirip log yang kamu kirim)
 logging.basicConfig(
     level=logging.DEBUG,
@@ -83,6 +131,9 @@ logger = logging.getLogger(__name__)
 if not TELEGRAM_TOKEN or not TELEGRAM_CHAT_ID:
     raise Exception("Set TELEGRAM_TOKEN dan TELEGRAM_CHAT_ID di environment variables!")
 
+# Subscriber: SUBSCRIBERS_FILE (banyak chat, filter per chat) atau TELEGRAM_CHAT_ID saja
+SUBSCRIBERS = registry_from_env(TELEGRAM_CHAT_ID)
+
 # -----------------------------------------
 # HELPERS: seen file
 # -----------------------------------------
@@ -90,8 +141,8 @@ if not TELEGRAM_TOKEN or not TELEGRAM_CHAT_ID:
 
 def load_seen() -> Set[str]:
     try:
-        with open(SEEN_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        with open(SEEN_FILE, "rb") as f:
+            data = jsoncodec.load(f)
             # normalisasi semua entry ke string agar perbandingan stabil
             if isinstance(data, list):
                 seen = set(str(x) for x in data if x is not None)
@@ -114,9 +165,9 @@ def save_seen(seen: Set[str]):
     try:
         # simpan secara atomik: tulis ke file .tmp lalu replace
         tmp = SEEN_FILE + ".tmp"
-        with open(tmp, "w", encoding="utf-8") as f:
+        with open(tmp, "wb") as f:
             # pastikan menyimpan list yang stabil (string)
-            json.dump(sorted(list(seen)), f, ensure_ascii=False, indent=2)
+            jsoncodec.dump(sorted(list(seen)), f, pretty=True)
         # atomic replace
         os.replace(tmp, SEEN_FILE)
         logger.info(f"Disimpan {len(seen)} lot ke {SEEN_FILE}")
@@ -170,6 +221,11 @@ def make_session() -> requests.Session:
     have cookies/referrer similar to a real browser (helps bypass hotlink protections).
     """
     s = requests.Session()
+    # session dipakai bersama oleh thread pipeline + download foto paralel
+    pool = DETAIL_WORKERS + PHOTO_STAGE_WORKERS * max(1, PHOTO_DOWNLOAD_WORKERS) + 2
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=max(10, pool))
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
     s.headers.update({
         "User-Agent": USER_AGENT,
         "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
@@ -177,26 +233,26 @@ def make_session() -> requests.Session:
     })
     try:
         # initial visit to root to get cookies and any server-side session
-        s.get("https://lelang.go.id", timeout=HTTP_TIMEOUT)
+        s.get(SITE_URL, timeout=HTTP_TIMEOUT)
         logger.debug("Initial site visit done to acquire cookies and session headers")
     except Exception as e:
         logger.debug(f"Initial site visit failed (non-fatal): {e}")
     return s
 
 
-def fetch_list(session: requests.Session) -> List[Dict[str, Any]]:
-    """Fetch the list of lots from API_URL. Return list of lot dicts.
+def fetch_list(session: requests.Session, url: str = API_URL) -> List[Dict[str, Any]]:
+    """Fetch the list of lots from API_URL (or a shard's catalog `url`). Return list of lot dicts.
 
     Uses GET on the API_URL (this is the same URL you used previously and works reliably).
     """
     try:
-        logger.debug(f"Fetching list -> {API_URL}")
-        r = session.get(API_URL, timeout=HTTP_TIMEOUT, headers={"User-Agent": USER_AGENT})
+        logger.debug(f"Fetching list -> {url}")
+        r = retry.get(session, url, LIST_POLICY, timeout=HTTP_TIMEOUT, headers={"User-Agent": USER_AGENT})
         logger.debug(f"List fetch status: {r.status_code} {r.reason}")
         if r.status_code != 200:
             logger.warning(f"List fetch returned status {r.status_code}")
             return []
-        payload = r.json()
+        payload = jsoncodec.response_json(r)
         data = payload.get("data", []) if isinstance(payload, dict) else []
         logger.info(f"Ditemukan {len(data)} lot di API")
         return data
@@ -205,11 +261,14 @@ def fetch_list(session: requests.Session) -> List[Dict[str, Any]]:
         return []
 
 
-def fetch_detail(session: requests.Session, lot_id: str, referer: Optional[str] = None) -> Dict[str, Any]:
+def fetch_detail(session: requests.Session, lot_id: str, referer: Optional[str] = None, planner: Optional[FetchPlanner] = None) -> Dict[str, Any]:
     """Fetch detail for a lot. Will retry and try a couple of fallbacks.
 
-    If seller missing, we will try another attempt using a referer header to emulate
-    browser navigation from the detail page (some servers show more data).
+    Transport errors / 5xx / 429 are retried by `retry.get` (jittered backoff, circuit
+    breaker per host, optional hedging). If seller missing, we will try another attempt
+    using a referer header to emulate browser navigation from the detail page
+    (some servers show more data). With a `planner`, field coverage of every response
+    is recorded and that retry stops once it is known never to bring the seller.
     """
     if not lot_id:
         return {}
@@ -225,54 +284,60 @@ def fetch_detail(session: requests.Session, lot_id: str, referer: Optional[str]
                 headers["Referer"] = "https://lelang.go.id/"
 
             logger.debug(f"Fetch detail attempt {attempt} for {lot_id} -> {url}")
-            resp = session.get(url, timeout=HTTP_TIMEOUT, headers=headers)
+            resp = retry.get(session, url, DETAIL_POLICY, hedge_after=DETAIL_HEDGE_AFTER, timeout=HTTP_TIMEOUT, headers=headers)
             logger.debug(f"Detail fetch status {resp.status_code} for {lot_id}")
 
             if resp.status_code == 200:
                 # parse
                 try:
-                    payload = resp.json()
+                    payload = jsoncodec.response_json(resp)
                     data = payload.get("data", {}) if isinstance(payload, dict) else {}
                     logger.info(f"Berhasil fetch detail {lot_id} (size: {len(resp.content)} bytes)")
-                    # quick heuristic: if seller is present, return; else try again with referer
-                    seller_present = (
-                        bool(data.get("content", {}).get("seller"))
-                        or bool(data.get("seller"))
-                        or bool(data.get("namaPenjual"))
-                        or bool(data.get("namaOrganisasiPenjual"))
-                    )
-                    if seller_present:
+                    if planner is not None:
+                        planner.observe(DETAIL if attempt == 1 else DETAIL_RETRY, data)
+                        retry_seller = planner.should_retry_seller(data)
+                    else:
+                        # quick heuristic: if seller is present, return; else try again with referer
+                        retry_seller = not (
+                            bool(data.get("content", {}).get("seller"))
+                            or bool(data.get("seller"))
+                            or bool(data.get("namaPenjual"))
+                            or bool(data.get("namaOrganisasiPenjual"))
+                        )
+                    if not retry_seller:
                         return data
                     # else: maybe server needs referer/extra headers, try again with referer pointing to detail page
                     if attempt < attempts:
                         logger.debug(f"Detail {lot_id} missing seller data; will retry with stronger headers")
-                        # small backoff
-                        time.sleep(0.6)
+                        DETAIL_POLICY.sleep(attempt)
                         continue
                     return data
                 except Exception as e:
                     logger.warning(f"JSON parse error for detail {lot_id}: {e}")
                     return {}
-            else:
-                # if 404, try small fallback patterns (some endpoints vary)
-                if resp.status_code == 404:
-                    # try alternate possible endpoint (legacy). Non-fatal.
-                    alt = f"https://api.lelang.go.id/api/v1/lot-lelang/{lot_id}"
-                    try:
-                        logger.debug(f"Trying alternate detail endpoint -> {alt}")
-                        r2 = session.get(alt, timeout=HTTP_TIMEOUT, headers={"User-Agent": USER_AGENT})
-                        if r2.status_code == 200:
-                            payload = r2.json()
-                            data = payload.get("data", {}) if isinstance(payload, dict) else {}
-                            return data
-                    except Exception:
-                        pass
-                # on other errors, wait before retrying
-                logger.warning(f"Fetch detail gagal {lot_id}, status {resp.status_code}")
-                time.sleep(0.4)
+
+            # if 404, try small fallback patterns (some endpoints vary)
+            if resp.status_code == 404:
+                # try alternate possible endpoint (legacy). Non-fatal.
+                alt = f"https://api.lelang.go.id/api/v1/lot-lelang/{lot_id}"
+                try:
+                    logger.debug(f"Trying alternate detail endpoint -> {alt}")
+                    r2 = retry.get(session, alt, DETAIL_POLICY, timeout=HTTP_TIMEOUT, headers={"User-Agent": USER_AGENT})
+                    if r2.status_code == 200:
+                        payload = jsoncodec.response_json(r2)
+                        data = payload.get("data", {}) if isinstance(payload, dict) else {}
+                        return data
+                except Exception:
+                    pass
+            # retries for transient errors already happened inside retry.get
+            logger.warning(f"Fetch detail gagal {lot_id}, status {resp.status_code}")
+            return {}
+        except CircuitOpenError as e:
+            logger.warning(f"Lewati fetch detail {lot_id}: {e}")
+            return {}
         except Exception as e:
             logger.warning(f"Exception during fetch_detail {lot_id}: {e}")
-            time.sleep(0.4)
+            return {}
     logger.warning(f"Gagal fetch detail setelah {attempts} percobaan: {lot_id}")
     return {}
 
@@ -351,9 +416,14 @@ def build_uraian(detail: Dict[str, Any]) -> str:
 
     We iterate all items in content.barangs, and produce multiline descriptive text per item.
     """
+    return "\n".join(build_uraian_items(detail)) or "-"
+
+
+def build_uraian_items(detail: Dict[str, Any]) -> List[str]:
+    """One multiline text block per barang (unescaped), see `build_uraian`."""
     items = detail.get("content", {}).get("barangs", []) if isinstance(detail.get("content", {}), dict) else []
     if not items:
-        return "-"
+        return []
 
     lines = []
     for b in items:
@@ -390,7 +460,7 @@ def build_uraian(detail: Dict[str, Any]) -> str:
 
         lines.append("\n".join(part))
 
-    return "\n".join(lines)
+    return lines
 
 
 # -----------------------------------------
@@ -415,7 +485,7 @@ def download_photo_bytes(session: requests.Session, photo_url: str, referer: Opt
     We implement a couple of header strategies to bypass hotlink / 403:
     - strategy 1: standard UA + Referer https://lelang.go.id
     - strategy 2: include same-origin referer to detail page (if provided)
-    - strategy 3: small delay and retry
+    - strategy 3: jittered backoff and retry (PHOTO_POLICY)
     """
     if not photo_url:
         return None
@@ -424,60 +494,97 @@ def download_photo_bytes(session: requests.Session, photo_url: str, referer: Opt
     if not resolved:
         return None
 
-    # try a few mirror headers / attempts
-    attempts = 3
-    for attempt in range(1, attempts + 1):
-        try:
-            headers = {
-                "User-Agent": USER_AGENT,
-                "Accept": "image/avif,image/webp,image/apng,image/*,*/*;q=0.8",
-                "Referer": referer or "https://lelang.go.id/",
-            }
-            logger.debug(f"Attempting download ({attempt}) for {resolved} with Referer={headers['Referer']}")
-            resp = session.get(resolved, headers=headers, timeout=HTTP_TIMEOUT, stream=True, allow_redirects=True)
-            status = getattr(resp, "status_code", None)
-            logger.debug(f"Download status: {status} for {resolved}")
-
-            if status == 200:
-                content = resp.content
-                logger.info(f"Berhasil download photo {resolved} (size {len(content)} bytes)")
-                return content
-            else:
-                logger.warning(f"Gagal download photo {resolved}, status {status}")
-                # small backoff, but if 403 keep trying — kadang cookie/Referer needed
-                time.sleep(0.25 * attempt)
-                continue
-        except Exception as e:
-            logger.warning(f"Exception saat download photo {resolved}: {e}")
-            time.sleep(0.25)
-            continue
-    logger.warning(f"Gagal download photo setelah {attempts} percobaan: {resolved}")
+    headers = {
+        "User-Agent": USER_AGENT,
+        "Accept": "image/avif,image/webp,image/apng,image/*,*/*;q=0.8",
+        "Referer": referer or "https://lelang.go.id/",
+    }
+    try:
+        logger.debug(f"Attempting download for {resolved} with Referer={headers['Referer']}")
+        # retry (termasuk 403, kadang cookie/Referer needed) ditangani PHOTO_POLICY
+        resp = retry.get(session, resolved, PHOTO_POLICY, headers=headers, timeout=HTTP_TIMEOUT, stream=True, allow_redirects=True)
+        status = getattr(resp, "status_code", None)
+        logger.debug(f"Download status: {status} for {resolved}")
+
+        if status == 200:
+            content = read_capped(resp, MEMORY.max_photo_bytes)
+            if content is None:
+                logger.warning(f"Foto {resolved} lebih besar dari MAX_PHOTO_MB, kirim lewat URL saja")
+                return None
+            logger.info(f"Berhasil download photo {resolved} (size {len(content)} bytes)")
+            return content
+        resp.close()
+        logger.warning(f"Gagal download photo {resolved}, status {status}")
+    except CircuitOpenError as e:
+        logger.warning(f"Lewati download photo {resolved}: {e}")
+    except Exception as e:
+        logger.warning(f"Exception saat download photo {resolved}: {e}")
+    logger.warning(f"Gagal download photo setelah {PHOTO_POLICY.attempts} percobaan: {resolved}")
     return None
 
 
-def send_photo_binary(photo_bytes: bytes, caption: str) -> bool:
-    url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendPhoto"
+def read_capped(resp: requests.Response, limit: Optional[int]) -> Optional[bytes]:
+    """Read a streamed body, giving up (None) as soon as it exceeds `limit` bytes."""
+    try:
+        if limit is None:
+            return resp.content
+        length = resp.headers.get("Content-Length")
+        if length and length.isdigit() and int(length) > limit:
+            return None
+        buf = bytearray()
+        for chunk in resp.iter_content(64 * 1024):
+            buf += chunk
+            if len(buf) > limit:
+                return None
+        return bytes(buf)
+    finally:
+        resp.close()
+
+
+def upload_photo(photo_bytes: bytes, caption: str, chat_id: Optional[str] = None) -> Optional[str]:
+    """Upload photo bytes via multipart sendPhoto. Return Telegram's file_id on success.
+
+    Returns "" when the upload succeeded but no file_id could be read, None on failure.
+    The file_id lets us re-send the same photo to other chats without uploading again.
+    """
+    url = f"{TELEGRAM_API}/bot{TELEGRAM_TOKEN}/sendPhoto"
     try:
         files = {"photo": ("photo.jpg", photo_bytes)}
-        data = {"chat_id": TELEGRAM_CHAT_ID, "caption": caption, "parse_mode": "HTML"}
-        r = requests.post(url, data=data, files=files, timeout=HTTP_TIMEOUT)
+        data = {"chat_id": chat_id or TELEGRAM_CHAT_ID, "caption": caption, "parse_mode": "HTML"}
+        r = retry.post(url, TELEGRAM_POLICY, data=data, files=files, timeout=HTTP_TIMEOUT)
         logger.debug(f"Telegram sendPhoto (binary) response: {r.status_code} - {r.text}")
         if r.status_code == 200:
             logger.info("sendPhoto success (binary upload).")
-            return True
+            return telegram_file_id(r)
         else:
             logger.warning(f"sendPhoto (binary upload) failed: {r.status_code} - {r.text}")
-            return False
+            return None
     except Exception as e:
         logger.warning(f"Exception during sendPhoto (binary): {e}")
-        return False
+        return None
+
+
+def telegram_file_id(resp: requests.Response) -> str:
+    """Pick the largest photo size's file_id from a sendPhoto response ("" if absent)."""
+    try:
+        sizes = jsoncodec.response_json(resp).get("result", {}).get("photo") or []
+        if not sizes:
+            return ""
+        return sizes[-1].get("file_id") or ""
+    except Exception:
+        return ""
+
 
+def send_photo_binary(photo_bytes: bytes, caption: str, chat_id: Optional[str] = None) -> bool:
+    return upload_photo(photo_bytes, caption, chat_id) is not None
 
-def send_photo_by_url(photo_url: str, caption: str) -> bool:
-    url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendPhoto"
+
+def send_photo_by_url(photo_url: str, caption: str, chat_id: Optional[str] = None) -> bool:
+    """sendPhoto with a URL, or with a file_id from an earlier upload (same field)."""
+    url = f"{TELEGRAM_API}/bot{TELEGRAM_TOKEN}/sendPhoto"
     try:
-        payload = {"chat_id": TELEGRAM_CHAT_ID, "photo": photo_url, "caption": caption, "parse_mode": "HTML"}
-        r = requests.post(url, data=payload, timeout=HTTP_TIMEOUT)
+        payload = {"chat_id": chat_id or TELEGRAM_CHAT_ID, "photo": photo_url, "caption": caption, "parse_mode": "HTML"}
+        r = retry.post(url, TELEGRAM_POLICY, data=payload, timeout=HTTP_TIMEOUT)
         logger.debug(f"Telegram sendPhoto(by URL) response: {r.status_code} - {r.text}")
         if r.status_code == 200:
             logger.info("sendPhoto success (by URL).")
@@ -490,10 +597,10 @@ def send_photo_by_url(photo_url: str, caption: str) -> bool:
         return False
 
 
-def send_text_message(text: str) -> bool:
-    url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
+def send_text_message(text: str, chat_id: Optional[str] = None) -> bool:
+    url = f"{TELEGRAM_API}/bot{TELEGRAM_TOKEN}/sendMessage"
     try:
-        r = requests.post(url, data={"chat_id": TELEGRAM_CHAT_ID, "text": text, "parse_mode": "HTML"}, timeout=HTTP_TIMEOUT)
+        r = retry.post(url, TELEGRAM_POLICY, data={"chat_id": chat_id or TELEGRAM_CHAT_ID, "text": text, "parse_mode": "HTML"}, timeout=HTTP_TIMEOUT)
         if r.status_code == 200:
             logger.info("sendMessage success (text message).")
             return True
@@ -505,47 +612,117 @@ def send_text_message(text: str) -> bool:
         return False
 
 
-def try_send_photos(session: requests.Session, photo_file_urls: List[str], caption: str) -> bool:
-    """Try to send up to MAX_PHOTOS_UPLOAD photos.
+_photo_executor: Optional[ThreadPoolExecutor] = None
 
-    Strategy:
-     - Attempt to download (with referer/cookies) the first up to MAX_PHOTOS_UPLOAD photos.
-     - For each successfully downloaded photo, upload as binary. The first uploaded photo contains the caption.
-     - If no downloaded photo succeeded, try sendPhoto by URL for first photo (may still fail).
-     - If everything fails, return False.
+
+def _photo_pool() -> ThreadPoolExecutor:
+    global _photo_executor
+    if _photo_executor is None:
+        _photo_executor = ThreadPoolExecutor(max_workers=PHOTO_DOWNLOAD_WORKERS * max(1, PHOTO_STAGE_WORKERS), thread_name_prefix="photo")
+    return _photo_executor
+
+
+def download_photos(session: requests.Session, photo_file_urls: List[str]) -> List[Dict[str, Any]]:
+    """Download up to MAX_PHOTOS_UPLOAD photos once; the bytes are reused for every chat.
+
+    Returns media dicts {"url", "data", "file_id"} (same shape as delivery_queue media).
+    If no download succeeded, the first URL is returned without data so the sender can
+    still fall back to sendPhoto by URL.
     """
-    if not photo_file_urls:
-        logger.debug("No photo URLs provided to try_send_photos")
+    resolved_urls = [resolve_photo_url(u) for u in photo_file_urls[:MAX_PHOTOS_UPLOAD] if u]
+    # Download the photo bytes using session (with referer pointing to root), paralel
+    # per lot; map() menjaga urutan foto sehingga foto pertama tetap membawa caption
+    fetch = lambda resolved: download_photo_bytes(session, resolved, referer="https://lelang.go.id/")
+    if len(resolved_urls) > 1 and PHOTO_DOWNLOAD_WORKERS > 1:
+        results = list(_photo_pool().map(fetch, resolved_urls))
+    else:
+        results = [fetch(u) for u in resolved_urls]
+    media = []
+    for resolved, photo_bytes in zip(resolved_urls, results):
+        if photo_bytes:
+            media.append({"url": resolved, "data": photo_bytes, "file_id": None})
+        else:
+            logger.debug(f"Download returned no bytes for {resolved}, will try next photo")
+    if not media and photo_file_urls:
+        first = resolve_photo_url(photo_file_urls[0])
+        if first:
+            media.append({"url": first, "data": None, "file_id": None})
+    return media
+
+
+def send_media_group(media: List[Dict[str, Any]], caption: str, chat_id: Optional[str] = None) -> bool:
+    """Send 2-10 photos as one album (sendMediaGroup); caption goes on the first photo.
+
+    Each item is sent by file_id if known, else uploaded from its bytes (attach://),
+    else by URL. file_ids from the response are written back into the media dicts.
+    """
+    url = f"{TELEGRAM_API}/bot{TELEGRAM_TOKEN}/sendMediaGroup"
+    items, files = [], {}
+    for i, m in enumerate(media[:10]):
+        if m.get("file_id"):
+            ref = m["file_id"]
+        elif m.get("data"):
+            ref = f"attach://photo{i}"
+            files[f"photo{i}"] = (f"photo{i}.jpg", m["data"])
+        else:
+            ref = m.get("url")
+        item = {"type": "photo", "media": ref}
+        if not items and caption:
+            item.update(caption=caption, parse_mode="HTML")
+        items.append(item)
+    try:
+        data = {"chat_id": chat_id or TELEGRAM_CHAT_ID, "media": jsoncodec.dumps_str(items)}
+        r = retry.post(url, TELEGRAM_POLICY, data=data, files=files or None, timeout=HTTP_TIMEOUT)
+        if r.status_code != 200:
+            logger.warning(f"sendMediaGroup gagal: {r.status_code} - {r.text}")
+            return False
+        try:
+            for m, sent in zip(media, jsoncodec.response_json(r).get("result") or []):
+                sizes = sent.get("photo") or []
+                if sizes and not m.get("file_id"):
+                    m["file_id"] = sizes[-1].get("file_id")
+        except Exception:
+            pass
+        logger.info(f"sendMediaGroup sukses ({len(items)} foto)")
+        return True
+    except Exception as e:
+        logger.warning(f"Exception during sendMediaGroup: {e}")
         return False
 
+
+def deliver_photos(media: List[Dict[str, Any]], caption: str, chat_id: Optional[str] = None) -> bool:
+    """Send already-downloaded photos to one chat.
+
+    A photo is uploaded as binary only once: the returned file_id is written back
+    into its media dict, and later chats re-send it by file_id. The first delivered
+    photo carries the caption.
+    If nothing could be sent, fall back to sendPhoto by URL for the first photo.
+    """
     uploaded_any = False
-    tried = 0
 
-    # Limit how many photos we attempt to download/upload
-    for idx, fileurl in enumerate(photo_file_urls[:MAX_PHOTOS_UPLOAD]):
-        if not fileurl:
+    for m in media:
+        # For the first successful upload, include caption. Subsequent photos send without caption.
+        cap = caption if not uploaded_any else ""
+        if m.get("file_id"):
+            ok = send_photo_by_url(m["file_id"], cap, chat_id)
+        elif m.get("data"):
+            fid = upload_photo(m["data"], cap, chat_id)
+            ok = fid is not None
+            if fid:
+                m["file_id"] = fid
+        else:
             continue
-        tried += 1
-        resolved = resolve_photo_url(fileurl)
-        # Download the photo bytes using session (with referer pointing to root)
-        photo_bytes = download_photo_bytes(session, resolved, referer="https://lelang.go.id/")
-        if photo_bytes:
-            # For the first successful upload, include caption. Subsequent photos send without caption.
-            cap = caption if not uploaded_any else ""
-            ok = send_photo_binary(photo_bytes, cap if cap else "")
-            if ok:
-                uploaded_any = True
-            else:
-                logger.debug("Binary upload failed for a photo, will try next one")
+        if ok:
+            uploaded_any = True
         else:
-            logger.debug(f"Download returned no bytes for {resolved}, will try next photo")
+            logger.debug("Upload failed for a photo, will try next one")
 
     # If we didn't manage any binary upload, as fallback try sendPhoto by URL for first photo
-    if not uploaded_any and photo_file_urls:
-        first = resolve_photo_url(photo_file_urls[0])
+    if not uploaded_any and media:
+        first = media[0].get("url")
         if first:
             logger.debug(f"Attempting fallback sendPhoto by URL: {first}")
-            ok = send_photo_by_url(first, caption)
+            ok = send_photo_by_url(first, caption, chat_id)
             if ok:
                 uploaded_any = True
     # Return whether we successfully sent any photo
@@ -554,6 +731,63 @@ def try_send_photos(session: requests.Session, photo_file_urls: List[str], capti
     return uploaded_any
 
 
+def try_send_photos(session: requests.Session, photo_file_urls: List[str], caption: str, chat_id: Optional[str] = None) -> bool:
+    """Try to send up to MAX_PHOTOS_UPLOAD photos to a single chat.
+
+    Strategy:
+     - Attempt to download (with referer/cookies) the first up to MAX_PHOTOS_UPLOAD photos.
+     - For each successfully downloaded photo, upload as binary. The first uploaded photo contains the caption.
+     - If no downloaded photo succeeded, try sendPhoto by URL for first photo (may still fail).
+     - If everything fails, return False.
+    """
+    if not photo_file_urls:
+        logger.debug("No photo URLs provided to try_send_photos")
+        return False
+    media = download_photos(session, photo_file_urls)
+    return deliver_photos(media, caption, chat_id)
+
+
+def deliver_message(msg: Dict[str, Any], media: List[Dict[str, Any]]) -> bool:
+    """Delivery-queue sender: photos first (binary / file_id / URL), else text only."""
+    chat_id = msg["chat_id"]
+    text = msg["text"]
+    followup = msg.get("followup")
+    if msg.get("kind") == "album" and media:
+        # album cover mode digest; satu foto saja tidak bisa jadi media group
+        if len(media) >= 2:
+            return send_media_group(media, text, chat_id)
+        return deliver_photos(media, text, chat_id)
+    if msg.get("kind") == "photo" and media:
+        try:
+            if deliver_photos(media, text, chat_id):
+                if not followup or send_text_message(followup, chat_id):
+                    return True
+                # foto sudah terkirim: retry berikutnya cukup kirim teks lanjutannya
+                msg.update(kind="text", text=followup, followup=None)
+                return False
+        except Exception as e:
+            logger.warning(f"Error saat mencoba kirim foto {msg.get('idem_key')}: {e} - akan fallback ke text\n{traceback.format_exc()}")
+    # text-only: pakai teks lengkap (followup) kalau ada, caption pendek tidak perlu
+    return send_text_message(followup or text, chat_id)
+
+
+def deliver_and_track(msg: Dict[str, Any], media: List[Dict[str, Any]]) -> bool:
+    """`deliver_message` + freshness mark for the lot(s) a message announced.
+
+    Only lot messages and digest parts count as delivery; a reminder also
+    carries `lot_id` but goes out hours after the lot was first sent.
+    """
+    ok = deliver_message(msg, media)
+    if ok and FRESHNESS is not None:
+        key = msg.get("idem_key") or ""
+        if key.startswith("lot:"):
+            FRESHNESS.mark(msg.get("lot_id"), "delivered")
+        elif key.startswith("digest:"):
+            for lot_id in jsoncodec.loads(msg.get("lot_ids") or "[]"):
+                FRESHNESS.mark(lot_id, "delivered")
+    return ok
+
+
 # -----------------------------------------
 # CORE: prepare and send lot message
 # -----------------------------------------
@@ -572,7 +806,7 @@ def build_caption_html(title: str, lokasi: str, instansi: str, seller: Dict[str,
     parts.append(f"💰 Nilai limit: Rp {money(nilai_limit)}")
     parts.append(f"💵 Uang jaminan: Rp {money(uang_jaminan)}")
     parts.append(f"⚖️ Cara penawaran: {esc(cara_penawaran)}")
-    parts.append(f"📦 Barang:\n{esc(uraian).replace('\n', '\n')}")
+    parts.append("📦 Barang:\n" + esc(uraian))
     parts.append(f"🏦 Organizer: {esc(organizer_info)}")
     parts.append(f"👁️ Dilihat: {views}")
     # Link as HTML anchor
@@ -582,43 +816,138 @@ def build_caption_html(title: str, lokasi: str, instansi: str, seller: Dict[str,
     return caption
 
 
-def send_lot(session: requests.Session, lot: Dict[str, Any]) -> bool:
-    """Send a single lot to Telegram. Returns True if sent (either photo or text).
+def build_minimal_caption_html(title: str, lokasi: str, instansi: str, start: str, end: str, nilai_limit: str, link: str) -> str:
+    # Short form: used when detail is missing, and as photo caption when the full text is too long
+    return (
+        f"{esc(title)}\n"
+        f"📍 Lokasi: {esc(lokasi)}\n"
+        f"🏢 Instansi: {esc(instansi)}\n"
+        f"🗓 {esc(start)} → {esc(end)}\n"
+        f"💰 Nilai limit: Rp {money(nilai_limit)}\n"
+        f"🔗 <a href=\"{esc(link)}\">Lihat detail lelang</a>"
+    )
+
+
+def plan_lot_message(render: Callable[[str], str], items: List[str], short_caption: str, has_photo: bool) -> Tuple[str, Optional[str]]:
+    """Pick the delivery shape up front so Telegram accepts the first request.
 
-    This is the main function orchestrating detail fetch, content extraction and photo handling.
+    `render(uraian)` builds the full HTML caption for a given uraian text. Returns
+    (text, followup):
+     - photo, full caption <= 1024 (after entity parsing)       -> (full, None)
+     - photo, fits by trimming the barang list + "+N lainnya"    -> (trimmed, None)
+     - photo, still too long (long seller block etc.)           -> (short caption, full text)
+     - no photo: full text trimmed to 4096 if needed             -> (text, None)
+    """
+    def render_items(shown: List[str], hidden: int) -> str:
+        uraian = "\n".join(shown) or "-"
+        if hidden:
+            uraian += f"\n… +{hidden} barang lainnya (lihat detail)"
+        return render(uraian)
+
+    full_text = fit_items(render_items, items, MESSAGE_LIMIT) or clip_plain(render_items(items, 0), MESSAGE_LIMIT)
+    if not has_photo:
+        return full_text, None
+
+    caption = fit_items(render_items, items, CAPTION_LIMIT)
+    if caption is not None:
+        if caption != render_items(items, 0):
+            logger.debug(f"Caption dipangkas ke {visible_len(caption)} karakter (limit {CAPTION_LIMIT})")
+        return caption, None
+    logger.debug("Caption terlalu panjang walau uraian dipangkas, kirim caption pendek + teks lanjutan")
+    return clip_plain(short_caption, CAPTION_LIMIT), full_text
+
+
+def lot_link(lot: Dict[str, Any]) -> str:
+    # Link to public page (for user convenience). Use unitKerjaId if available
+    lot_id = lot.get("lotLelangId") or lot.get("id")
+    unit_id = lot.get("unitKerjaId") or lot.get("unitKerja") or ""
+    return f"https://lelang.go.id/kpknl/{unit_id}/detail-auction/{lot_id}" if unit_id else f"https://lelang.go.id/detail-auction/{lot_id}"
+
+
+def lot_idem_key(lot_id: str, chat_id: str) -> str:
+    return f"lot:{lot_id}:chat:{chat_id}"
+
+
+def prepare_lot(session: requests.Session, lot: Dict[str, Any], archive: Optional[LotArchive] = None, planner: Optional[FetchPlanner] = None) -> Optional[Dict[str, Any]]:
+    """Detail stage: fetch detail and build everything needed for the message except photos.
+
+    Detail is skipped for lots no subscriber filter can match. With a `planner`,
+    detail is only fetched when the list item lacks fields the template needs;
+    otherwise the list item itself is used as the detail payload.
+    Returns a job dict for `attach_media` / `enqueue_lot`, or None if the lot has no id.
     """
     lot_id = lot.get("lotLelangId") or lot.get("id")
     if not lot_id:
         logger.warning("Lot tanpa id, dilewati")
-        return False
+        return None
+
+    link = lot_link(lot)
+
+    # 0) Cocokkan subscriber dari item list dulu: lot yang tetap tidak cocok walaupun
+    # barangs/seller dari detail ikut dihitung tidak perlu di-fetch detail-nya
+    if not SUBSCRIBERS.candidate_chat_ids(lot):
+        logger.debug(f"Lot {lot_id} tidak mungkin cocok dengan subscriber manapun, detail tidak di-fetch")
+        return build_job(lot, {})
+
+    # 1) Fetch detail (kalau item list belum cukup untuk template)
+    if planner is not None and not planner.needs_detail(lot):
+        logger.debug(f"Item list {lot_id} sudah memuat semua field template, detail tidak di-fetch")
+        detail = lot
+    else:
+        detail = fetch_detail(session, lot_id, referer=link, planner=planner)
+    if FRESHNESS is not None:
+        FRESHNESS.mark(str(lot_id), "detail")
+    if detail and detail is not lot and archive is not None:
+        try:
+            archive.add_detail(lot, detail)
+        except Exception as e:
+            logger.warning(f"Gagal arsip detail {lot_id}: {e}")
+
+    job = build_job(lot, detail)
+    if DEDUPE is not None:
+        try:
+            job["duplicate"] = DEDUPE.observe(lot, detail, link)
+        except Exception as e:
+            logger.warning(f"Gagal cek dedupe {lot_id}: {e}")
+        if job.get("duplicate"):
+            logger.info(f"Lot {lot_id} mirip lot {job['duplicate'].lot_id} ({job['duplicate'].reason}), mode {DEDUPE_MODE}")
+    return job
+
+
+def duplicate_line(match) -> str:
+    if match.link:
+        return f"♻️ <i>Kemungkinan lot ulang dari</i> <a href=\"{esc(match.link)}\">{esc(match.title)}</a>"
+    return f"♻️ <i>Kemungkinan lot ulang dari</i> {esc(match.title)}"
 
+
+def build_job(lot: Dict[str, Any], detail: Dict[str, Any]) -> Dict[str, Any]:
+    """Everything needed to render a lot's message from its list item + (maybe empty) detail.
+
+    No network I/O; shared by `prepare_lot` and the asyncio engine.
+    """
+    lot_id = lot.get("lotLelangId") or lot.get("id")
     title = lot.get("namaLotLelang") or lot.get("nama") or "(tanpa judul)"
     lokasi = lot.get("namaLokasi") or lot.get("lokasi") or "(tidak diketahui)"
     instansi = lot.get("namaUnitKerja") or lot.get("instansi") or "(tidak diketahui)"
     start = format_date_iso(lot.get("tglMulaiLelang") or lot.get("tglMulai") )
     end = format_date_iso(lot.get("tglSelesaiLelang") or lot.get("tglSelesai"))
     nilai_limit = lot.get("nilaiLimit") or lot.get("nilai_limit") or 0
-
-    # Link to public page (for user convenience). Use unitKerjaId if available
-    unit_id = lot.get("unitKerjaId") or lot.get("unitKerja") or ""
-    link = f"https://lelang.go.id/kpknl/{unit_id}/detail-auction/{lot_id}" if unit_id else f"https://lelang.go.id/detail-auction/{lot_id}"
-
-    # 1) Fetch detail
-    detail = fetch_detail(session, lot_id, referer=link)
-
-    # If detail is empty, we still try to compose a minimal message from list item
-    if not detail:
-        logger.warning(f"Detail kosong untuk {lot_id}, mengirim info minimal")
-        caption_min = (
-            f"{esc(title)}\n"
-            f"📍 Lokasi: {esc(lokasi)}\n"
-            f"🏢 Instansi: {esc(instansi)}\n"
-            f"🗓 {esc(start)} → {esc(end)}\n"
-            f"💰 Nilai limit: Rp {money(nilai_limit)}\n"
-            f"🔗 <a href=\"{esc(link)}\">Lihat detail lelang</a>"
-        )
-        send_text_message(caption_min)
-        return True
+    link = lot_link(lot)
+
+    job = {
+        "lot": lot,
+        "lot_id": str(lot_id),
+        "title": title,
+        "link": link,
+        # Subscriber yang filter-nya cocok (detail ikut dipakai supaya keyword barangs kena)
+        "chat_ids": SUBSCRIBERS.chat_ids(lot, detail or None),
+        "short": build_minimal_caption_html(title, lokasi, instansi, start, end, nilai_limit, link),
+        "detail": bool(detail),
+        "photo_urls": [],
+        "media_keys": [],
+    }
+    if not job["chat_ids"] or not detail:
+        return job
 
     # 2) Extract seller (robust)
     seller = extract_seller(detail, lot)
@@ -630,11 +959,11 @@ def send_lot(session: requests.Session, lot: Dict[str, Any]) -> bool:
     # 4) Uang jaminan: fallback to lot-level if missing
     uang_jaminan = detail.get("uangJaminan") if detail.get("uangJaminan") is not None else lot.get("uangJaminan") or 0
 
-    # 5) Barang / uraian
-    uraian = build_uraian(detail)
+    # 5) Barang / uraian (per item, supaya bisa dipangkas sesuai limit Telegram)
+    job["uraian_items"] = build_uraian_items(detail)
 
     # 6) Organizer
-    organizer = detail.get("content", {}).get("organizer") if isinstance(detail.get("content"), dict) else {}
+    organizer = (detail.get("content", {}).get("organizer") if isinstance(detail.get("content"), dict) else None) or {}
     organizer_info = " / ".join([str(organizer.get("namaUnitKerja") or "-"), str(organizer.get("namaBank") or "-")])
 
     # 7) Views
@@ -642,98 +971,434 @@ def send_lot(session: requests.Session, lot: Dict[str, Any]) -> bool:
 
     # 8) Photos list
     photos = detail.get("photos") or []
-    photo_file_urls = []
     for p in photos:
         if not isinstance(p, dict):
             continue
         f = p.get("file") or {}
         url = f.get("fileUrl") or p.get("fileUrl")
         if url:
-            photo_file_urls.append(url)
+            job["photo_urls"].append(url)
+
+    job["render"] = lambda uraian: build_caption_html(title, lokasi, instansi, seller, start, end, nilai_limit, uang_jaminan, cara_f, uraian, organizer_info, views, link)
+    return job
 
-    # 9) Build caption (HTML)
-    caption_full = build_caption_html(title, lokasi, instansi, seller, start, end, nilai_limit, uang_jaminan, cara_f, uraian, organizer_info, views, link)
 
-    # 10) Try to send photos (binary preferred)
-    sent_any_photo = False
+def attach_media(session: requests.Session, job: Optional[Dict[str, Any]], outbox: DeliveryQueue) -> Optional[Dict[str, Any]]:
+    """Photo stage: download photos ONCE for all subscribers and store them in the outbox.
+
+    Only the media keys travel on to the send stage, not the photo bytes. With a
+    memory budget the lot first waits until its photos fit the photo byte budget.
+    """
+    if not job or not job["photo_urls"]:
+        return job
+    if job.get("duplicate") and DEDUPE_MODE in ("suppress", "note"):
+        # lot ulang tidak dikirim dengan foto
+        return job
     try:
-        if photo_file_urls:
-            sent_any_photo = try_send_photos(session, photo_file_urls, caption_full)
+        with MEMORY.photo_hold(min(len(job["photo_urls"]), MAX_PHOTOS_UPLOAD)):
+            for m in download_photos(session, job["photo_urls"]):
+                job["media_keys"].append(outbox.put_media(m["data"], m["url"]))
+        if FRESHNESS is not None and job["media_keys"]:
+            FRESHNESS.mark(job["lot_id"], "photos")
     except Exception as e:
-        logger.warning(f"Error saat mencoba kirim foto untuk {lot_id}: {e} - akan fallback ke text\n{traceback.format_exc()}")
+        logger.warning(f"Error saat download foto untuk {job['lot_id']}: {e}\n{traceback.format_exc()}")
+    return job
+
+
+def enqueue_lot(job: Optional[Dict[str, Any]], outbox: DeliveryQueue, reminders: Optional[ReminderScheduler] = None) -> bool:
+    """Send stage: plan the message shape and enqueue it for every matching chat."""
+    if not job:
+        return False
+    lot_id, chat_ids = job["lot_id"], job["chat_ids"]
+    if not chat_ids:
+        logger.info(f"Lot {lot_id} tidak cocok dengan filter subscriber manapun, lewati")
+        return True
+
+    dup = job.get("duplicate")
+    if dup and DEDUPE_MODE == "suppress":
+        logger.info(f"Lot {lot_id} tidak dikirim: duplikat dari {dup.lot_id}")
+        return True
+
+    # Jadwalkan pengingat "selesai dalam ..." untuk chat yang menerima lot ini
+    if reminders is not None:
+        reminders.track(lot_id, parse_end(job["lot"]), job["title"], job["link"], chat_ids)
+
+    if dup and DEDUPE_MODE == "note":
+        # catatan singkat "dilelang ulang" tanpa foto, bukan post lengkap
+        note = f"♻️ <b>Dilelang ulang</b> (sebelumnya: <a href=\"{esc(dup.link)}\">{esc(dup.title)}</a>)" if dup.link \
+            else f"♻️ <b>Dilelang ulang</b> (sebelumnya: {esc(dup.title)})"
+        for chat_id in chat_ids:
+            outbox.enqueue(lot_idem_key(lot_id, chat_id), chat_id, note + "\n" + job["short"], "text", lot_id=lot_id)
+        return True
+    if dup:
+        # mode flag: post lengkap dengan satu baris penanda di atas
+        line = duplicate_line(dup)
+        job["short"] = line + "\n" + job["short"]
+        if job.get("render"):
+            render = job["render"]
+            job["render"] = lambda uraian: line + "\n" + render(uraian)
+
+    # If detail is empty, we still try to compose a minimal message from list item
+    if not job["detail"]:
+        logger.warning(f"Detail kosong untuk {lot_id}, mengirim info minimal")
+        for chat_id in chat_ids:
+            outbox.enqueue(lot_idem_key(lot_id, chat_id), chat_id, job["short"], "text", lot_id=lot_id)
+        return True
 
-    # 11) If no photo sent, fallback to send text-only
-    if not sent_any_photo:
-        send_text_message(caption_full)
+    # Build caption (HTML) dengan bentuk pengiriman yang pasti muat
+    media_keys = job["media_keys"]
+    kind = "photo" if media_keys else "text"
+    text, followup = plan_lot_message(job["render"], job["uraian_items"], job["short"], kind == "photo")
 
-    logger.info(f"Lot {lot_id} terkirim")
+    # Fan-out: satu pesan per chat. Worker upload binary ke chat pertama,
+    # chat berikutnya pakai file_id yang tersimpan di media.
+    for chat_id in chat_ids:
+        outbox.enqueue(lot_idem_key(lot_id, chat_id), chat_id, text, kind, media_keys, lot_id=lot_id, followup=followup)
+
+    logger.info(f"Lot {lot_id} masuk antrian untuk {len(chat_ids)} chat")
     return True
 
 
+def send_lot(session: requests.Session, lot: Dict[str, Any], outbox: DeliveryQueue, archive: Optional[LotArchive] = None, reminders: Optional[ReminderScheduler] = None, planner: Optional[FetchPlanner] = None) -> bool:
+    """Render a single lot and enqueue it for every matching chat. Returns True if enqueued.
+
+    Sequential version of the detail -> photo -> send stages that `main` runs as a
+    pipeline. The actual Telegram send happens in the delivery worker (`deliver_message`).
+    """
+    job = prepare_lot(session, lot, archive, planner)
+    return enqueue_lot(attach_media(session, job, outbox), outbox, reminders)
+
+
+# -----------------------------------------
+# DIGEST: banyak lot baru sekaligus
+# -----------------------------------------
+
+
+def cover_file_url(lot: Dict[str, Any]) -> Optional[str]:
+    """fileUrl of the lot's cover photo (or its first photo) from the list item."""
+    photos = [p for p in (lot.get("photos") or []) if isinstance(p, dict)]
+    for p in sorted(photos, key=lambda p: not p.get("iscover")):
+        url = (p.get("file") or {}).get("fileUrl") or p.get("fileUrl")
+        if url:
+            return url
+    return None
+
+
+def digest_line(lot: Dict[str, Any]) -> str:
+    title = lot.get("namaLotLelang") or lot.get("nama") or "(tanpa judul)"
+    if len(title) > 120:
+        title = title[:117] + "…"
+    end = format_date_iso(lot.get("tglSelesaiLelang") or lot.get("tglSelesai"))
+    nilai_limit = lot.get("nilaiLimit") or lot.get("nilai_limit") or 0
+    return f"• <a href=\"{esc(lot_link(lot))}\">{esc(title)}</a>\n   💰 Rp {money(nilai_limit)} · ⏳ {esc(end)}"
+
+
+def enqueue_digest(session: requests.Session, lots: List[Dict[str, Any]], outbox: DeliveryQueue, reminders: Optional[ReminderScheduler] = None) -> List[str]:
+    """Enqueue grouped summaries (+ one cover album) per chat instead of one message per lot.
+
+    Uses only the list items (no detail fetch). Returns the lot ids that were handled;
+    lots that may match a subscriber only through their detail (barangs, seller) are
+    left out and have to go through the per-lot pipeline.
+    """
+    per_chat: Dict[str, List[Dict[str, Any]]] = {}
+    handled = []
+    for lot in lots:
+        lot_id = str(lot.get("lotLelangId") or lot.get("id"))
+        if SUBSCRIBERS.detail_may_add(lot):
+            continue
+        chat_ids = SUBSCRIBERS.chat_ids(lot, None)
+        for chat_id in chat_ids:
+            per_chat.setdefault(chat_id, []).append(lot)
+        if reminders is not None and chat_ids:
+            title = lot.get("namaLotLelang") or lot.get("nama") or "(tanpa judul)"
+            reminders.track(lot_id, parse_end(lot), title, lot_link(lot), chat_ids)
+        handled.append(lot)
+
+    # cover album: download sekali, dipakai semua chat (file_id setelah upload pertama)
+    covers: Dict[str, str] = {}
+    if DIGEST_ALBUM_SIZE:
+        wanted = []
+        for lot in handled:
+            url = cover_file_url(lot)
+            if url and len(wanted) < DIGEST_ALBUM_SIZE * max(1, len(per_chat)):
+                wanted.append((str(lot.get("lotLelangId") or lot.get("id")), resolve_photo_url(url)))
+
+        def fetch(item):
+            # langsung simpan ke outbox supaya bytes cover tidak menumpuk di memori
+            with MEMORY.photo_hold(1):
+                data = download_photo_bytes(session, item[1], referer="https://lelang.go.id/")
+                return outbox.put_media(data, item[1]) if data else None
+
+        for (lot_id, url), key in zip(wanted, _photo_pool().map(fetch, wanted)):
+            if key:
+                covers[lot_id] = key
+
+    heading = lambda title, count: f"\n🏢 <b>{esc(title)}</b> ({count})"
+    for chat_id, chat_lots in per_chat.items():
+        # jumlah per chat: tiap subscriber hanya menerima lot yang cocok filter-nya
+        header = lambda n, total, count=len(chat_lots): f"📢 <b>{count} lot lelang baru</b>" + (f" ({n}/{total})" if total > 1 else "")
+        chat_lot_ids = [str(l.get("lotLelangId") or l.get("id")) for l in chat_lots]
+        batch = digest_id(chat_lot_ids)
+        groups = [(title, [digest_line(l) for l in group]) for title, group in group_lots(chat_lots)]
+        parts = pack_digest(groups, header, heading)
+        for n, text in enumerate(parts, 1):
+            # lot_ids: bagian digest yang pertama terkirim menandai lot-lotnya "delivered"
+            outbox.enqueue(f"digest:{batch}:{n}:chat:{chat_id}", chat_id, text, "text", lot_ids=chat_lot_ids)
+        album = [covers[k] for k in (str(l.get("lotLelangId") or l.get("id")) for l in chat_lots) if k in covers][:DIGEST_ALBUM_SIZE]
+        if album:
+            caption = f"🖼 Foto {len(album)} dari {len(chat_lots)} lot baru"
+            outbox.enqueue(f"digest:{batch}:album:chat:{chat_id}", chat_id, caption, "album", album)
+        logger.info(f"Digest {len(chat_lots)} lot -> {len(parts)} pesan{' + 1 album' if album else ''} untuk chat {chat_id}")
+    return [str(l.get("lotLelangId") or l.get("id")) for l in handled]
+
+
 # -----------------------------------------
 # MAIN
 # -----------------------------------------
 
 
+def deliver_pending(outbox: DeliveryQueue) -> int:
+    """Drain whatever is due in the outbox (used by --deliver-only)."""
+    sent = drain(outbox, deliver_and_track)
+    logger.info(f"{sent} pesan terkirim dari antrian, status antrian: {outbox.stats()}")
+    return sent
+
+
+def log_freshness(since: float):
+    """Write this run's stage marks and log percentiles for lots delivered since `since`."""
+    if FRESHNESS is None:
+        return
+    try:
+        FRESHNESS.flush()
+        for line in FRESHNESS.report(since):
+            logger.info(line)
+        FRESHNESS.purge()
+    except Exception as e:
+        logger.warning(f"Gagal menyusun ringkasan freshness: {e}")
+
+
 def main():
     logger.info("Bot mulai jalan...")
 
+    outbox = DeliveryQueue(QUEUE_FILE)
+    run_start = time.time()
+    if "--deliver-only" in sys.argv:
+        deliver_pending(outbox)
+        log_freshness(run_start)
+        return
+
     session = make_session()
 
-    # 1) fetch list
-    lots = fetch_list(session)
+    # Koordinasi multi-worker (opsional): ambil lease shard (KPKNL, kategori) yang bebas
+    coordinator = coordinator_from_env()
+    targets = targets_from_env(API_URL)
+    keeper = None
+    if coordinator is not None:
+        keeper = LeaseKeeper(coordinator, targets)
+        targets = keeper.acquire()
+        if not targets:
+            logger.info("Semua shard sedang dipegang worker lain, tidak ada yang diproses")
+            return
+        keeper.start()
+
+    # 1) fetch list (per shard yang dipegang)
+    lots = []
+    seeded = set()
+    by_id = {}
+    for target in targets:
+        ids = []
+        items = fetch_list(session, target.url)
+        if FRESHNESS is not None:
+            FRESHNESS.observe(items)
+        for lot in items:
+            raw = lot.get("lotLelangId") or lot.get("id")
+            if not raw:
+                continue
+            ids.append(str(raw))
+            if ids[-1] not in by_id:
+                by_id[ids[-1]] = lot
+                lots.append(lot)
+        # shard yang belum pernah dipegang siapapun: tandai lot-nya sebagai sudah
+        # dikirim (klaim "seed") supaya lot lama shard baru tidak di-broadcast
+        if coordinator is not None and ids and coordinator.mark_seeded(seed_marker(target), keeper.owner):
+            coordinator.claim_many(ids, "seed")
+            seeded.update(ids)
+            logger.info(f"Shard {target.key} baru: {len(ids)} lot diinisialisasi, tidak dikirim pada run ini")
 
     # Safety: jika SEEN_FILE belum ada, inisialisasi SEEN_FILE dengan daftar lot saat ini
     # dan JANGAN mengirim apapun pada run ini — mencegah broadcast lot lama saat pertama kali run.
-    if not os.path.exists(SEEN_FILE):
-        init_seen = set()
-        for lot in lots:
-            raw = lot.get("lotLelangId") or lot.get("id")
-            if raw:
-                init_seen.add(str(raw))
+    # Dengan COORDINATOR, klaim "seed" per shard di atas yang menjaga ini (worker baru
+    # yang bergabung tidak boleh menahan lot yang belum dikirim worker lain).
+    if not os.path.exists(SEEN_FILE) and coordinator is None:
+        init_seen = set(by_id)
         save_seen(init_seen)
+        SeenFilter(SEEN_FILE).sync(init_seen)
         logger.info(f"SEEN_FILE '{SEEN_FILE}' tidak ditemukan sebelumnya. Inisialisasi dengan {len(init_seen)} lot dari list saat ini. Tidak mengirim apapun pada run ini.")
         return
 
-    # 2) load seen
-    seen = load_seen()
+    # 2) seen: snapshot Bloom (mmap) menjawab "pasti baru" tanpa load SEEN_FILE;
+    # histori lengkap di-load di background dan hanya dipakai untuk id yang
+    # "mungkin sudah" dikirim. Tanpa snapshot valid, load seperti biasa.
+    seen_filter = SeenFilter(SEEN_FILE)
+    history = SeenHistory(load_seen, SEEN_FILE, background=seen_filter.usable)
+    # id yang ditandai seen di run ini (klaim seed/worker lain, masuk antrian)
+    added = set(seeded)
+
+    # Arsip lokal semua lot dari list (satu transaksi); detail ditambahkan di send_lot
+    archive = None
+    if ARCHIVE_FILE:
+        try:
+            archive = LotArchive(ARCHIVE_FILE)
+            archive.upsert_lots(lots)
+        except Exception as e:
+            logger.warning(f"Gagal update arsip {ARCHIVE_FILE}: {e}")
+
+    # Pengingat: perbarui jadwal lot yang tanggal selesainya berubah di upstream
+    reminders = ReminderScheduler(default_reminders_path(SEEN_FILE)) if REMINDER_OFFSETS else None
+    if reminders is not None:
+        reminders.refresh(lots)
+
+    # Worker kirim Telegram jalan paralel dengan fetch; pesan yang tersisa dari run
+    # sebelumnya (gagal / backoff yang sudah jatuh tempo) ikut terkirim.
+    worker = None
+    if "--fetch-only" not in sys.argv:
+        worker = DeliveryWorker(QUEUE_FILE, deliver_and_track)
+        worker.start()
+
+    def admit(lot: Dict[str, Any]) -> bool:
+        lot_id = str(lot.get("lotLelangId") or lot.get("id"))
+        if not FILTER.matches(lot):
+            logger.debug(f"Lot {lot_id} tidak cocok dengan filter rule, lewati")
+            return False
+        # klaim atomik lintas worker: hanya satu worker yang mengirim lot ini
+        if coordinator is not None and not coordinator.claim(lot_id, keeper.owner):
+            logger.info(f"Lot {lot_id} sudah diklaim worker lain, lewati")
+            added.add(lot_id)
+            return False
+        return True
 
-    new_count = 0
+    def release_claim(lot_id: str):
+        if coordinator is None:
+            return
+        try:
+            coordinator.unclaim(lot_id, keeper.owner)
+        except Exception as e:
+            logger.warning(f"Gagal lepas klaim lot {lot_id}: {e}")
 
+    fresh, maybe = [], []
     for lot in lots:
-        try:
-            raw_id = lot.get("lotLelangId") or lot.get("id")
-            if not raw_id:
-                logger.debug("Skip lot tanpa id")
-                continue
-            # normalisasi id ke string supaya perbandingan dengan seen konsisten
-            lot_id = str(raw_id)
+        raw_id = lot.get("lotLelangId") or lot.get("id")
+        if not raw_id:
+            logger.debug("Skip lot tanpa id")
+            continue
+        # normalisasi id ke string supaya perbandingan dengan seen konsisten
+        lot_id = str(raw_id)
+        if lot_id in seeded:
+            continue
+        (fresh if seen_filter.definitely_new(lot_id) else maybe).append(lot)
+
+    def confirmed(lots: List[Dict[str, Any]]):
+        # positif snapshot (kebanyakan memang lot lama): cek ke histori lengkap
+        seen = history.result()
+        for lot in lots:
+            lot_id = str(lot.get("lotLelangId") or lot.get("id"))
             if lot_id in seen:
                 logger.debug(f"Lot {lot_id} sudah pernah dikirim, lewati")
                 continue
+            if admit(lot):
+                yield lot
+
+    # lot yang pasti baru masuk pipeline duluan, tanpa menunggu histori ter-load
+    fresh = [lot for lot in fresh if admit(lot)]
+    rest = confirmed(maybe) if seen_filter.usable else list(confirmed(maybe))
+    if seen_filter.usable:
+        logger.info(f"Snapshot seen: {len(fresh)} lot pasti baru, {len(maybe)} dicek ke histori")
+
+    planner = FetchPlanner(FieldCoverage(default_plan_path(SEEN_FILE)))
+
+    new_count = 0
 
-            ok = send_lot(session, lot)
+    # Burst: banyak lot baru sekaligus -> ringkasan per instansi/lokasi, bukan satu pesan per lot
+    # (dengan snapshot, jumlahnya diperkirakan dari lot yang pasti baru; positif
+    # palsu Bloom di antara lot baru hanya ~SEEN_FILTER_FP)
+    if use_digest(len(fresh) + (0 if seen_filter.usable else len(rest))):
+        candidates = fresh + list(rest)
+        logger.info(f"{len(candidates)} lot baru >= DIGEST_THRESHOLD, kirim dalam mode digest")
+        fresh, rest = [], []
+        try:
+            handled = enqueue_digest(session, candidates, outbox, reminders)
+            for lot_id in handled:
+                added.add(lot_id)
+                if FRESHNESS is not None:
+                    FRESHNESS.mark(lot_id, "queued")
+                new_count += 1
+            # lot yang baru bisa cocok lewat detail: kirim per lot lewat pipeline di bawah
+            handled = set(handled)
+            fresh = [lot for lot in candidates if str(lot.get("lotLelangId") or lot.get("id")) not in handled]
+            if fresh:
+                logger.info(f"{len(fresh)} lot butuh detail untuk dicocokkan subscriber, dikirim per lot")
+        except Exception as e:
+            logger.error(f"Gagal menyusun digest: {e}\n{traceback.format_exc()}")
+            for lot in candidates:
+                release_claim(str(lot.get("lotLelangId") or lot.get("id")))
+
+    # detail -> foto -> antrian kirim jalan bertahap; hasil tetap keluar sesuai urutan list
+    pipe = Pipeline([
+        # politeness ke lelang.go.id (dulu sleep 0.3 per lot) sekarang diatur retry.py:
+        # limiter AIMD per host + budget UPSTREAM_RPM bersama
+        Stage("detail", lambda lot: prepare_lot(session, lot, archive, planner), DETAIL_WORKERS),
+        Stage("photo", lambda job: attach_media(session, job, outbox), PHOTO_STAGE_WORKERS),
+    ], queue_size=PIPELINE_QUEUE, max_in_flight=MEMORY.in_flight)
+
+    for lot, job, error in pipe.run(itertools.chain(fresh, rest)):
+        lot_id = str(lot.get("lotLelangId") or lot.get("id"))
+        try:
+            if error is not None:
+                raise error
+            ok = enqueue_lot(job, outbox, reminders)
 
-            # Only mark as seen when we at least sent (text or photo)
+            # Mark as seen once the lot is durably queued; delivery retries live in the outbox
             if ok:
-                seen.add(lot_id)
+                added.add(lot_id)
                 new_count += 1
+                if FRESHNESS is not None:
+                    FRESHNESS.mark(lot_id, "queued")
             else:
-                logger.warning(f"Lot {lot_id} tidak berhasil dikirim, tidak ditandai sebagai seen")
-
-            # tiny sleep to be polite
-            time.sleep(0.3)
+                logger.warning(f"Lot {lot_id} tidak berhasil masuk antrian, tidak ditandai sebagai seen")
+                release_claim(lot_id)
         except Exception as e:
-            logger.error(f"Exception main loop untuk lot: {e}\n{traceback.format_exc()}")
+            logger.error(f"Exception main loop untuk lot {lot_id}: {e}\n{''.join(traceback.format_exception(type(e), e, e.__traceback__))}")
+            # klaim dilepas supaya run berikutnya (worker manapun) mencoba lagi
+            release_claim(lot_id)
             # don't stop the loop on error
             continue
 
-    # save seen
+    # save seen (+ snapshot: cukup tambah id baru kalau histori yang di-load masih sama)
+    seen = history.result() | added
     save_seen(seen)
-
-    logger.info(f"{new_count} lot baru terkirim")
+    seen_filter.sync(seen, added, base=history.stamp)
+
+    logger.info(f"{new_count} lot baru masuk antrian ({planner.summary()})")
+    planner.save()
+    if reminders is not None:
+        reminders.enqueue_due(outbox)
+        reminders.save()
+    if worker is not None:
+        sent = worker.stop()
+        logger.info(f"{sent} pesan terkirim, status antrian: {outbox.stats()}")
+    outbox.purge()
+    log_freshness(run_start)
+    if keeper is not None:
+        keeper.stop()
+        coordinator.purge()
+    logger.info(f"Memori: {MEMORY.report()}")
     logger.info("Bot selesai kirim semua lot.")
 
 
 if __name__ == "__main__":
-    main()
+    if "--engine" in sys.argv:
+        # jalur asyncio (engine.py): python app.py --engine [--once|--daemon]
+        import engine
+        engine.main(["--profile", "app"] + [a for a in sys.argv[1:] if a != "--engine"])
+    else:
+        main()
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+archive.py - Arsip lokal semua lot (SQLite + FTS5)
+
+Setiap lot yang lewat `fetch_list` disimpan (dinormalisasi) ke arsip, dan
+diperkaya dengan isi `barangs` (nama, tahun, warna, nopol, nomor rangka) saat
+detail-nya di-fetch. Dengan index FTS5 di judul + barang dan index B-tree di
+harga, tanggal, kota dan instansi, pertanyaan seperti
+
+    "semua Avanza 2018 di bawah Rp 100 jt, semua KPKNL, kuartal lalu"
+
+cukup satu query (milidetik), tanpa scroll channel Telegram:
+
+    python archive.py search avanza --tahun 2018 --max-limit 100000000 --since 2026-07-01
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+from datetime import datetime, timezone, timedelta
+from typing import Optional, List, Dict, Any, Iterable, Tuple
+
+import jsoncodec
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FILE = os.getenv("ARCHIVE_FILE", "lelang_archive.sqlite3")
+WIB = timezone(timedelta(hours=7))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS lots (
+    id INTEGER PRIMARY KEY,
+    lot_id TEXT NOT NULL UNIQUE,
+    title TEXT,
+    instansi TEXT,
+    unit_kerja_id TEXT,
+    kota TEXT,
+    provinsi TEXT,
+    kategori TEXT,
+    nilai_limit INTEGER,
+    uang_jaminan INTEGER,
+    tgl_mulai TEXT,
+    tgl_selesai TEXT,
+    first_seen REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    has_detail INTEGER NOT NULL DEFAULT 0,
+    raw TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_lots_limit ON lots(nilai_limit);
+CREATE INDEX IF NOT EXISTS idx_lots_mulai ON lots(tgl_mulai);
+CREATE INDEX IF NOT EXISTS idx_lots_selesai ON lots(tgl_selesai);
+CREATE INDEX IF NOT EXISTS idx_lots_kota ON lots(kota COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_lots_instansi ON lots(instansi COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_lots_first_seen ON lots(first_seen);
+
+CREATE TABLE IF NOT EXISTS barangs (
+    lot_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    nama TEXT,
+    tahun INTEGER,
+    warna TEXT,
+    nopol TEXT,
+    nomor_rangka TEXT,
+    PRIMARY KEY (lot_id, idx)
+);
+CREATE INDEX IF NOT EXISTS idx_barangs_tahun ON barangs(tahun);
+CREATE INDEX IF NOT EXISTS idx_barangs_nopol ON barangs(nopol);
+CREATE INDEX IF NOT EXISTS idx_barangs_rangka ON barangs(nomor_rangka);
+
+-- rowid lots_fts = lots.id
+CREATE VIRTUAL TABLE IF NOT EXISTS lots_fts USING fts5(
+    title, items, tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+
+# -----------------------------------------
+# NORMALIZATION
+# -----------------------------------------
+
+
+def _int(x) -> Optional[int]:
+    try:
+        return int(float(x))
+    except (TypeError, ValueError):
+        return None
+
+
+def _utc_iso(d: Optional[str]) -> Optional[str]:
+    """Normalize an upstream ISO timestamp to 'YYYY-MM-DD HH:MM:SS' UTC (sortable)."""
+    if not d:
+        return None
+    try:
+        dt = datetime.fromisoformat(str(d).replace("Z", "+00:00"))
+        if dt.tzinfo is None:
+            # tanpa timezone: anggap WIB
+            dt = dt.replace(tzinfo=WIB)
+        return dt.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return str(d)[:19]
+
+
+def normalize_lot(lot: Dict[str, Any]) -> Dict[str, Any]:
+    lot_id = lot.get("lotLelangId") or lot.get("id")
+    return {
+        "lot_id": str(lot_id) if lot_id else None,
+        "title": lot.get("namaLotLelang") or lot.get("nama"),
+        "instansi": lot.get("namaUnitKerja") or lot.get("instansi"),
+        "unit_kerja_id": lot.get("unitKerjaId"),
+        "kota": lot.get("namaKota") or lot.get("namaLokasi") or lot.get("lokasi"),
+        "provinsi": lot.get("namaProvinsi"),
+        "kategori": lot.get("namaKategori") or lot.get("kategori"),
+        "nilai_limit": _int(lot.get("nilaiLimit") if lot.get("nilaiLimit") is not None else lot.get("nilai_limit")),
+        "uang_jaminan": _int(lot.get("uangJaminan")),
+        "tgl_mulai": _utc_iso(lot.get("tglMulaiLelang") or lot.get("tglMulai")),
+        "tgl_selesai": _utc_iso(lot.get("tglSelesaiLelang") or lot.get("tglSelesai")),
+    }
+
+
+def normalize_barangs(detail: Dict[str, Any]) -> List[Dict[str, Any]]:
+    content = detail.get("content") if isinstance(detail.get("content"), dict) else {}
+    out = []
+    for b in content.get("barangs") or []:
+        if not isinstance(b, dict):
+            continue
+        out.append({
+            "nama": b.get("nama") or b.get("namaBarang"),
+            "tahun": _int(b.get("tahun")),
+            "warna": b.get("warna"),
+            "nopol": (b.get("nopol") or b.get("noPol") or None),
+            "nomor_rangka": (b.get("nomorRangka") or b.get("noRangka") or None),
+        })
+    return out
+
+
+# -----------------------------------------
+# ARCHIVE
+# -----------------------------------------
+
+
+class LotArchive:
+    """SQLite archive; one connection per thread."""
+
+    def __init__(self, path: str = ARCHIVE_FILE):
+        self.path = path
+        self._local = threading.local()
+        with self._conn() as c:
+            c.executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _upsert(self, c: sqlite3.Connection, lot: Dict[str, Any], now: float) -> Optional[str]:
+        row = normalize_lot(lot)
+        if not row["lot_id"]:
+            return None
+        row["raw"] = jsoncodec.dumps_str(lot)
+        row["now"] = now
+        c.execute(
+            """INSERT INTO lots(lot_id, title, instansi, unit_kerja_id, kota, provinsi, kategori, nilai_limit,
+                                uang_jaminan, tgl_mulai, tgl_selesai, first_seen, updated_at, raw)
+               VALUES (:lot_id, :title, :instansi, :unit_kerja_id, :kota, :provinsi, :kategori, :nilai_limit,
+                       :uang_jaminan, :tgl_mulai, :tgl_selesai, :now, :now, :raw)
+               ON CONFLICT(lot_id) DO UPDATE SET
+                   title = excluded.title, instansi = excluded.instansi, unit_kerja_id = excluded.unit_kerja_id,
+                   kota = COALESCE(excluded.kota, lots.kota), provinsi = COALESCE(excluded.provinsi, lots.provinsi),
+                   kategori = excluded.kategori, nilai_limit = excluded.nilai_limit,
+                   uang_jaminan = COALESCE(excluded.uang_jaminan, lots.uang_jaminan),
+                   tgl_mulai = excluded.tgl_mulai, tgl_selesai = excluded.tgl_selesai,
+                   updated_at = excluded.updated_at, raw = excluded.raw""",
+            row,
+        )
+        rowid = c.execute("SELECT id FROM lots WHERE lot_id = ?", (row["lot_id"],)).fetchone()[0]
+        if c.execute("UPDATE lots_fts SET title = ? WHERE rowid = ?", (row["title"] or "", rowid)).rowcount == 0:
+            c.execute("INSERT INTO lots_fts(rowid, title, items) VALUES (?, ?, '')", (rowid, row["title"] or ""))
+        return row["lot_id"]
+
+    def upsert_lots(self, lots: Iterable[Dict[str, Any]]) -> int:
+        """Archive list items in one transaction. Returns the number written."""
+        now = time.time()
+        n = 0
+        with self._conn() as c:
+            for lot in lots:
+                if self._upsert(c, lot, now):
+                    n += 1
+        return n
+
+    def add_detail(self, lot: Dict[str, Any], detail: Dict[str, Any]):
+        """Archive a lot together with its detail payload (barangs, seller city/province)."""
+        self.add_details([(lot, detail)])
+
+    def add_details(self, items: Iterable[Tuple[Dict[str, Any], Dict[str, Any]]]) -> int:
+        """Archive many (lot, detail) pairs in one transaction. Returns the number with a detail."""
+        now = time.time()
+        n = 0
+        with self._conn() as c:
+            for lot, detail in items:
+                if self._detail(c, lot, detail, now):
+                    n += 1
+        return n
+
+    def _detail(self, c: sqlite3.Connection, lot: Dict[str, Any], detail: Dict[str, Any], now: float) -> bool:
+        lot_id = self._upsert(c, lot, now)
+        if not lot_id or not detail:
+            return False
+        barangs = normalize_barangs(detail)
+        c.execute("DELETE FROM barangs WHERE lot_id = ?", (lot_id,))
+        c.executemany(
+            "INSERT INTO barangs(lot_id, idx, nama, tahun, warna, nopol, nomor_rangka) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(lot_id, i, b["nama"], b["tahun"], b["warna"], b["nopol"], b["nomor_rangka"]) for i, b in enumerate(barangs)],
+        )
+        items = " | ".join(
+            " ".join(str(v) for v in (b["nama"], b["tahun"], b["warna"], b["nopol"], b["nomor_rangka"]) if v)
+            for b in barangs
+        )
+        c.execute("UPDATE lots_fts SET items = ? WHERE rowid = (SELECT id FROM lots WHERE lot_id = ?)", (items, lot_id))
+        content = detail.get("content") if isinstance(detail.get("content"), dict) else {}
+        seller = content.get("seller") if isinstance(content.get("seller"), dict) else {}
+        c.execute(
+            "UPDATE lots SET has_detail = 1, kota = COALESCE(kota, ?), provinsi = COALESCE(provinsi, ?), "
+            "uang_jaminan = COALESCE(uang_jaminan, ?) WHERE lot_id = ?",
+            (seller.get("namaKota"), seller.get("namaProvinsi"), _int(detail.get("uangJaminan")), lot_id),
+        )
+        return True
+
+    def search(self, text: Optional[str] = None, min_limit: Optional[int] = None, max_limit: Optional[int] = None,
+               kota: Optional[str] = None, instansi: Optional[str] = None, tahun: Optional[int] = None,
+               since: Optional[str] = None, until: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Query the archive. `since`/`until` filter on tgl_mulai (ISO date, UTC).
+
+        `text` is an FTS5 query over title + barangs (e.g. "avanza", "avanza OR xenia").
+        """
+        where, args = [], []
+        sql = "SELECT l.lot_id, l.title, l.instansi, l.kota, l.nilai_limit, l.tgl_mulai, l.tgl_selesai FROM lots l"
+        if text:
+            sql += " JOIN lots_fts f ON f.rowid = l.id"
+            where.append("lots_fts MATCH ?")
+            args.append(text)
+        if min_limit is not None:
+            where.append("l.nilai_limit >= ?")
+            args.append(min_limit)
+        if max_limit is not None:
+            where.append("l.nilai_limit <= ?")
+            args.append(max_limit)
+        if kota:
+            where.append("l.kota = ? COLLATE NOCASE")
+            args.append(kota)
+        if instansi:
+            where.append("l.instansi = ? COLLATE NOCASE")
+            args.append(instansi)
+        if since:
+            where.append("l.tgl_mulai >= ?")
+            args.append(since)
+        if until:
+            where.append("l.tgl_mulai < ?")
+            args.append(until)
+        if tahun is not None:
+            where.append("EXISTS (SELECT 1 FROM barangs b WHERE b.lot_id = l.lot_id AND b.tahun = ?)")
+            args.append(tahun)
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY l.tgl_mulai DESC LIMIT ?"
+        args.append(limit)
+        return [dict(r) for r in self._conn().execute(sql, args).fetchall()]
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM lots").fetchone()[0]
+
+
+# -----------------------------------------
+# CLI
+# -----------------------------------------
+
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description="Cari lot di arsip lokal")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    s = sub.add_parser("search")
+    s.add_argument("text", nargs="?")
+    s.add_argument("--min-limit", type=int)
+    s.add_argument("--max-limit", type=int)
+    s.add_argument("--kota")
+    s.add_argument("--instansi")
+    s.add_argument("--tahun", type=int)
+    s.add_argument("--since", help="tgl mulai >= (YYYY-MM-DD)")
+    s.add_argument("--until", help="tgl mulai < (YYYY-MM-DD)")
+    s.add_argument("--limit", type=int, default=50)
+    sub.add_parser("count")
+    args = ap.parse_args(argv)
+
+    archive = LotArchive(ARCHIVE_FILE)
+    if args.cmd == "count":
+        print(archive.count())
+        return
+    t0 = time.perf_counter()
+    rows = archive.search(args.text, args.min_limit, args.max_limit, args.kota, args.instansi,
+                          args.tahun, args.since, args.until, args.limit)
+    for r in rows:
+        print(f"{r['tgl_mulai'] or '-':19}  Rp {r['nilai_limit'] or 0:>13,}  {r['instansi'] or '-'} / {r['kota'] or '-'}  {r['title']}  [{r['lot_id']}]")
+    print(f"{len(rows)} lot ({(time.perf_counter() - t0) * 1000:.1f} ms)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+bench_json.py - Benchmark backend JSON (jsoncodec) untuk ukuran katalog nyata
+
+Mengukur per backend yang terpasang (orjson / ujson / json):
+ - parse katalog list lot dari bytes (seperti `fetch_list` / `check_once`),
+   dibandingkan dengan jalur lama `bytes -> str -> json.loads` ala `r.json()`
+ - parse payload detail satu lot (dikali banyak lot per run)
+ - dump seen-store (list id terurut, indent 2) seperti `save_seen`
+
+Contoh:
+    python bench_json.py
+    python bench_json.py --lots 1000 10000 50000 --seen 200000 --repeat 5
+"""
+
+import argparse
+import json
+import random
+import time
+from typing import Any, Callable, Dict, List
+
+import jsoncodec
+
+BACKENDS = ["orjson", "ujson", "json"]
+
+
+def fake_lot(i: int) -> Dict[str, Any]:
+    kota = random.choice(["Kota Surakarta", "Kab. Sukoharjo", "Kota Semarang", "Kab. Klaten", "Kota Yogyakarta"])
+    return {
+        "lotLelangId": f"{random.getrandbits(64):016x}-{i}",
+        "namaLotLelang": f"Satu unit kendaraan roda {random.choice([2, 4])} merek Toyota Avanza tahun {2005 + i % 18} No. Pol AD {1000 + i} XY",
+        "namaUnitKerja": "KPKNL Surakarta",
+        "unitKerjaId": "5c0b7f3e-0000-4000-8000-%012d" % (i % 40),
+        "namaLokasi": kota,
+        "kategori": random.choice(["Kendaraan", "Tanah dan Bangunan", "Elektronik"]),
+        "nilaiLimit": random.randint(1, 500) * 1_000_000,
+        "uangJaminan": random.randint(1, 100) * 500_000,
+        "tglMulaiLelang": "2024-05-01T09:00:00+07:00",
+        "tglSelesaiLelang": "2024-05-14T10:00:00+07:00",
+        "caraPenawaran": "TERTUTUP_CLOSED_BIDDING",
+        "views": random.randint(0, 5000),
+        "photos": [{"file": {"fileUrl": f"/lot/{i}/foto-{k}.jpg"}} for k in range(3)],
+    }
+
+
+def fake_detail(i: int) -> Dict[str, Any]:
+    lot = fake_lot(i)
+    lot["content"] = {
+        "seller": {"namaOrganisasiPenjual": "PT Bank Rakyat Indonesia (Persero) Tbk"},
+        "organizer": {"namaUnitKerja": "KPKNL Surakarta", "namaBank": "BRI"},
+        "barangs": [
+            {"nama": f"Mobil {k}", "tahun": 2010 + k, "warna": "Hitam", "nopol": f"AD {k} ZZ", "nomorRangka": f"MHF{k:014d}",
+             "uraian": "Kondisi sesuai apa adanya, dokumen lengkap BPKB dan STNK. " * 3}
+            for k in range(4)
+        ],
+    }
+    return {"data": lot}
+
+
+def best_of(fn: Callable[[], Any], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+def available() -> List[str]:
+    return [b for b in BACKENDS if b == "json" or getattr(jsoncodec, b) is not None]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--lots", type=int, nargs="+", default=[1000, 10000, 50000])
+    ap.add_argument("--seen", type=int, default=100000, help="jumlah id di seen-store")
+    ap.add_argument("--details", type=int, default=500, help="jumlah payload detail per run")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    random.seed(1)
+    backends = available()
+    print(f"backend terpasang: {', '.join(backends)} (default: {jsoncodec.BACKEND})\n")
+
+    rows = []
+    for n in args.lots:
+        body = json.dumps({"data": [fake_lot(i) for i in range(n)]}, ensure_ascii=False).encode("utf-8")
+        rows.append((f"katalog {n} lot ({len(body) / 1e6:.1f} MB) r.json()", "-",
+                     best_of(lambda: json.loads(body.decode("utf-8")), args.repeat)))
+        for b in backends:
+            jsoncodec.BACKEND = b
+            rows.append((f"katalog {n} lot loads(bytes)", b, best_of(lambda: jsoncodec.loads(body), args.repeat)))
+
+    details = [json.dumps(fake_detail(i), ensure_ascii=False).encode("utf-8") for i in range(args.details)]
+    for b in backends:
+        jsoncodec.BACKEND = b
+        rows.append((f"{args.details} detail loads(bytes)", b,
+                     best_of(lambda: [jsoncodec.loads(d) for d in details], args.repeat)))
+
+    seen = sorted(f"{random.getrandbits(64):016x}" for _ in range(args.seen))
+    rows.append((f"seen {args.seen} id json.dump indent=2", "-",
+                 best_of(lambda: json.dumps(seen, ensure_ascii=False, indent=2).encode("utf-8"), args.repeat)))
+    for b in backends:
+        jsoncodec.BACKEND = b
+        rows.append((f"seen {args.seen} id dump pretty", b, best_of(lambda: jsoncodec.dumps(seen, pretty=True), args.repeat)))
+
+    width = max(len(r[0]) for r in rows)
+    print(f"{'kasus':<{width}}  {'backend':<7}  {'ms':>9}")
+    for name, backend, secs in rows:
+        print(f"{name:<{width}}  {backend:<7}  {secs * 1000:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
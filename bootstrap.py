@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+bootstrap.py - Inisialisasi cepat untuk target (KPKNL) baru
+
+Run pertama app.py tanpa `SEEN_FILE` hanya menandai isi katalog saat itu
+sebagai seen dan tidak mengirim apa pun (bot.py / monitor sekarang juga).
+Saat menambah puluhan target sekaligus di `TARGETS`, jalankan ini sekali
+sebelum cron berikutnya:
+
+    python bootstrap.py [--workers 8] [--no-detail] [--all]
+
+ - katalog semua target di-fetch paralel (limiter per host + `UPSTREAM_RPM`
+   dari retry.py tetap berlaku)
+ - target dianggap baru kalau belum ada satu pun lot-nya di seen-store (dengan
+   `COORDINATOR`: kalau klaim seed shard-nya masih bebas). Hanya lot target
+   baru yang ditandai seen, supaya lot baru di target lama yang belum sempat
+   dikirim cron tidak ikut tertelan; `--all` menandai semuanya
+ - seen-store (+ snapshot Bloom), arsip dan index dedupe diisi masing-masing
+   dalam satu transaksi
+ - lot target baru yang masih buka dan cocok filter di-fetch detail-nya:
+   barangs masuk arsip + fingerprint dedupe (relist lot ini langsung
+   terdeteksi) dan `FieldCoverage` belajar field apa yang dibawa endpoint
+   detail, jadi run pertama tinggal fetch + kirim lot yang benar-benar baru
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Any, Set, Tuple
+
+import app
+from archive import LotArchive, ARCHIVE_FILE
+from dedupe import index_from_env as dedupe_index_from_env
+from fetch_plan import FetchPlanner, FieldCoverage, default_path as default_plan_path
+from reminders import parse_end
+from seen_filter import SeenFilter
+from sharding import Target, coordinator_from_env, targets_from_env, seed_marker
+
+logger = logging.getLogger(__name__)
+
+BOOTSTRAP_WORKERS = int(os.getenv("BOOTSTRAP_WORKERS", "8"))
+BOOTSTRAP_OWNER = "bootstrap"
+
+
+def lot_key(lot: Dict[str, Any]) -> Optional[str]:
+    raw = lot.get("lotLelangId") or lot.get("id")
+    return str(raw) if raw else None
+
+
+def is_open(lot: Dict[str, Any], now: float) -> bool:
+    end = parse_end(lot)
+    return end is None or end > now
+
+
+def fetch_catalogs(session, targets: List[Target], workers: int) -> List[Tuple[Target, List[Dict[str, Any]]]]:
+    """Full catalog of every target, fetched in parallel (order of `targets`)."""
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(targets))), thread_name_prefix="bootstrap-list") as pool:
+        return list(zip(targets, pool.map(lambda t: app.fetch_list(session, t.url), targets)))
+
+
+def fetch_details(session, lots: List[Dict[str, Any]], planner: FetchPlanner, workers: int) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    def one(lot):
+        try:
+            return lot, app.fetch_detail(session, lot_key(lot), referer=app.lot_link(lot), planner=planner)
+        except Exception as e:
+            logger.warning(f"Gagal fetch detail {lot_key(lot)}: {e}")
+            return lot, {}
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="bootstrap-detail") as pool:
+        return list(pool.map(one, lots))
+
+
+def bootstrap(workers: int = BOOTSTRAP_WORKERS, details: bool = True, seed_all: bool = False) -> Dict[str, int]:
+    t0 = time.perf_counter()
+    session = app.make_session()
+    targets = targets_from_env(app.API_URL)
+    catalogs = fetch_catalogs(session, targets, workers)
+
+    seen = app.load_seen() if os.path.exists(app.SEEN_FILE) else set()
+    coordinator = coordinator_from_env()
+
+    lots: List[Dict[str, Any]] = []
+    by_id: Set[str] = set()
+    seeded: List[Dict[str, Any]] = []
+    for target, items in catalogs:
+        ids = [i for i in (lot_key(lot) for lot in items) if i]
+        if not ids:
+            # katalog kosong / gagal di-fetch: jangan dianggap sudah di-seed
+            logger.warning(f"Target {target.key}: katalog kosong, dilewati")
+            continue
+        for lot in items:
+            lot_id = lot_key(lot)
+            if lot_id and lot_id not in by_id:
+                by_id.add(lot_id)
+                lots.append(lot)
+        if coordinator is not None:
+            new_target = coordinator.mark_seeded(seed_marker(target), BOOTSTRAP_OWNER)
+            if new_target:
+                coordinator.claim_many(ids, "seed")
+        else:
+            new_target = seen.isdisjoint(ids)
+        if new_target or seed_all:
+            seeded.extend(lot for lot in items if lot_key(lot) and lot_key(lot) not in seen)
+            logger.info(f"Target {target.key}: {len(ids)} lot di-seed")
+        else:
+            logger.info(f"Target {target.key} sudah dikenal, lot-nya dibiarkan untuk run biasa")
+
+    # 1) seen-store + snapshot
+    added = {lot_key(lot) for lot in seeded}
+    if added or not os.path.exists(app.SEEN_FILE):
+        seen |= added
+        app.save_seen(seen)
+        SeenFilter(app.SEEN_FILE).sync(seen)
+
+    # 2) detail lot yang masih buka (paralel, dibatasi limiter host)
+    now = time.time()
+    planner = FetchPlanner(FieldCoverage(default_plan_path(app.SEEN_FILE)))
+    warm = [lot for lot in seeded if is_open(lot, now) and app.FILTER.matches(lot)] if details else []
+    pairs = fetch_details(session, warm, planner, workers) if warm else []
+    planner.save()
+    detailed = {lot_key(lot): detail for lot, detail in pairs if detail}
+
+    # 3) arsip: list + detail, masing-masing satu transaksi
+    archived = 0
+    if ARCHIVE_FILE:
+        try:
+            archive = LotArchive(ARCHIVE_FILE)
+            archived = archive.upsert_lots(lots)
+            archive.add_details(pairs)
+        except Exception as e:
+            logger.warning(f"Gagal update arsip {ARCHIVE_FILE}: {e}")
+
+    # 4) index dedupe: lot yang di-seed dengan detail kalau ada
+    fingerprinted = 0
+    index = dedupe_index_from_env()
+    if index is not None:
+        fingerprinted = index.add_many((lot, detailed.get(lot_key(lot)), app.lot_link(lot)) for lot in seeded)
+
+    stats = {
+        "targets": len(targets),
+        "lots": len(lots),
+        "seeded": len(added),
+        "details": len(detailed),
+        "archived": archived,
+        "fingerprints": fingerprinted,
+    }
+    logger.info(f"Bootstrap selesai dalam {time.perf_counter() - t0:.1f}s: {stats}")
+    return stats
+
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description="Seed seen-store, arsip dan index dedupe untuk target baru")
+    ap.add_argument("--workers", type=int, default=BOOTSTRAP_WORKERS, help="fetch paralel (katalog dan detail)")
+    ap.add_argument("--no-detail", action="store_true", help="jangan fetch detail lot yang masih buka")
+    ap.add_argument("--all", action="store_true", help="tandai seen semua lot, termasuk target yang sudah dikenal")
+    args = ap.parse_args(argv)
+    stats = bootstrap(args.workers, details=not args.no_detail, seed_all=args.all)
+    print(", ".join(f"{k}={v}" for k, v in stats.items()))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,9 +1,14 @@
 # bot.py
 import os
+import sys
 import time
-import json
 import requests
 
+import retry
+import jsoncodec
+from filters import FilterEngine, rules_from_env
+from seen_filter import SeenFilter
+
 # -----------------------------
 # CONFIG
 # -----------------------------
@@ -19,6 +24,10 @@ TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 
 SEEN_FILE = "seen_api.json"
 
+FILTER = FilterEngine(rules_from_env(KEYWORD_INSTANSI))
+# snapshot Bloom seen_api.json ikut di-update supaya app.py (cron) tidak load penuh
+SEEN_FILTER = SeenFilter(SEEN_FILE)
+
 if not TELEGRAM_TOKEN or not TELEGRAM_CHAT_ID:
     print("Set TELEGRAM_TOKEN dan TELEGRAM_CHAT_ID di environment variables!")
     raise SystemExit(1)
@@ -28,18 +37,27 @@ if not TELEGRAM_TOKEN or not TELEGRAM_CHAT_ID:
 # -----------------------------
 def load_seen():
     try:
-        with open(SEEN_FILE, "r", encoding="utf-8") as f:
-            return set(json.load(f))
+        with open(SEEN_FILE, "rb") as f:
+            return set(jsoncodec.load(f))
     except Exception:
         return set()
 
 def save_seen(s):
-    with open(SEEN_FILE, "w", encoding="utf-8") as f:
-        json.dump(list(s), f, ensure_ascii=False, indent=2)
+    with open(SEEN_FILE, "wb") as f:
+        jsoncodec.dump(list(s), f, pretty=True)
+
+def format_text(lot):
+    instansi = (lot.get("namaUnitKerja") or "").lower()
+    # Ambil info lot
+    title = lot.get("namaLotLelang", "(tanpa judul)")
+    start = lot.get("tglMulaiLelang", "")
+    end = lot.get("tglSelesaiLelang", "")
+    link = f"https://lelang.go.id/lot-lelang/{lot.get('id')}"
+    return f"🔔 <b>{title}</b>\nInstansi: {instansi}\n🗓 {start} → {end}\n🔗 {link}"
 
 def send_message(text):
     url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
-    res = requests.post(url, data={"chat_id": TELEGRAM_CHAT_ID, "text": text, "parse_mode": "HTML"})
+    res = retry.post(url, retry.TELEGRAM_POLICY, data={"chat_id": TELEGRAM_CHAT_ID, "text": text, "parse_mode": "HTML"})
     return res.status_code == 200
 
 # -----------------------------
@@ -50,31 +68,37 @@ def main():
     print("✅ Monitor Lelang mulai. Instansi:", KEYWORD_INSTANSI)
     while True:
         try:
-            r = requests.get(API_URL, timeout=20)
-            data = r.json()
+            r = retry.get(requests, API_URL, retry.LIST_POLICY, timeout=20)
+            data = jsoncodec.response_json(r)
             items = data.get("data", []) or []
+            if not os.path.exists(SEEN_FILE):
+                # run pertama: katalog saat ini ditandai seen, jangan broadcast lot lama
+                seen.update(lot.get("id") for lot in items if lot.get("id"))
+                print(f"ℹ {SEEN_FILE} belum ada, inisialisasi dengan {len(seen)} lot tanpa kirim")
+                items = []
+            new_ids = []
             for lot in items:
                 lot_id = lot.get("id")
                 if not lot_id or lot_id in seen:
                     continue
-                instansi = (lot.get("namaUnitKerja") or "").lower()
-                if KEYWORD_INSTANSI not in instansi:
+                if not FILTER.matches(lot):
                     continue
-                # Ambil info lot
-                title = lot.get("namaLotLelang", "(tanpa judul)")
-                start = lot.get("tglMulaiLelang", "")
-                end = lot.get("tglSelesaiLelang", "")
-                link = f"https://lelang.go.id/lot-lelang/{lot_id}"
-                text = f"🔔 <b>{title}</b>\nInstansi: {instansi}\n🗓 {start} → {end}\n🔗 {link}"
-                if send_message(text):
+                if send_message(format_text(lot)):
                     print("✅ Terkirim:", lot_id)
                 else:
                     print("❌ Gagal kirim:", lot_id)
                 seen.add(lot_id)
+                new_ids.append(lot_id)
             save_seen(seen)
+            SEEN_FILTER.sync(seen, new_ids)
         except Exception as e:
             print("⚠ Error cek API:", e)
         time.sleep(CHECK_INTERVAL)
 
 if __name__ == "__main__":
-    main()
+    if "--engine" in sys.argv:
+        # jalur asyncio (engine.py): python bot.py --engine [--once|--daemon]
+        import engine
+        engine.main(["--profile", "bot"] + [a for a in sys.argv[1:] if a != "--engine"])
+    else:
+        main()
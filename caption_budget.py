@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+caption_budget.py - Hitung panjang caption/pesan sesuai aturan Telegram
+
+Telegram menolak caption foto > 1024 karakter dan pesan teks > 4096 karakter.
+Yang dihitung adalah teks SETELAH entity HTML di-parse (tag dibuang, `&amp;`
+jadi `&`), dalam satuan UTF-16 (emoji = 2). Modul ini mengukur dengan cara
+yang sama sehingga bentuk pengiriman bisa dipilih di awal, bukan lewat
+rangkaian fallback setelah Telegram membalas 400.
+"""
+
+import re
+import html
+from typing import Callable, List, Optional
+
+CAPTION_LIMIT = 1024
+MESSAGE_LIMIT = 4096
+
+_TAG_RE = re.compile(r"<[^>]+>")
+
+
+def visible_len(text_html: str) -> int:
+    """Length Telegram counts for an HTML-formatted text (UTF-16 code units)."""
+    plain = html.unescape(_TAG_RE.sub("", text_html or ""))
+    return len(plain.encode("utf-16-le")) // 2
+
+
+def fits(text_html: str, limit: int) -> bool:
+    return visible_len(text_html) <= limit
+
+
+def fit_items(render: Callable[[List[str], int], str], items: List[str], limit: int) -> Optional[str]:
+    """Render with as many leading `items` as fit within `limit`.
+
+    `render(shown_items, hidden_count)` must return the full HTML text. Returns None
+    if not even a single item (or the item-less text when `items` is empty) fits.
+    """
+    full = render(items, 0)
+    if fits(full, limit):
+        return full
+    # cari jumlah item terbanyak yang masih muat (panjang monoton naik terhadap k)
+    lo, hi, best = 1, len(items) - 1, None
+    while lo <= hi:
+        k = (lo + hi) // 2
+        candidate = render(items[:k], len(items) - k)
+        if fits(candidate, limit):
+            best, lo = candidate, k + 1
+        else:
+            hi = k - 1
+    return best
+
+
+def clip_plain(text_html: str, limit: int, suffix: str = "…") -> str:
+    """Last resort: drop formatting and hard-cut the text so it always fits."""
+    if fits(text_html, limit):
+        return text_html
+    plain = html.unescape(_TAG_RE.sub("", text_html or ""))
+    out = []
+    used = 0
+    budget = limit - len(suffix.encode("utf-16-le")) // 2
+    for ch in plain:
+        w = len(ch.encode("utf-16-le")) // 2
+        if used + w > budget:
+            break
+        out.append(ch)
+        used += w
+    return html.escape("".join(out), quote=False) + suffix
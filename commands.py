@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+commands.py - Command Telegram interaktif (/ending, /search, /stats)
+
+Semua jawaban dihitung dari `LotView`, struktur in-memory yang di-update
+secara inkremental dari setiap hasil fetch list:
+ - heap berdasarkan `tglSelesaiLelang` (untuk /ending)
+ - list per kota yang terurut harga `nilaiLimit` (untuk /search)
+ - counter per instansi / kategori (untuk /stats)
+Jadi tidak ada request ke api.lelang.go.id di jalur query.
+
+`CommandHandler` melakukan long-polling `getUpdates` di sela interval cek
+pada loop daemon (lihat monitor_lelang_api.main).
+"""
+
+import os
+import re
+import html
+import time
+import heapq
+import bisect
+import logging
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List, Dict, Any, Callable, Iterable, Tuple
+
+import requests
+
+import retry
+import jsoncodec
+from caption_budget import MESSAGE_LIMIT, fit_items
+
+logger = logging.getLogger(__name__)
+
+WIB = timezone(timedelta(hours=7))
+MAX_RESULTS = int(os.getenv("COMMAND_MAX_RESULTS", "15"))
+LONG_POLL_TIMEOUT = int(os.getenv("COMMAND_POLL_TIMEOUT", "25"))
+
+# nama populer -> nama resmi kota di payload
+CITY_ALIASES = {"solo": "surakarta", "jogja": "yogyakarta", "jogjakarta": "yogyakarta"}
+
+
+def parse_ts(d: Optional[str]) -> Optional[float]:
+    """ISO timestamp from the API -> epoch seconds (naive values are WIB)."""
+    if not d:
+        return None
+    try:
+        dt = datetime.fromisoformat(str(d).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=WIB)
+    return dt.timestamp()
+
+
+def _price(lot: Dict[str, Any]) -> Optional[float]:
+    try:
+        return float(lot.get("nilaiLimit"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _city(lot: Dict[str, Any]) -> str:
+    return str(lot.get("namaKota") or lot.get("namaLokasi") or lot.get("lokasi") or "-").strip().lower()
+
+
+# -----------------------------------------
+# PRECOMPUTED VIEW
+# -----------------------------------------
+
+
+class LotView:
+    """Incrementally maintained in-memory view over the current catalog."""
+
+    def __init__(self):
+        self.lots: Dict[str, Dict[str, Any]] = {}
+        # (end_ts, lot_id, version); entri basi dibuang secara lazy
+        self._ending: List[Tuple[float, str, int]] = []
+        self._version: Dict[str, int] = {}
+        # kota -> [(harga, lot_id)] terurut
+        self._by_city: Dict[str, List[Tuple[float, str]]] = {}
+        self._key: Dict[str, Tuple[Optional[float], str, Optional[float]]] = {}
+        self.by_instansi: Counter = Counter()
+        self.by_kategori: Counter = Counter()
+        self.updated_at: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self.lots)
+
+    def _remove(self, lot_id: str):
+        lot = self.lots.pop(lot_id, None)
+        if lot is None:
+            return
+        end_ts, city, price = self._key.pop(lot_id)
+        self._version[lot_id] = self._version.get(lot_id, 0) + 1
+        if price is not None:
+            lst = self._by_city.get(city, [])
+            i = bisect.bisect_left(lst, (price, lot_id))
+            if i < len(lst) and lst[i] == (price, lot_id):
+                lst.pop(i)
+            if not lst:
+                self._by_city.pop(city, None)
+        for counter, key in ((self.by_instansi, lot.get("namaUnitKerja") or "-"), (self.by_kategori, lot.get("namaKategori") or "-")):
+            counter[key] -= 1
+            if counter[key] <= 0:
+                del counter[key]
+
+    def _add(self, lot_id: str, lot: Dict[str, Any]):
+        end_ts = parse_ts(lot.get("tglSelesaiLelang") or lot.get("tglSelesai"))
+        city, price = _city(lot), _price(lot)
+        self.lots[lot_id] = lot
+        self._key[lot_id] = (end_ts, city, price)
+        ver = self._version.get(lot_id, 0)
+        if end_ts is not None:
+            heapq.heappush(self._ending, (end_ts, lot_id, ver))
+        if price is not None:
+            bisect.insort(self._by_city.setdefault(city, []), (price, lot_id))
+        self.by_instansi[lot.get("namaUnitKerja") or "-"] += 1
+        self.by_kategori[lot.get("namaKategori") or "-"] += 1
+
+    def update(self, items: Iterable[Dict[str, Any]]):
+        """Apply a fresh fetch_list result: add new lots, re-index changed ones, drop vanished ones."""
+        current = {}
+        for lot in items:
+            raw = lot.get("lotLelangId") or lot.get("id")
+            if raw:
+                current[str(raw)] = lot
+        for lot_id in [i for i in self.lots if i not in current]:
+            self._remove(lot_id)
+        for lot_id, lot in current.items():
+            old = self.lots.get(lot_id)
+            if old is not None:
+                if old == lot:
+                    continue
+                # field apa pun bisa berubah (instansi/kategori ikut counter): index ulang
+                self._remove(lot_id)
+            self._add(lot_id, lot)
+        self.updated_at = time.time()
+        now = time.time()
+        if len(self._ending) > 2 * len(self.lots) + 64:
+            # terlalu banyak entri basi: bangun ulang heap
+            self._ending = [e for e in self._ending if e[1] in self.lots and e[2] == self._version.get(e[1], 0)]
+            heapq.heapify(self._ending)
+        # buang entri basi / kadaluarsa dari puncak heap
+        while self._ending and (self._ending[0][2] != self._version.get(self._ending[0][1], 0)
+                                or self._ending[0][1] not in self.lots or self._ending[0][0] < now):
+            heapq.heappop(self._ending)
+
+    def ending(self, until_ts: float, now: Optional[float] = None, limit: int = MAX_RESULTS) -> List[Dict[str, Any]]:
+        """Open lots whose auction ends in [now, until_ts], soonest first.
+
+        Walks the heap as a tree (k smallest in O(k log k)) instead of sorting all lots.
+        """
+        now = time.time() if now is None else now
+        heap = self._ending
+        out: List[Dict[str, Any]] = []
+        frontier = [(heap[0], 0)] if heap else []
+        while frontier and len(out) < limit:
+            (end_ts, lot_id, ver), i = heapq.heappop(frontier)
+            if end_ts > until_ts:
+                break
+            if end_ts >= now and ver == self._version.get(lot_id, 0) and lot_id in self.lots:
+                out.append(self.lots[lot_id])
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (heap[child], child))
+        return out
+
+    def cities(self, query: str) -> List[str]:
+        q = CITY_ALIASES.get(query.lower(), query.lower())
+        return [c for c in self._by_city if q in c]
+
+    def search(self, words: List[str], max_price: Optional[float] = None, city: Optional[str] = None,
+               limit: int = MAX_RESULTS) -> List[Dict[str, Any]]:
+        """Cheapest-first lots under `max_price` (in `city`), whose title contains all `words`."""
+        keys = self.cities(city) if city else list(self._by_city)
+        streams = []
+        for k in keys:
+            lst = self._by_city[k]
+            end = bisect.bisect_right(lst, (max_price, "\uffff")) if max_price is not None else len(lst)
+            streams.append(lst[:end])
+        words = [w.lower() for w in words]
+        out = []
+        for _, lot_id in heapq.merge(*streams):
+            lot = self.lots[lot_id]
+            title = str(lot.get("namaLotLelang") or lot.get("nama") or "").lower()
+            if all(w in title for w in words):
+                out.append(lot)
+                if len(out) >= limit:
+                    break
+        return out
+
+
+# -----------------------------------------
+# FORMATTING
+# -----------------------------------------
+
+
+def _lot_line(lot: Dict[str, Any]) -> str:
+    lot_id = lot.get("lotLelangId") or lot.get("id")
+    title = html.escape(str(lot.get("namaLotLelang") or lot.get("nama") or "(tanpa judul)"))
+    try:
+        harga = f"Rp {int(float(lot.get('nilaiLimit'))):,}"
+    except (TypeError, ValueError):
+        harga = "Rp -"
+    end_ts = parse_ts(lot.get("tglSelesaiLelang") or lot.get("tglSelesai"))
+    end = datetime.fromtimestamp(end_ts, WIB).strftime("%d %b %H:%M") if end_ts else "-"
+    kota = html.escape(str(lot.get("namaKota") or lot.get("namaLokasi") or "-"))
+    return f"• <a href=\"https://lelang.go.id/lot-lelang/{html.escape(str(lot_id))}\">{title}</a>\n   {harga} · {kota} · selesai {end}"
+
+
+def _list_reply(header: str, lots: List[Dict[str, Any]]) -> str:
+    if not lots:
+        return header + "\nTidak ada lot."
+    lines = [_lot_line(l) for l in lots]
+    render = lambda shown, hidden: header + "\n" + "\n".join(shown) + (f"\n… +{hidden} lainnya" if hidden else "")
+    return fit_items(render, lines, MESSAGE_LIMIT) or header
+
+
+def parse_price(tok: str) -> Optional[float]:
+    """'50jt', '50juta', '1.5m', '75000000' -> rupiah."""
+    m = re.fullmatch(r"(\d+(?:[.,]\d+)?)(jt|juta|m|miliar|rb|ribu)?", tok.lower())
+    if not m:
+        return None
+    val = float(m.group(1).replace(",", "."))
+    mult = {"jt": 1e6, "juta": 1e6, "m": 1e9, "miliar": 1e9, "rb": 1e3, "ribu": 1e3}.get(m.group(2) or "", 1)
+    return val * mult
+
+
+def parse_search(args: List[str]) -> Tuple[List[str], Optional[float], Optional[str]]:
+    """'/search avanza <100jt di solo' -> (['avanza'], 100e6, 'solo')."""
+    words, max_price, city = [], None, None
+    i = 0
+    while i < len(args):
+        tok = args[i]
+        low = tok.lower()
+        if low in ("di", "in") and i + 1 < len(args):
+            city = " ".join(args[i + 1:])
+            break
+        if low in ("under", "dibawah", "<", "<=") and i + 1 < len(args):
+            max_price = parse_price(args[i + 1])
+            i += 2
+            continue
+        if low.startswith("<"):
+            max_price = parse_price(low.lstrip("<="))
+        else:
+            words.append(tok)
+        i += 1
+    return words, max_price, city
+
+
+# -----------------------------------------
+# HANDLER
+# -----------------------------------------
+
+HELP = (
+    "Perintah:\n"
+    "/ending [jam] - lot yang selesai hari ini (atau dalam N jam)\n"
+    "/search kata [&lt;50jt] [di kota] - cari lot termurah\n"
+    "/stats - ringkasan katalog"
+)
+
+
+class CommandHandler:
+    """Long-polls getUpdates and answers commands from a LotView."""
+
+    def __init__(self, token: str, view: LotView, send: Callable[[str, str], Any], allowed_chats: Optional[Iterable[str]] = None):
+        self.token = token
+        self.view = view
+        self.send = send  # send(text, chat_id)
+        # None = semua chat; list kosong = tidak ada chat yang dijawab
+        self.allowed = set(str(c) for c in allowed_chats) if allowed_chats is not None else None
+        self.offset: Optional[int] = None
+        self.started_at = time.time()
+
+    def handle(self, text: str) -> str:
+        parts = text.strip().split()
+        cmd = parts[0].split("@")[0].lower() if parts else ""
+        args = parts[1:]
+        now = time.time()
+        if cmd == "/ending":
+            if args and args[0].replace(".", "", 1).isdigit():
+                until = now + float(args[0]) * 3600
+                header = f"⏰ Lot selesai dalam {args[0]} jam:"
+            else:
+                midnight = datetime.fromtimestamp(now, WIB).replace(hour=23, minute=59, second=59)
+                until = midnight.timestamp()
+                header = "⏰ Lot selesai hari ini:"
+            return _list_reply(header, self.view.ending(until, now))
+        if cmd == "/search":
+            words, max_price, city = parse_search(args)
+            lots = self.view.search(words, max_price, city)
+            desc = " ".join(words) or "semua"
+            if max_price is not None:
+                desc += f" ≤ Rp {int(max_price):,}"
+            if city:
+                desc += f" di {city}"
+            return _list_reply(f"🔎 {html.escape(desc)}:", lots)
+        if cmd == "/stats":
+            v = self.view
+            today_end = datetime.fromtimestamp(now, WIB).replace(hour=23, minute=59, second=59).timestamp()
+            lines = [f"📊 {len(v)} lot aktif, {len(v.ending(today_end, now, limit=10**9))} selesai hari ini"]
+            for name, n in v.by_instansi.most_common(5):
+                lines.append(f"🏢 {html.escape(str(name))}: {n}")
+            for name, n in v.by_kategori.most_common(5):
+                lines.append(f"📦 {html.escape(str(name))}: {n}")
+            if v.updated_at:
+                lines.append(f"🕒 update {datetime.fromtimestamp(v.updated_at, WIB).strftime('%d %b %H:%M')} WIB")
+            return "\n".join(lines)
+        return HELP
+
+    def poll(self, timeout: int = LONG_POLL_TIMEOUT) -> int:
+        """One getUpdates long-poll; answer every command received. Returns commands handled."""
+        url = f"https://api.telegram.org/bot{self.token}/getUpdates"
+        params = {"timeout": timeout, "allowed_updates": '["message"]'}
+        if self.offset is not None:
+            params["offset"] = self.offset
+        try:
+            r = retry.get(requests, url, retry.LIST_POLICY, params=params, timeout=timeout + 10)
+            updates = jsoncodec.response_json(r).get("result", []) if r.status_code == 200 else []
+        except Exception as e:
+            logger.warning(f"getUpdates gagal: {e}")
+            time.sleep(min(timeout, 5))
+            return 0
+        handled = 0
+        for upd in updates:
+            self.offset = upd.get("update_id", 0) + 1
+            msg = upd.get("message") or {}
+            text = msg.get("text") or ""
+            chat_id = str((msg.get("chat") or {}).get("id", ""))
+            if not text.startswith("/") or not chat_id:
+                continue
+            # jangan jawab command basi yang menumpuk selama bot mati
+            if msg.get("date", 0) < self.started_at - 60:
+                continue
+            if self.allowed is not None and chat_id not in self.allowed:
+                continue
+            try:
+                self.send(self.handle(text), chat_id)
+                handled += 1
+            except Exception as e:
+                logger.warning(f"Gagal jawab command {text!r}: {e}")
+        return handled
+
+    def serve_until(self, deadline: float):
+        """Answer commands until `deadline` (used instead of sleeping between checks)."""
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 1:
+                break
+            self.poll(int(min(LONG_POLL_TIMEOUT, remaining)))
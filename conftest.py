@@ -0,0 +1,13 @@
+"""
+conftest.py - Konfigurasi bersama test pytest
+
+app.py (dan modul yang di-import-nya) membaca konfigurasi saat import, jadi
+env minimum diset di sini sebelum modul test mana pun meng-import app.
+"""
+
+import os
+
+os.environ.setdefault("TELEGRAM_TOKEN", "test")
+os.environ.setdefault("TELEGRAM_CHAT_ID", "1")
+os.environ.setdefault("DEDUPE_MODE", "off")
+os.environ.setdefault("FRESHNESS_FILE", "")
@@ -7,6 +7,9 @@ import os
 import logging
 import requests
 
+import retry
+import jsoncodec
+
 logger = logging.getLogger(__name__)
 
 # ==============================
@@ -22,6 +25,8 @@ TG_API = f"https://api.telegram.org/bot{TG_TOKEN}/sendMessage" if TG_TOKEN else
 BASE_URL = "https://api.lelang.go.id/api/v1"
 KPKNL_ID = "6705ef6e-f64f-11ed-b3e2-5620a0c2ec5a"  # bisa disesuaikan
 CATEGORIES = ["Mobil", "Motor"]
+# seen-store sendiri (engine --profile core), jangan berbagi dengan seen_api.json milik app.py
+SEEN_FILE = os.getenv("CORE_SEEN_FILE", "seen_core.json")
 
 def make_session():
     """Bikin session HTTP dengan header default"""
@@ -36,9 +41,9 @@ def fetch_list(session):
     url = f"{BASE_URL}/landing-page-kpknl/{KPKNL_ID}/katalog-lot-lelang"
     params = [("namakategori[]", cat) for cat in CATEGORIES]
     try:
-        r = session.get(url, params=params, timeout=10)
+        r = retry.get(session, url, retry.LIST_POLICY, params=params, timeout=10)
         r.raise_for_status()
-        data = r.json()
+        data = jsoncodec.response_json(r)
         lots = data.get("data", [])
         logger.info(f"API balas {len(lots)} lot")
         return lots
@@ -50,9 +55,9 @@ def fetch_detail(session, lot_id):
     """Ambil detail lot"""
     url = f"{BASE_URL}/lot-lelang/{lot_id}"
     try:
-        r = session.get(url, timeout=10)
+        r = retry.get(session, url, retry.DETAIL_POLICY, timeout=10)
         r.raise_for_status()
-        return r.json().get("data", {})
+        return jsoncodec.response_json(r).get("data", {})
     except Exception as e:
         logger.error(f"Gagal fetch detail {lot_id}: {e}")
         return {}
@@ -65,7 +70,7 @@ def send_to_telegram(text):
         logger.warning("Telegram config tidak lengkap")
         return False
     try:
-        r = requests.post(TG_API, json={
+        r = retry.post(TG_API, retry.TELEGRAM_POLICY, json={
             "chat_id": TG_CHAT_ID,
             "text": text,
             "parse_mode": "HTML"
@@ -105,3 +110,10 @@ def send_lot(session, lot):
         return False
     msg = format_lot(detail)
     return send_to_telegram(msg)
+
+if __name__ == "__main__":
+    # core.py tidak punya loop sendiri; jalankan lewat engine asyncio:
+    # python core.py --engine [--once|--daemon]
+    import sys
+    import engine
+    engine.main(["--profile", "core"] + [a for a in sys.argv[1:] if a != "--engine"])
@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+dedupe.py - Deteksi lot yang hampir sama (dilelang ulang / KPKNL lain) dengan MinHash + LSH
+
+`main` hanya membuang lot dengan `lotLelangId` yang sama persis, padahal
+kendaraan yang gagal laku sering muncul lagi dengan id baru dan judul yang
+sedikit berbeda, kadang dari kantor lain. Membandingkan tiap lot baru dengan
+semua lot lama itu kuadratik, jadi di sini tiap lot diringkas jadi:
+
+ - fingerprint: token + bigram judul yang dinormalisasi, tahun, nomor rangka
+   dan nopol dari `content.barangs` (input yang sama dengan `build_uraian`)
+ - signature MinHash (`DEDUPE_PERMUTATIONS` hash) yang memperkirakan
+   kemiripan Jaccard antar fingerprint
+ - index LSH: signature dipotong jadi `DEDUPE_BANDS` band; lot yang berbagi
+   minimal satu band jadi kandidat, sisanya tidak pernah dibandingkan
+
+Nomor rangka / nopol yang sama persis langsung dianggap lot yang sama; nomor
+yang berbeda berarti barang berbeda walaupun judulnya mirip. Lookup hanya
+beberapa akses dict (sub-milidetik), index disimpan di `DEDUPE_FILE`.
+
+Mode (`DEDUPE_MODE`):
+    off       tidak ada pengecekan (default)
+    flag      kirim seperti biasa + catatan "kemungkinan lot ulang"
+    suppress  tidak dikirim sama sekali
+    note      kirim pesan pendek "dilelang ulang" tanpa foto
+
+    python dedupe.py rebuild --archive lelang_archive.sqlite3
+    python dedupe.py stats
+"""
+
+import os
+import re
+import sys
+import time
+import random
+import sqlite3
+import hashlib
+import operator
+import logging
+import argparse
+import threading
+from array import array
+from collections import Counter
+from typing import Optional, List, Dict, Any, Iterable, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEDUPE_MODE = os.getenv("DEDUPE_MODE", "off").strip().lower()
+DEDUPE_FILE = os.getenv("DEDUPE_FILE", "dedupe.sqlite3")
+DEDUPE_THRESHOLD = float(os.getenv("DEDUPE_THRESHOLD", "0.7"))
+DEDUPE_PERMUTATIONS = int(os.getenv("DEDUPE_PERMUTATIONS", "64"))
+DEDUPE_BANDS = int(os.getenv("DEDUPE_BANDS", "16"))
+DEDUPE_KEEP_DAYS = int(os.getenv("DEDUPE_KEEP_DAYS", "365"))
+
+MODES = ("off", "flag", "suppress", "note")
+
+# kandidat harus berbagi >= 2 band: lot yang cuma kebetulan sama merk/tahun
+# (1 band) tidak perlu diverifikasi; recall di similarity 0.8 tetap > 99%
+MIN_BAND_HITS = int(os.getenv("DEDUPE_MIN_BAND_HITS", "2"))
+
+# prima pertama > 2^32: hash 32-bit, a*x+b muat di int kecil
+_PRIME = 4294967311
+_MASK = 0xFFFFFFFF
+
+# kata pengisi judul yang tidak membedakan barang
+_STOPWORDS = {
+    "satu", "sebuah", "sebidang", "unit", "buah", "1", "dan", "di", "dengan", "yang", "atas", "nama",
+    "merek", "merk", "type", "tipe", "kendaraan", "roda", "no", "nomor", "pol", "nopol", "tahun", "th", "thn",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fingerprints (
+    lot_id      TEXT PRIMARY KEY,
+    title       TEXT,
+    link        TEXT,
+    tahun       INTEGER,
+    rangka      TEXT,
+    nopol       TEXT,
+    sig         BLOB NOT NULL,
+    added_at    REAL NOT NULL
+);
+"""
+
+
+# -----------------------------------------
+# FINGERPRINT
+# -----------------------------------------
+
+
+def norm_ident(s: Any) -> Optional[str]:
+    """Nomor rangka / nopol: uppercase alnum only ("AD 1234 XY" == "ad-1234-xy")."""
+    if not s:
+        return None
+    v = re.sub(r"[^0-9A-Za-z]", "", str(s)).upper()
+    return v if len(v) >= 4 and v not in ("TIDAKADA", "NONE") else None
+
+
+def title_tokens(title: str) -> List[str]:
+    words = re.findall(r"[0-9a-z]+", (title or "").lower())
+    return [w for w in words if w not in _STOPWORDS]
+
+
+def _barangs(detail: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    content = detail.get("content") if isinstance(detail, dict) and isinstance(detail.get("content"), dict) else {}
+    return [b for b in (content.get("barangs") or []) if isinstance(b, dict)]
+
+
+def _year(x: Any) -> Optional[int]:
+    try:
+        y = int(float(x))
+    except (TypeError, ValueError):
+        return None
+    return y if 1900 < y < 2200 else None
+
+
+def fingerprint(lot: Dict[str, Any], detail: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Shingles + identifiers of a lot (list item + optional detail)."""
+    title = lot.get("namaLotLelang") or lot.get("nama") or ""
+    tokens = title_tokens(title)
+    shingles: Set[str] = set(tokens)
+    shingles.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+    rangka, nopol, tahun = set(), set(), None
+    for b in _barangs(detail):
+        r = norm_ident(b.get("nomorRangka") or b.get("noRangka"))
+        p = norm_ident(b.get("nopol") or b.get("noPol"))
+        if r:
+            rangka.add(r)
+        if p:
+            nopol.add(p)
+        tahun = tahun or _year(b.get("tahun"))
+        shingles.update(title_tokens(str(b.get("nama") or b.get("namaBarang") or "")))
+    if tahun:
+        shingles.add(f"y:{tahun}")
+    # nomor rangka / nopol dicocokkan persis di index, tidak ikut MinHash: lot ulang
+    # yang detailnya belum/tidak memuat nomor tetap mirip dengan aslinya
+    return {"shingles": shingles, "tahun": tahun, "rangka": rangka, "nopol": nopol, "title": title}
+
+
+# -----------------------------------------
+# MINHASH
+# -----------------------------------------
+
+
+class MinHasher:
+    """`num_perm` universal hashes (a*x + b mod p) over 32-bit shingle hashes."""
+
+    def __init__(self, num_perm: int = DEDUPE_PERMUTATIONS, seed: int = 1):
+        rnd = random.Random(seed)
+        self.num_perm = num_perm
+        self.perms = [(rnd.randrange(1, _PRIME), rnd.randrange(0, _PRIME)) for _ in range(num_perm)]
+
+    @staticmethod
+    def _base(shingle: str) -> int:
+        # hash() Python diacak per proses; signature harus stabil di disk
+        return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "little")
+
+    def signature(self, shingles: Iterable[str]) -> array:
+        xs = [self._base(s) for s in shingles]
+        if not xs:
+            return array("I", [_MASK] * self.num_perm)
+        # satu baris hash per shingle, min per kolom (zip/min jalan di C)
+        rows = [[(a * x + b) % _PRIME for a, b in self.perms] for x in xs]
+        return array("I", [m & _MASK for m in map(min, zip(*rows))])
+
+
+def similarity(a: array, b: array) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(map(operator.eq, a, b)) / len(a) if len(a) else 0.0
+
+
+# -----------------------------------------
+# INDEX
+# -----------------------------------------
+
+
+class Match:
+    """An earlier lot that the new one (probably) duplicates."""
+
+    def __init__(self, lot_id: str, title: str, link: str, score: float, reason: str):
+        self.lot_id = lot_id
+        self.title = title
+        self.link = link
+        self.score = score
+        self.reason = reason
+
+    def __repr__(self):
+        return f"Match({self.lot_id}, {self.reason}, {self.score:.2f})"
+
+
+class DedupeIndex:
+    """LSH buckets + exact identifier maps in memory, fingerprints persisted in SQLite."""
+
+    def __init__(self, path: Optional[str] = DEDUPE_FILE, threshold: float = DEDUPE_THRESHOLD,
+                 num_perm: int = DEDUPE_PERMUTATIONS, bands: int = DEDUPE_BANDS):
+        if num_perm % bands:
+            raise ValueError("DEDUPE_PERMUTATIONS harus kelipatan DEDUPE_BANDS")
+        self.path = path
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.buckets: List[Dict[Tuple[int, ...], List[str]]] = [{} for _ in range(bands)]
+        self.by_ident: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if path:
+            with self._conn() as c:
+                c.executescript(SCHEMA)
+            self.load()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def load(self):
+        cutoff = time.time() - DEDUPE_KEEP_DAYS * 86400
+        with self._conn() as c:
+            c.execute("DELETE FROM fingerprints WHERE added_at < ?", (cutoff,))
+            rows = c.execute("SELECT lot_id, title, link, tahun, rangka, nopol, sig FROM fingerprints").fetchall()
+        for lot_id, title, link, tahun, rangka, nopol, blob in rows:
+            sig = array("I")
+            sig.frombytes(blob)
+            if len(sig) != self.hasher.num_perm:
+                continue  # DEDUPE_PERMUTATIONS berubah: entry lama diabaikan
+            self._insert(lot_id, {"title": title, "link": link, "tahun": tahun, "sig": sig,
+                                  "rangka": set(filter(None, (rangka or "").split(","))),
+                                  "nopol": set(filter(None, (nopol or "").split(",")))})
+        logger.debug(f"Index dedupe: {len(self.entries)} lot dari {self.path}")
+
+    def _band_keys(self, sig: array) -> List[Tuple[int, ...]]:
+        r = self.rows
+        return [tuple(sig[i * r:(i + 1) * r]) for i in range(self.bands)]
+
+    def _insert(self, lot_id: str, entry: Dict[str, Any]):
+        self.entries[lot_id] = entry
+        for band, key in zip(self.buckets, self._band_keys(entry["sig"])):
+            band.setdefault(key, []).append(lot_id)
+        for ident in entry["rangka"]:
+            self.by_ident[f"r:{ident}"] = lot_id
+        for ident in entry["nopol"]:
+            self.by_ident[f"p:{ident}"] = lot_id
+
+    def _find(self, lot_id: str, fp: Dict[str, Any], sig: array) -> Optional[Match]:
+        # 1) identitas barang sama persis
+        for kind, idents in (("r", fp["rangka"]), ("p", fp["nopol"])):
+            for ident in idents:
+                other = self.by_ident.get(f"{kind}:{ident}")
+                if other and other != lot_id:
+                    e = self.entries[other]
+                    return Match(other, e["title"], e["link"], 1.0, "nomor rangka" if kind == "r" else "nopol")
+        # 2) kandidat LSH, diverifikasi dengan estimasi Jaccard
+        hits: Counter = Counter()
+        for band, key in zip(self.buckets, self._band_keys(sig)):
+            hits.update(band.get(key, ()))
+        hits.pop(lot_id, None)
+        best: Optional[Match] = None
+        for other, n in hits.items():
+            if n < MIN_BAND_HITS:
+                continue
+            e = self.entries[other]
+            # identitas yang sama-sama ada tapi berbeda -> barang berbeda
+            if (fp["rangka"] and e["rangka"] and not fp["rangka"] & e["rangka"]) or \
+               (fp["nopol"] and e["nopol"] and not fp["nopol"] & e["nopol"]):
+                continue
+            if fp["tahun"] and e["tahun"] and fp["tahun"] != e["tahun"]:
+                continue
+            score = similarity(sig, e["sig"])
+            if score >= self.threshold and (best is None or score > best.score):
+                best = Match(other, e["title"], e["link"], score, "judul mirip")
+        return best
+
+    def lookup(self, lot: Dict[str, Any], detail: Optional[Dict[str, Any]] = None) -> Optional[Match]:
+        lot_id = str(lot.get("lotLelangId") or lot.get("id"))
+        fp = fingerprint(lot, detail)
+        sig = self.hasher.signature(fp["shingles"])
+        with self._lock:
+            return self._find(lot_id, fp, sig)
+
+    def observe(self, lot: Dict[str, Any], detail: Optional[Dict[str, Any]] = None, link: str = "") -> Optional[Match]:
+        """Check a new lot against the index, then add it (atomically). Returns the match, if any."""
+        lot_id = str(lot.get("lotLelangId") or lot.get("id"))
+        fp = fingerprint(lot, detail)
+        sig = self.hasher.signature(fp["shingles"])
+        entry = {"title": fp["title"], "link": link, "tahun": fp["tahun"], "sig": sig,
+                 "rangka": fp["rangka"], "nopol": fp["nopol"]}
+        with self._lock:
+            match = self._find(lot_id, fp, sig)
+            if lot_id not in self.entries:
+                self._insert(lot_id, entry)
+        if self.path:
+            self._persist([(lot_id, entry)])
+        return match
+
+    def add_many(self, items: Iterable[Tuple[Dict[str, Any], Optional[Dict[str, Any]], str]]) -> int:
+        """Bulk-add (lot, detail, link) without checking; one transaction."""
+        added = []
+        with self._lock:
+            for lot, detail, link in items:
+                lot_id = str(lot.get("lotLelangId") or lot.get("id"))
+                if lot_id in self.entries:
+                    continue
+                fp = fingerprint(lot, detail)
+                entry = {"title": fp["title"], "link": link, "tahun": fp["tahun"],
+                         "sig": self.hasher.signature(fp["shingles"]), "rangka": fp["rangka"], "nopol": fp["nopol"]}
+                self._insert(lot_id, entry)
+                added.append((lot_id, entry))
+        if self.path and added:
+            self._persist(added)
+        return len(added)
+
+    def _persist(self, items: List[Tuple[str, Dict[str, Any]]]):
+        now = time.time()
+        try:
+            with self._conn() as c:
+                c.executemany(
+                    "INSERT OR IGNORE INTO fingerprints(lot_id, title, link, tahun, rangka, nopol, sig, added_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(lot_id, e["title"], e["link"], e["tahun"], ",".join(sorted(e["rangka"])),
+                      ",".join(sorted(e["nopol"])), e["sig"].tobytes(), now) for lot_id, e in items],
+                )
+        except Exception as e:
+            logger.warning(f"Gagal simpan index dedupe: {e}")
+
+
+def index_from_env(mode: str = DEDUPE_MODE) -> Optional[DedupeIndex]:
+    if mode not in MODES:
+        logger.warning(f"DEDUPE_MODE '{mode}' tidak dikenal, dedupe dimatikan")
+        return None
+    if mode == "off":
+        return None
+    return DedupeIndex(DEDUPE_FILE)
+
+
+# -----------------------------------------
+# CLI
+# -----------------------------------------
+
+
+def rebuild_from_archive(index: DedupeIndex, archive_path: str) -> int:
+    """Seed the index from archive.py's lots + barangs tables."""
+    import jsoncodec
+    conn = sqlite3.connect(archive_path)
+    barangs: Dict[str, List[Dict[str, Any]]] = {}
+    for lot_id, nama, tahun, nopol, rangka in conn.execute("SELECT lot_id, nama, tahun, nopol, nomor_rangka FROM barangs ORDER BY lot_id, idx"):
+        barangs.setdefault(lot_id, []).append({"nama": nama, "tahun": tahun, "nopol": nopol, "nomorRangka": rangka})
+
+    def items():
+        for lot_id, raw in conn.execute("SELECT lot_id, raw FROM lots ORDER BY first_seen"):
+            try:
+                lot = jsoncodec.loads(raw) if raw else {"lotLelangId": lot_id}
+            except ValueError:
+                lot = {"lotLelangId": lot_id}
+            lot.setdefault("lotLelangId", lot_id)
+            yield lot, {"content": {"barangs": barangs.get(lot_id, [])}}, ""
+
+    try:
+        return index.add_many(items())
+    finally:
+        conn.close()
+
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description="Index dedupe lot (MinHash + LSH)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    rb = sub.add_parser("rebuild", help="isi index dari arsip lot")
+    rb.add_argument("--archive", default=os.getenv("ARCHIVE_FILE", "lelang_archive.sqlite3"))
+    sub.add_parser("stats", help="jumlah lot di index")
+    args = ap.parse_args(argv)
+
+    index = DedupeIndex(DEDUPE_FILE)
+    if args.cmd == "rebuild":
+        t = time.perf_counter()
+        n = rebuild_from_archive(index, args.archive)
+        print(f"{n} lot ditambahkan dari {args.archive} ({time.perf_counter() - t:.1f}s), total {len(index)}")
+    else:
+        print(f"{len(index)} lot di {DEDUPE_FILE}, {index.bands} band x {index.rows} baris, threshold {index.threshold}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+delivery_queue.py - Antrian kirim Telegram yang persisten (SQLite)
+
+Tahap fetch cukup meng-enqueue pesan yang SUDAH dirender (caption + bytes foto),
+lalu worker terpisah yang mengirim ke Telegram. Dengan begitu:
+ - kecepatan fetch tidak tertahan latency Telegram
+ - pesan yang gagal tidak hilang: di-retry dengan exponential backoff, dan
+   setelah `DELIVERY_MAX_ATTEMPTS` dipindah ke status 'dead' (dead-letter)
+ - tiap pesan punya idempotency key (mis. `lot:<id>:chat:<chat_id>`), jadi
+   enqueue ulang lot yang sama (crash sebelum seen tersimpan) tidak double-post
+
+Media (foto) disimpan sekali per isi (sha1) dan dipakai bersama oleh semua
+pesan yang mereferensikannya; file_id Telegram disimpan setelah upload pertama
+supaya chat lain cukup kirim ulang by file_id.
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Optional, List, Dict, Any, Callable
+
+import jsoncodec
+
+logger = logging.getLogger(__name__)
+
+QUEUE_FILE = os.getenv("DELIVERY_QUEUE_FILE", "outbox.sqlite3")
+MAX_ATTEMPTS = int(os.getenv("DELIVERY_MAX_ATTEMPTS", "8"))
+BACKOFF_BASE = float(os.getenv("DELIVERY_BACKOFF_BASE", "30"))  # detik
+BACKOFF_CAP = float(os.getenv("DELIVERY_BACKOFF_CAP", "3600"))
+# jeda antar pesan (pengganti time.sleep(0.3) antar lot yang lama)
+SEND_INTERVAL = float(os.getenv("DELIVERY_SEND_INTERVAL", "0.3"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    idem_key TEXT NOT NULL UNIQUE,
+    lot_id TEXT,
+    -- lot yang diumumkan pesan ringkasan (digest), JSON list
+    lot_ids TEXT NOT NULL DEFAULT '[]',
+    chat_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    text TEXT NOT NULL,
+    followup TEXT,
+    media TEXT NOT NULL DEFAULT '[]',
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    sent_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_due ON messages(status, next_attempt_at, id);
+CREATE TABLE IF NOT EXISTS media (
+    key TEXT PRIMARY KEY,
+    data BLOB,
+    url TEXT,
+    file_id TEXT
+);
+"""
+
+
+def backoff_delay(attempts: int) -> float:
+    """Exponential backoff: BACKOFF_BASE * 2^(attempts-1), capped at BACKOFF_CAP."""
+    return min(BACKOFF_CAP, BACKOFF_BASE * (2 ** max(0, attempts - 1)))
+
+
+class DeliveryQueue:
+    """SQLite-backed outbox. One connection per thread (fetch stage + worker)."""
+
+    def __init__(self, path: str = QUEUE_FILE):
+        self.path = path
+        self._local = threading.local()
+        with self._conn() as c:
+            c.executescript(SCHEMA)
+            cols = {r["name"] for r in c.execute("PRAGMA table_info(messages)")}
+            if "followup" not in cols:
+                # antrian lama (sebelum ada followup)
+                c.execute("ALTER TABLE messages ADD COLUMN followup TEXT")
+            if "lot_ids" not in cols:
+                c.execute("ALTER TABLE messages ADD COLUMN lot_ids TEXT NOT NULL DEFAULT '[]'")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ---------- producer side ----------
+
+    def put_media(self, data: Optional[bytes] = None, url: Optional[str] = None) -> str:
+        """Store photo bytes (or just a URL) once; return its media key."""
+        key = hashlib.sha1(data if data is not None else (url or "").encode("utf-8")).hexdigest()
+        with self._conn() as c:
+            c.execute(
+                "INSERT INTO media(key, data, url) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET data = COALESCE(media.data, excluded.data), url = COALESCE(media.url, excluded.url)",
+                (key, data, url),
+            )
+        return key
+
+    def enqueue(self, idem_key: str, chat_id: str, text: str, kind: str = "text", media: Optional[List[str]] = None, lot_id: Optional[str] = None, followup: Optional[str] = None,
+                lot_ids: Optional[List[str]] = None) -> bool:
+        """Enqueue a rendered message. Returns False if `idem_key` was already queued.
+
+        `followup` is an optional text message sent right after the photo (used when
+        the full text does not fit in a photo caption). `lot_ids` lists the lots a
+        message announces when it is not about a single `lot_id` (digest).
+        """
+        now = time.time()
+        with self._conn() as c:
+            cur = c.execute(
+                "INSERT OR IGNORE INTO messages(idem_key, lot_id, lot_ids, chat_id, kind, text, followup, media, next_attempt_at, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (idem_key, lot_id, jsoncodec.dumps_str(lot_ids or []), str(chat_id), kind, text, followup,
+                 jsoncodec.dumps_str(media or []), now, now),
+            )
+        if cur.rowcount == 0:
+            logger.debug(f"Pesan {idem_key} sudah ada di antrian, lewati")
+            return False
+        return True
+
+    # ---------- consumer side ----------
+
+    def due(self, limit: int = 50, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        now = time.time() if now is None else now
+        rows = self._conn().execute(
+            "SELECT * FROM messages WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+            (now, limit),
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    def media_for(self, msg: Dict[str, Any]) -> List[Dict[str, Any]]:
+        keys = jsoncodec.loads(msg.get("media") or "[]")
+        out = []
+        for key in keys:
+            row = self._conn().execute("SELECT key, data, url, file_id FROM media WHERE key = ?", (key,)).fetchone()
+            if row:
+                out.append(dict(row))
+        return out
+
+    def update_content(self, msg_id: int, kind: str, text: str, followup: Optional[str]):
+        """Persist what is left to send after a partial delivery."""
+        with self._conn() as c:
+            c.execute("UPDATE messages SET kind = ?, text = ?, followup = ? WHERE id = ?", (kind, text, followup, msg_id))
+
+    def set_file_id(self, key: str, file_id: str):
+        with self._conn() as c:
+            c.execute("UPDATE media SET file_id = ? WHERE key = ?", (file_id, key))
+
+    def mark_sent(self, msg_id: int):
+        with self._conn() as c:
+            c.execute("UPDATE messages SET status = 'sent', sent_at = ?, last_error = NULL WHERE id = ?", (time.time(), msg_id))
+
+    def mark_failed(self, msg_id: int, error: str) -> str:
+        """Record a failed attempt; reschedule with backoff or dead-letter. Returns new status."""
+        c = self._conn()
+        row = c.execute("SELECT attempts FROM messages WHERE id = ?", (msg_id,)).fetchone()
+        attempts = (row["attempts"] if row else 0) + 1
+        status = "dead" if attempts >= MAX_ATTEMPTS else "pending"
+        with c:
+            c.execute(
+                "UPDATE messages SET attempts = ?, status = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (attempts, status, time.time() + backoff_delay(attempts), error[:500], msg_id),
+            )
+        return status
+
+    def requeue_dead(self) -> int:
+        """Move dead-lettered messages back to pending (manual recovery)."""
+        with self._conn() as c:
+            cur = c.execute("UPDATE messages SET status = 'pending', attempts = 0, next_attempt_at = ? WHERE status = 'dead'", (time.time(),))
+        return cur.rowcount
+
+    def stats(self) -> Dict[str, int]:
+        rows = self._conn().execute("SELECT status, COUNT(*) AS n FROM messages GROUP BY status").fetchall()
+        return {r["status"]: r["n"] for r in rows}
+
+    def purge(self, keep_days: float = 30) -> int:
+        """Drop old sent messages and media blobs no longer referenced by unsent messages."""
+        c = self._conn()
+        with c:
+            cur = c.execute("DELETE FROM messages WHERE status = 'sent' AND sent_at < ?", (time.time() - keep_days * 86400,))
+            live = set()
+            for (media,) in c.execute("SELECT media FROM messages WHERE status != 'sent'"):
+                live.update(jsoncodec.loads(media or "[]"))
+            for (key,) in c.execute("SELECT key FROM media WHERE data IS NOT NULL").fetchall():
+                if key not in live:
+                    c.execute("UPDATE media SET data = NULL WHERE key = ?", (key,))
+        return cur.rowcount
+
+
+# -----------------------------------------
+# WORKER
+# -----------------------------------------
+
+# sender(msg, media) -> bool. `media` = list of {key, data, url, file_id}; the sender
+# may fill in `file_id` for uploaded photos, and may rewrite msg kind/text/followup
+# after a partial delivery; the worker persists both.
+Sender = Callable[[Dict[str, Any], List[Dict[str, Any]]], bool]
+
+
+def drain(queue: DeliveryQueue, sender: Sender, max_messages: Optional[int] = None) -> int:
+    """Send every due message once. Returns the number sent successfully."""
+    sent = 0
+    handled = 0
+    while True:
+        batch = queue.due(limit=50)
+        if not batch:
+            break
+        for msg in batch:
+            media = queue.media_for(msg)
+            known = {m["key"]: m.get("file_id") for m in media}
+            content = (msg["kind"], msg["text"], msg.get("followup"))
+            try:
+                ok = sender(msg, media)
+                err = "" if ok else "sender returned False"
+            except Exception as e:
+                ok, err = False, f"{type(e).__name__}: {e}"
+            for m in media:
+                if m.get("file_id") and m["file_id"] != known.get(m["key"]):
+                    queue.set_file_id(m["key"], m["file_id"])
+            if (msg["kind"], msg["text"], msg.get("followup")) != content:
+                queue.update_content(msg["id"], msg["kind"], msg["text"], msg.get("followup"))
+            if ok:
+                queue.mark_sent(msg["id"])
+                sent += 1
+            else:
+                status = queue.mark_failed(msg["id"], err)
+                if status == "dead":
+                    logger.error(f"Pesan {msg['idem_key']} dipindah ke dead-letter: {err}")
+                else:
+                    logger.warning(f"Pesan {msg['idem_key']} gagal, akan di-retry: {err}")
+            handled += 1
+            if max_messages is not None and handled >= max_messages:
+                return sent
+            time.sleep(SEND_INTERVAL)
+    return sent
+
+
+class DeliveryWorker(threading.Thread):
+    """Background thread that keeps draining the queue while the fetch stage runs.
+
+    `stop()` asks it to finish whatever is due right now and exit; messages that
+    are backing off stay in the queue for the next run.
+    """
+
+    def __init__(self, queue_path: str, sender: Sender, poll_interval: float = 0.5):
+        super().__init__(name="delivery-worker", daemon=True)
+        self.queue_path = queue_path
+        self.sender = sender
+        self.poll_interval = poll_interval
+        self.sent = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        queue = DeliveryQueue(self.queue_path)
+        while True:
+            stopping = self._stop_event.is_set()
+            try:
+                self.sent += drain(queue, self.sender)
+            except Exception as e:
+                logger.error(f"Delivery worker error: {e}")
+            if stopping:
+                break
+            self._stop_event.wait(self.poll_interval)
+
+    def stop(self, timeout: Optional[float] = None) -> int:
+        self._stop_event.set()
+        self.join(timeout)
+        return self.sent
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+digest.py - Mode ringkasan saat banyak lot baru muncul sekaligus
+
+Kalau satu KPKNL menerbitkan batch besar, satu pesan (plus upload foto) per
+lot membanjiri channel: 60 lot = 60-180 panggilan Telegram. Begitu jumlah lot
+baru dalam satu run mencapai `DIGEST_THRESHOLD`, lot dikelompokkan per
+instansi / lokasi (`DIGEST_GROUP_BY`) dan dikemas ke beberapa pesan HTML yang
+masing-masing muat dalam batas 4096 karakter Telegram, ditambah paling banyak
+satu album foto cover (`DIGEST_ALBUM_SIZE`, maks 10 sesuai sendMediaGroup).
+
+Modul ini hanya mengurus pengelompokan dan pengemasan; render baris per lot
+dan pengiriman tetap di app.py.
+"""
+
+import os
+import hashlib
+from collections import OrderedDict
+from typing import Callable, Dict, Any, List, Tuple
+
+from caption_budget import MESSAGE_LIMIT, visible_len
+
+# 0 = mode digest mati
+DIGEST_THRESHOLD = int(os.getenv("DIGEST_THRESHOLD", "10"))
+DIGEST_GROUP_BY = os.getenv("DIGEST_GROUP_BY", "instansi").strip().lower()
+DIGEST_ALBUM_SIZE = max(0, min(10, int(os.getenv("DIGEST_ALBUM_SIZE", "10"))))
+
+_GROUP_FIELDS = {
+    "instansi": ("namaUnitKerja", "instansi"),
+    "lokasi": ("namaLokasi", "lokasi"),
+}
+
+
+def use_digest(new_count: int, threshold: int = DIGEST_THRESHOLD) -> bool:
+    return threshold > 0 and new_count >= threshold
+
+
+def group_key(lot: Dict[str, Any], by: str = DIGEST_GROUP_BY) -> str:
+    for field in _GROUP_FIELDS.get(by, _GROUP_FIELDS["instansi"]):
+        if lot.get(field):
+            return str(lot[field]).strip()
+    return "(tidak diketahui)"
+
+
+def group_lots(lots: List[Dict[str, Any]], by: str = DIGEST_GROUP_BY) -> List[Tuple[str, List[Dict[str, Any]]]]:
+    """Group lots by instansi/lokasi, keeping the order of first appearance."""
+    groups: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+    for lot in lots:
+        groups.setdefault(group_key(lot, by), []).append(lot)
+    return list(groups.items())
+
+
+def pack_digest(groups: List[Tuple[str, List[str]]], header: Callable[[int, int], str],
+                heading: Callable[[str, int], str], limit: int = MESSAGE_LIMIT) -> List[str]:
+    """Pack `(group title, rendered lines)` into as few messages as fit `limit`.
+
+    `header(part, total)` is rendered on top of each message and `heading(title,
+    count)` above each group; a group that does not fit is continued in the next
+    message under the same heading.
+    """
+    # sisakan ruang header untuk nomor bagian terpanjang yang mungkin
+    budget = limit - visible_len(header(99, 99))
+    parts: List[List[str]] = []
+    cur: List[str] = []
+    used = 0
+
+    def flush():
+        nonlocal cur, used
+        if cur:
+            parts.append(cur)
+        cur, used = [], 0
+
+    for title, lines in groups:
+        head = heading(title, len(lines))
+        head_len = visible_len(head) + 1
+        for i, line in enumerate(lines):
+            line_len = visible_len(line) + 1
+            need = line_len + (head_len if i == 0 or not cur else 0)
+            if cur and used + need > budget:
+                flush()
+            if i == 0 or not cur:
+                cur.append(head)
+                used += head_len
+            cur.append(line)
+            used += line_len
+    flush()
+
+    total = len(parts)
+    return [header(n, total) + "\n" + "\n".join(p) for n, p in enumerate(parts, 1)]
+
+
+def digest_id(lot_ids: List[str]) -> str:
+    """Stable id for a batch of lots (idempotency key of its messages)."""
+    return hashlib.sha1("\n".join(sorted(lot_ids)).encode("utf-8")).hexdigest()[:16]
@@ -0,0 +1,716 @@
+#!/usr/bin/env python3
+"""
+engine.py - Engine asyncio tunggal untuk semua entry point
+
+app.py, core.py, bot.py dan monitor_lelang_api.py masing-masing punya kode
+fetch, seen-store dan Telegram sendiri di atas `requests` yang blocking, jadi
+tidak ada I/O yang bisa overlap. Engine ini menjalankan semuanya di satu event
+loop dengan aiohttp:
+
+ - satu `ClientSession` dengan connection pool per host (`ENGINE_PER_HOST`)
+ - retry/backoff, circuit breaker, AIMD per host dan budget `UPSTREAM_RPM`
+   memakai kebijakan yang sama dengan retry.py
+ - tiap lot baru diproses sebagai pipeline sendiri (detail -> foto -> kirim)
+   di dalam `asyncio.TaskGroup` (structured concurrency; Python < 3.11 pakai
+   gather yang membatalkan sisanya saat ada error); ratusan lot bisa
+   jalan bersamaan (`ENGINE_CONCURRENCY`), pengiriman ke Telegram tetap
+   berurutan sesuai urutan list
+ - profil per script (`app`, `monitor`, `bot`, `core`) memakai fungsi render,
+   filter dan seen-store milik script itu sendiri, jadi pesan yang keluar sama
+ - belum ada lease/klaim lintas worker: dengan `COORDINATOR` di-set engine
+   menolak jalan (pakai loop biasa) supaya fleet ber-shard tidak double-post
+
+Pemakaian:
+    python engine.py --profile app --once          # sama dengan cron `python app.py`
+    python engine.py --profile monitor --daemon    # loop seperti monitor_lelang_api.py
+    python app.py --engine                         # front end tipis di tiap script
+"""
+
+import os
+import sys
+import abc
+import time
+import asyncio
+import logging
+import argparse
+from typing import Any, Callable, Dict, List, Optional
+
+import requests
+
+import retry
+import jsoncodec
+from memory_budget import budget_from_env
+from sharding import COORDINATOR
+from retry import RetryPolicy, CircuitOpenError, LIST_POLICY, DETAIL_POLICY, PHOTO_POLICY, TELEGRAM_POLICY
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover - optional
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+
+ENGINE_CONCURRENCY = int(os.getenv("ENGINE_CONCURRENCY", "200"))
+ENGINE_PER_HOST = int(os.getenv("ENGINE_PER_HOST", "8"))
+HTTP_TIMEOUT = int(os.getenv("HTTP_TIMEOUT", "18"))
+TELEGRAM_API = os.getenv("TELEGRAM_API", "https://api.telegram.org").rstrip("/")
+
+# MEMORY_BUDGET_MB: batasi lot in-flight (dihitung sampai lot terkirim, termasuk fotonya)
+MEMORY = budget_from_env()
+
+
+# -----------------------------------------
+# HTTP CLIENT
+# -----------------------------------------
+
+
+class Response:
+    """Fully-read response (status, headers, body bytes).
+
+    `too_large` is set (and `content` left empty) when the body went over the
+    request's `max_bytes`; the rest of it was never read.
+    """
+
+    def __init__(self, status: int, headers: Dict[str, str], body: bytes, too_large: bool = False):
+        self.status_code = status
+        self.headers = headers
+        self.content = body
+        self.too_large = too_large
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", "replace")
+
+    def json(self) -> Any:
+        return jsoncodec.loads(self.content)
+
+
+class _HostLimit:
+    """Async in-flight gate driven by the same AIMD rules as retry.AIMDLimiter."""
+
+    def __init__(self, host: str):
+        self.aimd = retry.AIMDLimiter(host)
+        self.inflight = 0
+        self.cond = asyncio.Condition()
+
+    async def acquire(self):
+        async with self.cond:
+            await self.cond.wait_for(lambda: self.inflight < int(self.aimd.limit))
+            self.inflight += 1
+
+    async def release(self, elapsed: float, congested: bool):
+        async with self.cond:
+            self.inflight -= 1
+            self.aimd.record(elapsed, congested)
+            self.cond.notify_all()
+
+
+class AsyncHTTP:
+    """aiohttp session with retry/backoff, circuit breaker and politeness of retry.py."""
+
+    def __init__(self, user_agent: str, per_host: int = ENGINE_PER_HOST, timeout: float = HTTP_TIMEOUT):
+        if aiohttp is None:
+            raise RuntimeError("engine.py butuh paket `aiohttp` (pip install aiohttp)")
+        self.user_agent = user_agent
+        self.per_host = per_host
+        self.timeout = timeout
+        self.session: Optional["aiohttp.ClientSession"] = None
+        self._limits: Dict[str, _HostLimit] = {}
+
+    async def __aenter__(self) -> "AsyncHTTP":
+        connector = aiohttp.TCPConnector(limit=0, limit_per_host=self.per_host, ttl_dns_cache=300)
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={"User-Agent": self.user_agent},
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    def _limit(self, host: str) -> _HostLimit:
+        lim = self._limits.get(host)
+        if lim is None:
+            lim = self._limits[host] = _HostLimit(host)
+        return lim
+
+    @staticmethod
+    async def _read(r, max_bytes: Optional[int]) -> Response:
+        """Read the body, giving up as soon as it exceeds `max_bytes` (like app.read_capped)."""
+        headers = dict(r.headers)
+        if max_bytes is None:
+            return Response(r.status, headers, await r.read())
+        if r.content_length is not None and r.content_length > max_bytes:
+            return Response(r.status, headers, b"", too_large=True)
+        buf = bytearray()
+        async for chunk in r.content.iter_chunked(64 * 1024):
+            buf += chunk
+            if len(buf) > max_bytes:
+                return Response(r.status, headers, b"", too_large=True)
+        return Response(r.status, headers, bytes(buf))
+
+    async def _send(self, method: str, url: str, polite: bool, host: str, max_bytes: Optional[int] = None, **kwargs) -> Response:
+        if not polite:
+            async with self.session.request(method, url, **kwargs) as r:
+                return await self._read(r, max_bytes)
+        await asyncio.sleep(retry.BUDGET.reserve())
+        lim = self._limit(host)
+        await lim.acquire()
+        start = time.monotonic()
+        congested = True
+        try:
+            async with self.session.request(method, url, **kwargs) as r:
+                resp = await self._read(r, max_bytes)
+            congested = resp.status_code == 429 or resp.status_code >= 500
+            return resp
+        finally:
+            await lim.release(time.monotonic() - start, congested)
+
+    @staticmethod
+    def _retryable(policy: RetryPolicy, e: BaseException) -> bool:
+        # policy.exceptions berisi kelas exception `requests`; petakan dari aiohttp
+        equiv = requests.Timeout if isinstance(e, asyncio.TimeoutError) else requests.ConnectionError
+        return issubclass(equiv, policy.exceptions)
+
+    async def request(self, method: str, url: str, policy: RetryPolicy = DETAIL_POLICY,
+                      max_bytes: Optional[int] = None, **kwargs) -> Response:
+        """Async counterpart of retry.request (same return/raise contract).
+
+        With `max_bytes` the body is streamed and abandoned past that size
+        (`Response.too_large`) instead of being buffered whole.
+        """
+        breaker = retry.breaker_for(url)
+        polite = retry.is_polite_host(breaker.host)
+        last_exc: Optional[BaseException] = None
+        resp = None
+        for attempt in range(1, policy.attempts + 1):
+            if not breaker.allow():
+                raise CircuitOpenError(f"circuit {breaker.host} open")
+            try:
+                resp = await self._send(method, url, polite, breaker.host, max_bytes=max_bytes, **kwargs)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                breaker.record_failure()
+                last_exc, resp = e, None
+                logger.debug(f"{method} {url} attempt {attempt} error: {e!r}")
+                if not self._retryable(policy, e):
+                    raise
+                if attempt < policy.attempts:
+                    await asyncio.sleep(policy.delay(attempt))
+                continue
+            if resp.status_code in policy.statuses:
+                if resp.status_code >= 500 or resp.status_code == 429:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                if attempt < policy.attempts:
+                    d = policy.delay(attempt)
+                    ra = retry._retry_after(resp)
+                    if ra is not None:
+                        d = max(d, min(ra, policy.cap * 4))
+                    await asyncio.sleep(d)
+                continue
+            breaker.record_success()
+            return resp
+        if resp is not None:
+            return resp
+        raise last_exc if last_exc else RuntimeError(f"{method} {url} gagal")
+
+    async def get(self, url: str, policy: RetryPolicy = DETAIL_POLICY, **kwargs) -> Response:
+        return await self.request("GET", url, policy, **kwargs)
+
+    async def post(self, url: str, policy: RetryPolicy = TELEGRAM_POLICY, **kwargs) -> Response:
+        return await self.request("POST", url, policy, **kwargs)
+
+
+# -----------------------------------------
+# TELEGRAM
+# -----------------------------------------
+
+
+class AsyncTelegram:
+    """sendMessage / sendPhoto (URL, file_id or bytes) on top of AsyncHTTP."""
+
+    def __init__(self, http: AsyncHTTP, token: str, default_chat: str):
+        self.http = http
+        self.base = f"{TELEGRAM_API}/bot{token}"
+        self.default_chat = default_chat
+
+    async def send_text(self, text: str, chat_id: Optional[str] = None, **extra) -> bool:
+        data = {"chat_id": chat_id or self.default_chat, "text": text, "parse_mode": "HTML", **extra}
+        try:
+            r = await self.http.post(f"{self.base}/sendMessage", TELEGRAM_POLICY, data=data)
+        except Exception as e:
+            logger.warning(f"sendMessage gagal: {e!r}")
+            return False
+        if r.status_code != 200:
+            logger.warning(f"sendMessage gagal: {r.status_code} - {r.text}")
+        return r.status_code == 200
+
+    async def send_photo(self, media: Dict[str, Any], caption: str, chat_id: Optional[str] = None) -> bool:
+        """Send one media dict ({"url","data","file_id"}); writes file_id back after upload."""
+        form = aiohttp.FormData()
+        form.add_field("chat_id", str(chat_id or self.default_chat))
+        form.add_field("caption", caption)
+        form.add_field("parse_mode", "HTML")
+        if media.get("file_id"):
+            form.add_field("photo", media["file_id"])
+        elif media.get("data"):
+            form.add_field("photo", media["data"], filename="photo.jpg", content_type="image/jpeg")
+        elif media.get("url"):
+            form.add_field("photo", media["url"])
+        else:
+            return False
+        try:
+            r = await self.http.post(f"{self.base}/sendPhoto", TELEGRAM_POLICY, data=form)
+        except Exception as e:
+            logger.warning(f"sendPhoto gagal: {e!r}")
+            return False
+        if r.status_code != 200:
+            logger.warning(f"sendPhoto gagal: {r.status_code} - {r.text}")
+            return False
+        try:
+            sizes = r.json().get("result", {}).get("photo") or []
+            if sizes and not media.get("file_id"):
+                media["file_id"] = sizes[-1].get("file_id")
+        except Exception:
+            pass
+        return True
+
+    async def deliver(self, msg: Dict[str, Any]) -> bool:
+        """Same shape as delivery_queue messages: photos first, then followup; text fallback."""
+        chat_id, text, followup = msg["chat_id"], msg["text"], msg.get("followup")
+        if msg.get("kind") == "photo" and msg.get("media"):
+            sent_any = False
+            for m in msg["media"]:
+                if await self.send_photo(m, text if not sent_any else "", chat_id):
+                    sent_any = True
+            if sent_any:
+                return not followup or await self.send_text(followup, chat_id)
+            if not msg.get("fallback_text", True):
+                return False
+        return await self.send_text(followup or text, chat_id)
+
+
+# -----------------------------------------
+# PROFILES (satu per entry point)
+# -----------------------------------------
+
+
+class Profile(abc.ABC):
+    """Behaviour of one entry point: where to fetch, how to filter, render and remember."""
+
+    name = ""
+    interval = 1800
+    seed_first_run = False
+    # bot.py menandai lot sebagai seen walaupun kirimnya gagal
+    mark_failed_seen = False
+    user_agent = "lelang-monitor/1.0"
+
+    list_url = ""
+    list_params: Any = None
+    token = ""
+    chat_id = ""
+    seen_file = "seen_api.json"
+
+    def __init__(self):
+        self.planner = None
+
+    def catalog_urls(self) -> List[str]:
+        return [self.list_url]
+
+    def lot_id(self, lot: Dict[str, Any]) -> Optional[str]:
+        raw = lot.get("lotLelangId") or lot.get("id")
+        return str(raw) if raw else None
+
+    def matches(self, lot: Dict[str, Any]) -> bool:
+        return True
+
+    def load_seen(self) -> set:
+        try:
+            with open(self.seen_file, "rb") as f:
+                return set(str(x) for x in jsoncodec.load(f))
+        except Exception:
+            return set()
+
+    def save_seen(self, seen: set):
+        tmp = self.seen_file + ".tmp"
+        with open(tmp, "wb") as f:
+            jsoncodec.dump(sorted(seen), f, pretty=True)
+        os.replace(tmp, self.seen_file)
+
+    @abc.abstractmethod
+    async def prepare(self, http: AsyncHTTP, lot: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Messages (delivery_queue shape, with media dicts inline) for one new lot."""
+
+    def finish(self):
+        pass
+
+
+class AppProfile(Profile):
+    """app.py: detail + photos (binary upload), full caption, subscriber fan-out."""
+
+    name = "app"
+    interval = 1800
+    seed_first_run = True
+
+    def __init__(self):
+        super().__init__()
+        import app
+        from fetch_plan import FetchPlanner, FieldCoverage, default_path
+        self.app = app
+        self.list_url = app.API_URL
+        self.token = app.TELEGRAM_TOKEN
+        self.chat_id = app.TELEGRAM_CHAT_ID
+        self.seen_file = app.SEEN_FILE
+        self.user_agent = app.USER_AGENT
+        self.planner = FetchPlanner(FieldCoverage(default_path(app.SEEN_FILE)))
+
+    def catalog_urls(self):
+        # semua target `TARGETS` sekaligus (tanpa lease: engine satu proses)
+        from sharding import targets_from_env
+        return [t.url for t in targets_from_env(self.app.API_URL)]
+
+    def matches(self, lot):
+        return self.app.FILTER.matches(lot)
+
+    def load_seen(self):
+        return self.app.load_seen()
+
+    def save_seen(self, seen):
+        self.app.save_seen(seen)
+
+    async def fetch_detail(self, http: AsyncHTTP, lot_id: str, referer: str) -> Dict[str, Any]:
+        from fetch_plan import DETAIL, DETAIL_RETRY
+        headers = {"Referer": referer or "https://lelang.go.id/"}
+        for attempt in range(1, 4):
+            try:
+                r = await http.get(self.app.DETAIL_URL.format(lot_id), DETAIL_POLICY, headers=headers)
+                if r.status_code == 404:
+                    alt = await http.get(f"https://api.lelang.go.id/api/v1/lot-lelang/{lot_id}", DETAIL_POLICY)
+                    return (alt.json().get("data") or {}) if alt.status_code == 200 else {}
+                if r.status_code != 200:
+                    logger.warning(f"Fetch detail gagal {lot_id}, status {r.status_code}")
+                    return {}
+                payload = r.json()
+                data = payload.get("data", {}) if isinstance(payload, dict) else {}
+            except CircuitOpenError as e:
+                logger.warning(f"Lewati fetch detail {lot_id}: {e}")
+                return {}
+            except Exception as e:
+                logger.warning(f"Exception during fetch_detail {lot_id}: {e!r}")
+                return {}
+            self.planner.observe(DETAIL if attempt == 1 else DETAIL_RETRY, data)
+            if attempt == 3 or not self.planner.should_retry_seller(data):
+                return data
+            await asyncio.sleep(DETAIL_POLICY.delay(attempt))
+        return {}
+
+    async def download(self, http: AsyncHTTP, url: str) -> Optional[bytes]:
+        headers = {"Referer": "https://lelang.go.id/", "Accept": "image/avif,image/webp,image/apng,image/*,*/*;q=0.8"}
+        try:
+            r = await http.get(url, PHOTO_POLICY, max_bytes=MEMORY.max_photo_bytes, headers=headers)
+        except Exception as e:
+            logger.warning(f"Download foto gagal {url}: {e!r}")
+            return None
+        if r.too_large:
+            logger.warning(f"Foto {url} lebih besar dari MAX_PHOTO_MB, kirim lewat URL saja")
+            return None
+        if r.status_code != 200 or not r.content:
+            return None
+        return r.content
+
+    async def prepare(self, http, lot):
+        app = self.app
+        lot_id = self.lot_id(lot)
+        if not app.SUBSCRIBERS.candidate_chat_ids(lot):
+            return []
+        if self.planner.needs_detail(lot):
+            detail = await self.fetch_detail(http, lot_id, app.lot_link(lot))
+        else:
+            detail = lot
+        job = app.build_job(lot, detail)
+        if not job["chat_ids"]:
+            return []
+        if not job["detail"]:
+            return [{"chat_id": c, "kind": "text", "text": job["short"], "lot_id": lot_id} for c in job["chat_ids"]]
+
+        # foto satu lot di-download paralel; dipakai bersama semua chat (file_id)
+        urls = [app.resolve_photo_url(u) for u in job["photo_urls"][:app.MAX_PHOTOS_UPLOAD] if u]
+        blobs = await asyncio.gather(*(self.download(http, u) for u in urls))
+        media = [{"url": u, "data": b, "file_id": None} for u, b in zip(urls, blobs) if b]
+        if not media and urls:
+            media = [{"url": urls[0], "data": None, "file_id": None}]
+        text, followup = app.plan_lot_message(job["render"], job["uraian_items"], job["short"], bool(media))
+        kind = "photo" if media else "text"
+        return [{"chat_id": c, "kind": kind, "text": text, "followup": followup, "media": media, "lot_id": lot_id}
+                for c in job["chat_ids"]]
+
+    def finish(self):
+        self.planner.save()
+
+
+class MonitorProfile(Profile):
+    """monitor_lelang_api.py: list-only message + cover photo by URL, subscriber fan-out."""
+
+    name = "monitor"
+    seed_first_run = True
+
+    def __init__(self):
+        super().__init__()
+        import monitor_lelang_api as mon
+        self.mon = mon
+        self.list_url = mon.API_URL
+        self.token = mon.TELEGRAM_BOT_TOKEN
+        self.chat_id = mon.TELEGRAM_CHAT_ID
+        self.seen_file = mon.SEEN_FILE
+        self.user_agent = mon.USER_AGENT
+        self.interval = mon.CHECK_INTERVAL
+
+    def lot_id(self, lot):
+        return lot.get("id") or None
+
+    def matches(self, lot):
+        return self.mon.matches_lot(lot)
+
+    def load_seen(self):
+        return self.mon.load_seen()
+
+    def save_seen(self, seen):
+        self.mon.save_seen(seen)
+
+    async def prepare(self, http, lot):
+        msg = self.mon.format_msg(lot)
+        cover = self.mon.find_cover_url(lot)
+        media = [{"url": cover, "data": None, "file_id": None}] if cover else []
+        return [{"chat_id": c, "kind": "photo" if cover else "text", "text": msg, "media": media, "lot_id": self.lot_id(lot)}
+                for c in self.mon.SUBSCRIBERS.chat_ids(lot)]
+
+
+class BotProfile(Profile):
+    """bot.py: plain text per lot to TELEGRAM_CHAT_ID."""
+
+    name = "bot"
+    seed_first_run = True
+    mark_failed_seen = True
+
+    def __init__(self):
+        super().__init__()
+        import bot
+        self.bot = bot
+        self.list_url = bot.API_URL
+        self.token = bot.TELEGRAM_TOKEN
+        self.chat_id = bot.TELEGRAM_CHAT_ID
+        self.seen_file = bot.SEEN_FILE
+        self.interval = bot.CHECK_INTERVAL
+
+    def lot_id(self, lot):
+        return lot.get("id") or None
+
+    def matches(self, lot):
+        return self.bot.FILTER.matches(lot)
+
+    def load_seen(self):
+        return self.bot.load_seen()
+
+    def save_seen(self, seen):
+        self.bot.save_seen(seen)
+
+    async def prepare(self, http, lot):
+        return [{"chat_id": self.chat_id, "kind": "text", "text": self.bot.format_text(lot), "lot_id": self.lot_id(lot)}]
+
+
+class CoreProfile(Profile):
+    """core.py: detail from lot-lelang/{id}, formatted with core.format_lot."""
+
+    name = "core"
+    seed_first_run = True
+
+    def __init__(self):
+        super().__init__()
+        import core
+        self.core = core
+        self.list_url = f"{core.BASE_URL}/landing-page-kpknl/{core.KPKNL_ID}/katalog-lot-lelang"
+        self.list_params = [("namakategori[]", c) for c in core.CATEGORIES]
+        self.token = core.TG_TOKEN
+        self.chat_id = core.TG_CHAT_ID
+        self.seen_file = core.SEEN_FILE
+        self.user_agent = "Mozilla/5.0 (compatible; AuctionBot/1.0)"
+
+    async def prepare(self, http, lot):
+        try:
+            r = await http.get(f"{self.core.BASE_URL}/lot-lelang/{self.lot_id(lot)}", DETAIL_POLICY)
+            detail = r.json().get("data", {}) if r.status_code == 200 else {}
+        except Exception as e:
+            logger.error(f"Gagal fetch detail {self.lot_id(lot)}: {e!r}")
+            detail = {}
+        if not detail:
+            raise RuntimeError("detail kosong")
+        return [{"chat_id": self.chat_id, "kind": "text", "text": self.core.format_lot(detail), "lot_id": self.lot_id(lot)}]
+
+
+PROFILES: Dict[str, Callable[[], Profile]] = {
+    "app": AppProfile,
+    "monitor": MonitorProfile,
+    "bot": BotProfile,
+    "core": CoreProfile,
+}
+
+
+# -----------------------------------------
+# ENGINE
+# -----------------------------------------
+
+
+async def fetch_catalog(http: AsyncHTTP, profile: Profile) -> List[Dict[str, Any]]:
+    """List items of every catalog URL of the profile (fetched concurrently, de-duplicated)."""
+
+    async def one(url: str) -> List[Dict[str, Any]]:
+        try:
+            r = await http.get(url, LIST_POLICY, params=profile.list_params)
+            if r.status_code != 200:
+                logger.warning(f"List fetch returned status {r.status_code}")
+                return []
+            payload = r.json()
+            return (payload.get("data") or []) if isinstance(payload, dict) else []
+        except Exception as e:
+            logger.error(f"Gagal ambil data dari API: {e!r}")
+            return []
+
+    lots, ids = [], set()
+    for items in await asyncio.gather(*(one(u) for u in profile.catalog_urls())):
+        for lot in items:
+            lot_id = profile.lot_id(lot)
+            if lot_id in ids:
+                continue
+            ids.add(lot_id)
+            lots.append(lot)
+    return lots
+
+
+async def run_all(coros):
+    """Run coroutines as one structured group: TaskGroup on 3.11+, else gather
+    that cancels the rest when one fails (same failure semantics)."""
+    if hasattr(asyncio, "TaskGroup"):
+        async with asyncio.TaskGroup() as tg:
+            for c in coros:
+                tg.create_task(c)
+        return
+    tasks = [asyncio.ensure_future(c) for c in coros]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+async def run_once(http: AsyncHTTP, profile: Profile, concurrency: int = ENGINE_CONCURRENCY) -> int:
+    """One check: fetch catalog, process every new lot concurrently, send in list order."""
+    lots = await fetch_catalog(http, profile)
+    logger.info(f"[{profile.name}] Ditemukan {len(lots)} lot di API")
+
+    if profile.seed_first_run and not os.path.exists(profile.seen_file):
+        init_seen = {i for i in (profile.lot_id(l) for l in lots) if i}
+        profile.save_seen(init_seen)
+        logger.info(f"SEEN_FILE '{profile.seen_file}' tidak ditemukan sebelumnya. Inisialisasi dengan {len(init_seen)} lot, tidak mengirim apapun pada run ini.")
+        return 0
+
+    seen = profile.load_seen()
+    new = [l for l in lots if profile.lot_id(l) and profile.lot_id(l) not in seen and profile.matches(l)]
+    if not new:
+        return 0
+
+    telegram = AsyncTelegram(http, profile.token, profile.chat_id)
+    # gate dipegang dari prepare sampai lot terkirim: pesan (dan bytes fotonya)
+    # yang menunggu giliran kirim tetap dihitung in-flight
+    gate = asyncio.Semaphore(max(1, concurrency))
+    # lot masuk gate sesuai urutan list, jadi pemegang gate selalu lot-lot
+    # tertua yang belum terkirim dan giliran kirimnya tidak bisa deadlock
+    admitted = [asyncio.Event() for _ in new]
+    turns = [asyncio.Event() for _ in new]
+    sent = 0
+
+    async def deliver(lot_id: str, msgs: List[Dict[str, Any]]):
+        nonlocal sent
+        ok = True
+        for m in msgs:
+            ok = await telegram.deliver(m) and ok
+        if ok:
+            sent += 1
+        if ok or profile.mark_failed_seen:
+            seen.add(lot_id)
+        else:
+            logger.warning(f"Lot {lot_id} tidak terkirim semua, tidak ditandai sebagai seen")
+
+    async def pipeline(i: int, lot: Dict[str, Any]):
+        lot_id = profile.lot_id(lot)
+        try:
+            if i:
+                await admitted[i - 1].wait()
+            async with gate:
+                admitted[i].set()
+                try:
+                    msgs = await profile.prepare(http, lot)
+                except Exception as e:
+                    logger.warning(f"Lot {lot_id} gagal diproses: {e!r}", exc_info=True)
+                    msgs = None
+                # kirim berurutan sesuai urutan list, walaupun persiapan lot selesai acak
+                if i:
+                    await turns[i - 1].wait()
+                if msgs is not None:
+                    await deliver(lot_id, msgs)
+        finally:
+            admitted[i].set()
+            turns[i].set()
+
+    await run_all(pipeline(i, lot) for i, lot in enumerate(new))
+
+    profile.save_seen(seen)
+    profile.finish()
+    logger.info(f"[{profile.name}] {sent}/{len(new)} lot baru terkirim")
+    return sent
+
+
+def check_unsharded(coordinator: str = COORDINATOR):
+    """Engine has no leases/claims yet; on a sharded fleet it would double-post."""
+    if coordinator.strip():
+        raise SystemExit("COORDINATOR di-set tapi engine asyncio belum mendukung lease/klaim lintas worker; "
+                         "jalankan tanpa --engine")
+
+
+async def run(profile: Profile, daemon: bool = False, interval: Optional[float] = None):
+    check_unsharded()
+    interval = interval or profile.interval
+    async with AsyncHTTP(profile.user_agent) as http:
+        while True:
+            next_check = time.monotonic() + interval
+            try:
+                await run_once(http, profile, MEMORY.in_flight or ENGINE_CONCURRENCY)
+            except Exception as e:
+                logger.exception(f"Error saat pengecekan: {e!r}")
+            if not daemon:
+                return
+            await asyncio.sleep(max(0.0, next_check - time.monotonic()))
+
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description="Engine asyncio untuk bot lelang")
+    ap.add_argument("--profile", choices=sorted(PROFILES), default="app")
+    mode = ap.add_mutually_exclusive_group()
+    mode.add_argument("--once", action="store_true", help="satu kali cek lalu keluar (cron)")
+    mode.add_argument("--daemon", action="store_true", help="cek terus tiap interval")
+    ap.add_argument("--interval", type=float, default=None, help="detik antar cek (default: sesuai profil)")
+    args = ap.parse_args(argv)
+
+    if not logging.getLogger().handlers:
+        logging.basicConfig(level=logging.INFO, format="[%(asctime)s] [%(levelname)s] %(message)s")
+    check_unsharded()
+    profile = PROFILES[args.profile]()
+    daemon = args.daemon or (not args.once and args.profile in ("monitor", "bot"))
+    asyncio.run(run(profile, daemon=daemon, interval=args.interval))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+fetch_plan.py - Rencana fetch per lot berdasarkan field yang dibutuhkan template
+
+`send_lot` dulu selalu memanggil `fetch_detail` (sampai 3 request karena loop
+"seller kosong, coba lagi") walaupun item katalog sudah membawa semua yang
+dibutuhkan pesan. Planner di sini:
+
+ - membandingkan field yang dibutuhkan template pesan aktif (`MESSAGE_FIELDS`)
+   dengan field yang sudah ada di item list; detail hanya di-fetch kalau ada
+   field yang kurang DAN endpoint detail memang pernah mengembalikannya
+ - mencatat per endpoint field mana yang muncul di response (`FieldCoverage`,
+   disimpan ke `FETCH_PLAN_FILE`); field yang tidak pernah muncul setelah
+   `NEVER_AFTER` response dianggap tidak disediakan endpoint itu, jadi retry
+   seller yang sia-sia berhenti
+ - tetap "probe" sesekali (`PROBE_EVERY`) supaya kalau upstream mulai
+   mengirim field tersebut, planner ikut belajar lagi
+"""
+
+import os
+import logging
+import threading
+from typing import Optional, List, Dict, Any, Iterable, Tuple
+
+import jsoncodec
+
+logger = logging.getLogger(__name__)
+
+# field -> path kandidat di payload (item list atau data detail)
+FIELD_PATHS: Dict[str, List[Tuple[str, ...]]] = {
+    "seller": [("content", "seller"), ("seller",), ("namaOrganisasiPenjual",), ("namaPenjual",)],
+    "photos": [("photos",)],
+    "barangs": [("content", "barangs")],
+    "caraPenawaran": [("caraPenawaran",), ("cara_penawaran",)],
+    "uangJaminan": [("uangJaminan",)],
+    "organizer": [("content", "organizer")],
+    "views": [("views",)],
+}
+
+# field yang dipakai caption lengkap (build_caption_html + foto)
+FULL_TEMPLATE_FIELDS = list(FIELD_PATHS)
+
+MESSAGE_FIELDS = [f.strip() for f in os.getenv("MESSAGE_FIELDS", ",".join(FULL_TEMPLATE_FIELDS)).split(",") if f.strip()]
+NEVER_AFTER = int(os.getenv("FIELD_NEVER_AFTER", "20"))
+PROBE_EVERY = int(os.getenv("FIELD_PROBE_EVERY", "50"))
+# statistik di-halving setelah jendela ini supaya perubahan upstream cepat terlihat
+WINDOW = 500
+
+DETAIL = "detail"
+DETAIL_RETRY = "detail:retry"
+
+
+def default_path(seen_file: str) -> str:
+    return os.getenv("FETCH_PLAN_FILE") or os.path.join(os.path.dirname(os.path.abspath(seen_file)), "fetch_plan.json")
+
+
+def _resolve(payload: Dict[str, Any], path: Tuple[str, ...]) -> Any:
+    cur: Any = payload
+    for key in path:
+        if not isinstance(cur, dict):
+            return None
+        cur = cur.get(key)
+    return cur
+
+
+def has_field(payload: Optional[Dict[str, Any]], field: str) -> bool:
+    if not isinstance(payload, dict):
+        return False
+    for path in FIELD_PATHS.get(field, [(field,)]):
+        v = _resolve(payload, path)
+        if v is not None and v != "" and v != [] and v != {}:
+            return True
+    return False
+
+
+class FieldCoverage:
+    """Per-endpoint counts of responses seen and how often each field was present."""
+
+    def __init__(self, path: Optional[str] = None, never_after: int = NEVER_AFTER):
+        self.path = path
+        self.never_after = never_after
+        self.stats: Dict[str, Dict[str, Any]] = {}
+        self._dirty = False
+        # dipanggil dari beberapa thread tahap detail pipeline
+        self._lock = threading.Lock()
+        if path:
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "rb") as f:
+                data = jsoncodec.load(f)
+            self.stats = data.get("endpoints", {}) if isinstance(data, dict) else {}
+        except FileNotFoundError:
+            self.stats = {}
+        except Exception as e:
+            logger.error(f"Gagal load {self.path}: {e}")
+            self.stats = {}
+
+    def save(self):
+        if not self.path or not self._dirty:
+            return
+        try:
+            tmp = self.path + ".tmp"
+            with self._lock, open(tmp, "wb") as f:
+                jsoncodec.dump({"endpoints": self.stats}, f)
+            os.replace(tmp, self.path)
+            self._dirty = False
+        except Exception as e:
+            logger.error(f"Gagal simpan {self.path}: {e}")
+
+    def observe(self, endpoint: str, payload: Dict[str, Any], fields: Iterable[str] = FIELD_PATHS):
+        present = [f for f in fields if has_field(payload, f)]
+        with self._lock:
+            st = self.stats.setdefault(endpoint, {"n": 0, "fields": {}})
+            st["n"] += 1
+            for field in present:
+                st["fields"][field] = st["fields"].get(field, 0) + 1
+            if st["n"] >= WINDOW:
+                st["n"] //= 2
+                st["fields"] = {k: v // 2 for k, v in st["fields"].items()}
+            self._dirty = True
+
+    def never_returns(self, endpoint: str, field: str) -> bool:
+        st = self.stats.get(endpoint)
+        if not st or st["n"] < self.never_after:
+            return False
+        return not st["fields"].get(field)
+
+
+class FetchPlanner:
+    """Decide per lot whether `fetch_detail` (and its seller retries) is worth doing."""
+
+    def __init__(self, coverage: FieldCoverage, needed: Iterable[str] = MESSAGE_FIELDS, probe_every: int = PROBE_EVERY):
+        self.coverage = coverage
+        self.needed = [f for f in needed if f in FIELD_PATHS]
+        self.probe_every = max(0, probe_every)
+        self.counts = {"detail": 0, "skipped": 0, "retries": 0, "retries_skipped": 0}
+        self._decisions = 0
+        self._lock = threading.Lock()
+
+    def _probe(self) -> bool:
+        with self._lock:
+            self._decisions += 1
+            return bool(self.probe_every) and self._decisions % self.probe_every == 0
+
+    def _count(self, key: str):
+        with self._lock:
+            self.counts[key] += 1
+
+    def missing(self, lot: Dict[str, Any]) -> List[str]:
+        return [f for f in self.needed if not has_field(lot, f)]
+
+    def needs_detail(self, lot: Dict[str, Any]) -> bool:
+        missing = self.missing(lot)
+        useful = [f for f in missing if not self.coverage.never_returns(DETAIL, f)]
+        if useful or (missing and self._probe()):
+            self._count("detail")
+            return True
+        self._count("skipped")
+        if missing:
+            logger.debug(f"Field {missing} tidak pernah ada di endpoint detail, fetch detail dilewati")
+        return False
+
+    def observe(self, endpoint: str, payload: Dict[str, Any]):
+        self.coverage.observe(endpoint, payload)
+
+    def should_retry_seller(self, payload: Dict[str, Any]) -> bool:
+        """Whether another detail attempt (stronger headers) could still bring the seller."""
+        if "seller" not in self.needed or has_field(payload, "seller"):
+            return False
+        if self.coverage.never_returns(DETAIL_RETRY, "seller") and not self._probe():
+            self._count("retries_skipped")
+            return False
+        self._count("retries")
+        return True
+
+    def summary(self) -> str:
+        c = self.counts
+        return (f"detail di-fetch {c['detail']}, dilewati {c['skipped']}, "
+                f"retry seller {c['retries']}, retry dilewati {c['retries_skipped']}")
+
+    def save(self):
+        self.coverage.save()
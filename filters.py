@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+filters.py - Mesin filter lot lelang (instansi, judul/barang, harga, lokasi)
+
+Semua keyword dari semua rule dikompilasi menjadi SATU automaton Aho-Corasick,
+sehingga tiap field teks sebuah lot cukup di-scan sekali untuk semua rule
+sekaligus. Rule numerik (`nilaiLimit`) dicek lewat lookup interval (bisect),
+bukan loop per rule.
+
+Format rule (dict, biasanya dari file JSON `FILTER_RULES_FILE`):
+
+    {
+        "name": "dealer-solo",
+        "instansi": ["kpknl surakarta"],       # substring di namaUnitKerja
+        "keywords": ["avanza", "innova"],      # substring di judul / barangs
+        "kota": ["surakarta", "sukoharjo"],
+        "provinsi": ["jawa tengah"],
+        "kategori": ["mobil"],
+        "min_limit": 50000000,
+        "max_limit": 150000000
+    }
+
+Semua kriteria yang diisi harus terpenuhi (AND); di dalam satu kriteria cukup
+salah satu keyword yang cocok (OR). Rule tanpa kriteria cocok dengan semua lot.
+"""
+
+import os
+import bisect
+import logging
+from collections import deque
+from typing import Optional, List, Dict, Any, Iterable, Tuple, FrozenSet
+
+import jsoncodec
+
+logger = logging.getLogger(__name__)
+
+# Field teks yang bisa difilter. Urutan = bit index di bitmask kriteria.
+TEXT_FIELDS = ("instansi", "keywords", "kota", "provinsi", "kategori")
+PRICE_BIT = 1 << len(TEXT_FIELDS)
+# Kriteria yang teksnya bisa bertambah dari detail (barangs, kota/provinsi seller)
+DETAIL_BITS = sum(1 << TEXT_FIELDS.index(f) for f in ("keywords", "kota", "provinsi"))
+
+
+# -----------------------------------------
+# AHO-CORASICK
+# -----------------------------------------
+
+
+class AhoCorasick:
+    """Minimal Aho-Corasick automaton over lowercase strings.
+
+    Every pattern carries a payload; `search` yields the payloads of all
+    patterns occurring (as substrings) in the text, in a single pass.
+    """
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Any]] = [[]]
+        self._built = False
+
+    def add(self, pattern: str, payload: Any):
+        if not pattern:
+            return
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append(payload)
+        self._built = False
+
+    def build(self):
+        queue = deque()
+        for nxt in self._goto[0].values():
+            self._fail[nxt] = 0
+            queue.append(nxt)
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                cand = self._goto[f].get(ch, 0)
+                self._fail[nxt] = cand if cand != nxt else 0
+                # gabungkan output dari suffix terpanjang
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+        self._built = True
+
+    def search(self, text: str) -> Iterable[Any]:
+        if not self._built:
+            self.build()
+        node = 0
+        goto, fail, out = self._goto, self._fail, self._out
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                yield from out[node]
+
+
+# -----------------------------------------
+# PRICE RANGES
+# -----------------------------------------
+
+
+class RangeIndex:
+    """Elementary-interval index: maps a number to the set of rule ids whose
+    [min, max] range contains it with a single bisect.
+    """
+
+    def __init__(self, ranges: List[Tuple[int, float, float]]):
+        points = sorted({p for _, lo, hi in ranges for p in (lo, hi)})
+        self._points = points
+        # segmen ke-i: titik points[i] persis, dan interval terbuka (points[i], points[i+1])
+        self._at_point: List[FrozenSet[int]] = []
+        self._between: List[FrozenSet[int]] = []
+        for i, p in enumerate(points):
+            nxt = points[i + 1] if i + 1 < len(points) else None
+            self._at_point.append(frozenset(r for r, lo, hi in ranges if lo <= p <= hi))
+            if nxt is None:
+                self._between.append(frozenset())
+            else:
+                self._between.append(frozenset(r for r, lo, hi in ranges if lo <= p and nxt <= hi))
+
+    def lookup(self, value: float) -> FrozenSet[int]:
+        pts = self._points
+        if not pts or value < pts[0] or value > pts[-1]:
+            return frozenset()
+        i = bisect.bisect_right(pts, value) - 1
+        if pts[i] == value:
+            return self._at_point[i]
+        return self._between[i]
+
+
+# -----------------------------------------
+# LOT FIELD EXTRACTION
+# -----------------------------------------
+
+
+def _barangs(lot: Dict[str, Any], detail: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    if detail and isinstance(detail.get("content"), dict):
+        items = detail["content"].get("barangs") or []
+        if items:
+            return [b for b in items if isinstance(b, dict)]
+    return [b for b in (lot.get("barangs") or []) if isinstance(b, dict)]
+
+
+def lot_fields(lot: Dict[str, Any], detail: Optional[Dict[str, Any]] = None) -> Dict[str, str]:
+    """Return the lowercase text per filterable field for a list item (+ optional detail)."""
+    detail = detail or {}
+    title_parts = [lot.get("namaLotLelang") or lot.get("nama") or ""]
+    for b in _barangs(lot, detail):
+        title_parts.extend(str(b.get(k) or "") for k in ("nama", "namaBarang", "merk", "tipe", "tahun"))
+
+    seller = {}
+    c = detail.get("content") if isinstance(detail.get("content"), dict) else {}
+    if isinstance(c.get("seller"), dict):
+        seller = c["seller"]
+
+    kota = [lot.get("namaKota"), lot.get("namaLokasi"), lot.get("lokasi"), seller.get("namaKota")]
+    prov = [lot.get("namaProvinsi"), seller.get("namaProvinsi")]
+    return {
+        "instansi": str(lot.get("namaUnitKerja") or lot.get("instansi") or "").lower(),
+        "keywords": " | ".join(p for p in title_parts if p).lower(),
+        "kota": " | ".join(str(k) for k in kota if k).lower(),
+        "provinsi": " | ".join(str(p) for p in prov if p).lower(),
+        "kategori": str(lot.get("namaKategori") or lot.get("kategori") or "").lower(),
+    }
+
+
+def lot_price(lot: Dict[str, Any]) -> Optional[float]:
+    raw = lot.get("nilaiLimit")
+    if raw is None:
+        raw = lot.get("nilai_limit")
+    try:
+        return float(raw)
+    except (TypeError, ValueError):
+        return None
+
+
+# -----------------------------------------
+# ENGINE
+# -----------------------------------------
+
+
+class FilterEngine:
+    """Compiled set of filter rules. `match(lot)` returns the names of every
+    matching rule after one automaton pass per text field plus one range lookup.
+    """
+
+    def __init__(self, rules: List[Dict[str, Any]]):
+        self.names: List[str] = []
+        self._required: List[int] = []
+        self._automaton = AhoCorasick()
+        ranges: List[Tuple[int, float, float]] = []
+
+        for idx, rule in enumerate(rules):
+            self.names.append(str(rule.get("name") or f"rule-{idx}"))
+            mask = 0
+            for bit, field in enumerate(TEXT_FIELDS):
+                words = rule.get(field) or []
+                if isinstance(words, str):
+                    words = [w for w in words.split(",")]
+                words = [w.strip().lower() for w in words if w and w.strip()]
+                if not words:
+                    continue
+                mask |= 1 << bit
+                for w in words:
+                    self._automaton.add(w, (bit, idx))
+            lo, hi = rule.get("min_limit"), rule.get("max_limit")
+            if lo is not None or hi is not None:
+                mask |= PRICE_BIT
+                ranges.append((idx, float(lo) if lo is not None else float("-inf"), float(hi) if hi is not None else float("inf")))
+            self._required.append(mask)
+
+        self._automaton.build()
+        self._prices = RangeIndex(ranges)
+        self._match_all = [i for i, m in enumerate(self._required) if m == 0]
+        logger.debug(f"FilterEngine: {len(rules)} rule dikompilasi")
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _hits(self, lot: Dict[str, Any], detail: Optional[Dict[str, Any]]) -> Dict[int, int]:
+        hits: Dict[int, int] = {}
+        fields = lot_fields(lot, detail)
+        for bit, field in enumerate(TEXT_FIELDS):
+            text = fields[field]
+            if not text:
+                continue
+            for pbit, idx in self._automaton.search(text):
+                if pbit == bit:
+                    hits[idx] = hits.get(idx, 0) | (1 << bit)
+        price = lot_price(lot)
+        if price is not None:
+            for idx in self._prices.lookup(price):
+                hits[idx] = hits.get(idx, 0) | PRICE_BIT
+        return hits
+
+    def match_ids(self, lot: Dict[str, Any], detail: Optional[Dict[str, Any]] = None) -> List[int]:
+        hits = self._hits(lot, detail)
+        matched = [idx for idx, got in hits.items() if got == self._required[idx]]
+        matched.extend(self._match_all)
+        return sorted(matched)
+
+    def candidate_ids(self, lot: Dict[str, Any]) -> List[int]:
+        """Rules that can still match once the detail is fetched (superset of `match_ids(lot, detail)`).
+
+        Criteria the detail can add text to (`DETAIL_BITS`) count as met; the
+        rest (instansi, kategori, harga) only come from the list item.
+        """
+        hits = self._hits(lot, None)
+        return [idx for idx, required in enumerate(self._required)
+                if required & ~DETAIL_BITS & ~hits.get(idx, 0) == 0]
+
+    def match(self, lot: Dict[str, Any], detail: Optional[Dict[str, Any]] = None) -> List[str]:
+        return [self.names[i] for i in self.match_ids(lot, detail)]
+
+    def matches(self, lot: Dict[str, Any], detail: Optional[Dict[str, Any]] = None) -> bool:
+        """True if at least one rule matches (or there are no rules at all)."""
+        if not self.names:
+            return True
+        return bool(self.match_ids(lot, detail))
+
+
+# -----------------------------------------
+# CONFIG
+# -----------------------------------------
+
+
+def load_rules(path: str) -> List[Dict[str, Any]]:
+    """Load rules from a JSON file: either a list of rules or {"rules": [...]}."""
+    with open(path, "rb") as f:
+        data = jsoncodec.load(f)
+    if isinstance(data, dict):
+        data = data.get("rules", [])
+    if not isinstance(data, list):
+        raise ValueError(f"Format rule tidak valid di {path}")
+    return [r for r in data if isinstance(r, dict)]
+
+
+def rules_from_env(default_instansi: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Rules from `FILTER_RULES_FILE` if set, else a single instansi rule from
+    the comma-separated `default_instansi` (e.g. KEYWORD_INSTANSI). Empty list = no filter.
+
+    A `FILTER_RULES_FILE` that cannot be loaded raises instead of falling back:
+    an empty rule list means "no filter", so a typo would send every lot to every chat.
+    """
+    path = os.getenv("FILTER_RULES_FILE")
+    if path:
+        try:
+            rules = load_rules(path)
+        except Exception as e:
+            logger.error(f"Gagal load {path}: {e}")
+            raise RuntimeError(f"FILTER_RULES_FILE {path} tidak bisa di-load: {e}") from e
+        logger.info(f"Loaded {len(rules)} filter rule dari {path}")
+        return rules
+    if default_instansi:
+        words = [k.strip() for k in default_instansi.split(",") if k.strip()]
+        if words:
+            return [{"name": "default", "instansi": words}]
+    return []
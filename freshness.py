@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+freshness.py - Freshness per lot: dari muncul di katalog sampai terkirim ke Telegram
+
+Yang penting buat dealer adalah seberapa cepat lot baru sampai ke Telegram.
+Tracker ini mencatat timestamp per lot di SQLite (`FRESHNESS_FILE`):
+
+ - published   waktu publish dari upstream, kalau payload membawanya
+               (`FRESHNESS_PUBLISH_FIELDS`)
+ - first_seen  pertama kali lot muncul di `fetch_list`
+ - detail      detail siap (di-fetch, atau item list sudah cukup)
+ - photos      foto selesai di-download dan disimpan ke outbox
+ - queued      masuk antrian kirim
+ - delivered   pesan pertama untuk lot itu terkirim
+
+Setiap timestamp hanya diisi sekali (kejadian pertama), jadi lot yang
+pengirimannya di-retry di run berikutnya tetap dihitung dari awal. Ringkasan di
+akhir run (dan `python freshness.py report`) berisi persentil tiap selang
+(jeda cron = published -> first_seen, first_seen -> delivered, dst.) untuk lot
+yang terkirim, plus lot paling lambat.
+"""
+
+import os
+import sys
+import math
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+from datetime import datetime, timezone, timedelta
+from typing import Optional, List, Dict, Any, Iterable, Tuple
+
+logger = logging.getLogger(__name__)
+
+FRESHNESS_FILE = os.getenv("FRESHNESS_FILE", "freshness.sqlite3")
+FRESHNESS_KEEP_DAYS = float(os.getenv("FRESHNESS_KEEP_DAYS", "30"))
+FRESHNESS_SLOWEST = int(os.getenv("FRESHNESS_SLOWEST", "5"))
+PUBLISH_FIELDS = [f.strip() for f in os.getenv(
+    "FRESHNESS_PUBLISH_FIELDS", "tglPublish,tglTayang,tanggalPublish,publishedAt,createdAt,created_at,tglBuat",
+).split(",") if f.strip()]
+
+WIB = timezone(timedelta(hours=7))
+
+STAGES = ("detail", "photos", "queued", "delivered")
+
+# (label, dari, sampai); lot tanpa foto: selang kirim dihitung dari detail
+SPANS: List[Tuple[str, str, str]] = [
+    ("jeda cron", "published", "first_seen"),
+    ("detail", "first_seen", "detail"),
+    ("foto", "detail", "photos"),
+    ("antrian+kirim", "COALESCE(photos, detail)", "delivered"),
+    ("katalog->terkirim", "first_seen", "delivered"),
+    ("publish->terkirim", "published", "delivered"),
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS freshness (
+    lot_id TEXT PRIMARY KEY,
+    title TEXT,
+    published REAL,
+    first_seen REAL NOT NULL,
+    detail REAL,
+    photos REAL,
+    queued REAL,
+    delivered REAL
+);
+CREATE INDEX IF NOT EXISTS idx_freshness_delivered ON freshness(delivered);
+CREATE INDEX IF NOT EXISTS idx_freshness_first_seen ON freshness(first_seen);
+"""
+
+
+def published_at(lot: Dict[str, Any]) -> Optional[float]:
+    """Upstream publish time of a list item (epoch seconds), if the payload has one."""
+    for field in PUBLISH_FIELDS:
+        v = lot.get(field)
+        if not v:
+            continue
+        try:
+            dt = datetime.fromisoformat(str(v).replace("Z", "+00:00"))
+        except ValueError:
+            continue
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=WIB)
+        return dt.timestamp()
+    return None
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Nearest-rank percentile of a non-empty list."""
+    s = sorted(values)
+    return s[max(0, min(len(s) - 1, math.ceil(p / 100 * len(s)) - 1))]
+
+
+def fmt_duration(seconds: float) -> str:
+    seconds = max(0.0, seconds)
+    if seconds < 60:
+        return f"{seconds:.1f}s"
+    if seconds < 3600:
+        return f"{int(seconds // 60)}m{int(seconds % 60):02d}s"
+    return f"{int(seconds // 3600)}j{int(seconds % 3600 // 60):02d}m"
+
+
+class FreshnessTracker:
+    """Per-lot stage timestamps; marks are buffered in memory and written by `flush()`."""
+
+    def __init__(self, path: str = FRESHNESS_FILE):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Dict[str, float]] = {}
+        with self._conn() as c:
+            c.executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ---------- producer side ----------
+
+    def observe(self, lots: Iterable[Dict[str, Any]], now: Optional[float] = None):
+        """Record first_seen (+ publish time) for every catalog item; one transaction."""
+        now = time.time() if now is None else now
+        rows = []
+        for lot in lots:
+            raw = lot.get("lotLelangId") or lot.get("id")
+            if raw:
+                rows.append((str(raw), lot.get("namaLotLelang") or lot.get("nama"), published_at(lot), now))
+        try:
+            with self._conn() as c:
+                c.executemany(
+                    "INSERT OR IGNORE INTO freshness(lot_id, title, published, first_seen) VALUES (?, ?, ?, ?)", rows)
+        except Exception as e:
+            logger.warning(f"Gagal catat first_seen: {e}")
+
+    def mark(self, lot_id: Optional[str], stage: str, ts: Optional[float] = None):
+        """Remember when `lot_id` reached `stage` (thread-safe, first mark wins)."""
+        if not lot_id or stage not in STAGES:
+            return
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            self._pending.setdefault(str(lot_id), {}).setdefault(stage, ts)
+
+    def flush(self) -> int:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            with self._conn() as c:
+                for stage in STAGES:
+                    c.executemany(
+                        f"UPDATE freshness SET {stage} = COALESCE({stage}, ?) WHERE lot_id = ?",
+                        [(marks[stage], lot_id) for lot_id, marks in pending.items() if stage in marks],
+                    )
+        except Exception as e:
+            logger.warning(f"Gagal simpan freshness: {e}")
+            return 0
+        return len(pending)
+
+    def purge(self, keep_days: float = FRESHNESS_KEEP_DAYS) -> int:
+        with self._conn() as c:
+            return c.execute("DELETE FROM freshness WHERE first_seen < ?", (time.time() - keep_days * 86400,)).rowcount
+
+    # ---------- reporting ----------
+
+    def spans(self, since: float) -> Dict[str, List[float]]:
+        """Durations per span for lots delivered at or after `since`."""
+        out: Dict[str, List[float]] = {}
+        c = self._conn()
+        for label, start, end in SPANS:
+            rows = c.execute(
+                f"SELECT {end} - {start} FROM freshness WHERE delivered >= ? AND {start} IS NOT NULL AND {end} IS NOT NULL",
+                (since,),
+            ).fetchall()
+            if rows:
+                out[label] = [r[0] for r in rows]
+        return out
+
+    def slowest(self, since: float, n: int = FRESHNESS_SLOWEST) -> List[sqlite3.Row]:
+        return self._conn().execute(
+            "SELECT lot_id, title, published, first_seen, detail, photos, queued, delivered, "
+            "delivered - COALESCE(published, first_seen) AS total "
+            "FROM freshness WHERE delivered >= ? ORDER BY total DESC LIMIT ?",
+            (since, n),
+        ).fetchall()
+
+    def report(self, since: float, slowest: int = FRESHNESS_SLOWEST) -> List[str]:
+        """Human-readable summary lines for lots delivered since `since`."""
+        spans = self.spans(since)
+        if not spans:
+            return ["Freshness: belum ada lot terkirim"]
+        n = len(spans.get("katalog->terkirim", []))
+        lines = [f"Freshness {n} lot terkirim (p50 / p90 / p99 / maks):"]
+        for label, _, _ in SPANS:
+            values = spans.get(label)
+            if values:
+                lines.append(f"  {label:18} " + " / ".join(
+                    fmt_duration(percentile(values, p)) for p in (50, 90, 99)) + f" / {fmt_duration(max(values))}")
+        for r in self.slowest(since, slowest):
+            steps = []
+            prev = r["published"] if r["published"] is not None else r["first_seen"]
+            for stage in ("first_seen",) + STAGES:
+                if r[stage] is not None:
+                    steps.append(f"{stage} +{fmt_duration(r[stage] - prev)}")
+                    prev = r[stage]
+            title = (r["title"] or "")[:60]
+            lines.append(f"  lambat: {r['lot_id']} {fmt_duration(r['total'])} ({', '.join(steps)}) {title}")
+        return lines
+
+
+def tracker_from_env(path: str = FRESHNESS_FILE) -> Optional[FreshnessTracker]:
+    if not path:
+        return None
+    try:
+        return FreshnessTracker(path)
+    except Exception as e:
+        logger.warning(f"Freshness tracking dimatikan ({path}): {e}")
+        return None
+
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description="Freshness lot: katalog -> Telegram")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    rp = sub.add_parser("report", help="persentil + lot paling lambat")
+    rp.add_argument("--days", type=float, default=1, help="lot yang terkirim N hari terakhir")
+    rp.add_argument("--slowest", type=int, default=10)
+    args = ap.parse_args(argv)
+
+    tracker = FreshnessTracker(FRESHNESS_FILE)
+    for line in tracker.report(time.time() - args.days * 86400, args.slowest):
+        print(line)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -2,6 +2,8 @@ import requests
 import os
 import base64
 
+import jsoncodec
+
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
 GITHUB_REPO = os.getenv("GITHUB_REPO", "ahmadfauzansolo/berita-otomotif-ev")
 SEEN_FILE = "seen_api.json"
@@ -18,7 +20,7 @@ def load_seen():
     r = requests.get(url, headers=headers)
 
     if r.status_code == 200:
-        content = r.json()
+        content = jsoncodec.response_json(r)
         data = base64.b64decode(content["content"]).decode("utf-8")
         return data.strip().splitlines() if data.strip() else []
     else:
@@ -31,7 +33,7 @@ def save_seen(seen_list):
     url = get_file_url()
     headers = {"Authorization": f"token {GITHUB_TOKEN}"}
     get_resp = requests.get(url, headers=headers)
-    sha = get_resp.json()["sha"] if get_resp.status_code == 200 else None
+    sha = jsoncodec.response_json(get_resp)["sha"] if get_resp.status_code == 200 else None
 
     data = "\n".join(seen_list)
     encoded = base64.b64encode(data.encode("utf-8")).decode("utf-8")
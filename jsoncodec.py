@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+jsoncodec.py - Satu pintu encode/decode JSON untuk semua entry point
+
+I/O terberat di bot ini semuanya JSON: katalog lot dari API, payload detail
+per lot, dan seen-store yang ditulis ulang setiap run. Modul ini memilih
+backend tercepat yang terpasang:
+
+    orjson  ->  ujson  ->  json (stdlib)
+
+(override lewat env `JSON_BACKEND=orjson|ujson|json`). Decode langsung dari
+bytes (`resp.content`) tanpa `str` perantara seperti yang dilakukan
+`requests.Response.json()`. Backend opsional: bot tetap jalan dengan stdlib
+saja. Benchmark: `python bench_json.py`.
+"""
+
+import os
+import json
+import logging
+from typing import Any, IO, Union
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional
+    orjson = None
+
+try:
+    import ujson
+except ImportError:  # pragma: no cover - optional
+    ujson = None
+
+# semua backend melempar subclass ValueError untuk input rusak
+JSONDecodeError = ValueError
+
+
+def _pick_backend() -> str:
+    wanted = (os.getenv("JSON_BACKEND") or "").strip().lower()
+    available = {"orjson": orjson is not None, "ujson": ujson is not None, "json": True}
+    if wanted:
+        if available.get(wanted):
+            return wanted
+        logger.warning(f"JSON_BACKEND={wanted} tidak tersedia, pakai backend otomatis")
+    for name in ("orjson", "ujson"):
+        if available[name]:
+            return name
+    return "json"
+
+
+BACKEND = _pick_backend()
+
+
+def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+    """Decode JSON from bytes (preferred) or str."""
+    if BACKEND == "orjson":
+        return orjson.loads(data)
+    if isinstance(data, memoryview):
+        data = bytes(data)
+    if BACKEND == "ujson":
+        return ujson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any, pretty: bool = False) -> bytes:
+    """Encode to UTF-8 bytes (non-ASCII kept as-is, like ensure_ascii=False)."""
+    if BACKEND == "orjson":
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else 0)
+    if BACKEND == "ujson":
+        return ujson.dumps(obj, ensure_ascii=False, indent=2 if pretty else 0, escape_forward_slashes=False).encode("utf-8")
+    if pretty:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def dumps_str(obj: Any) -> str:
+    """Compact JSON as str (for SQLite TEXT columns)."""
+    return dumps(obj).decode("utf-8")
+
+
+def load(f: IO) -> Any:
+    """Decode a file opened in binary (or text) mode."""
+    return loads(f.read())
+
+
+def dump(obj: Any, f: IO[bytes], pretty: bool = False):
+    """Encode into a file opened in binary mode."""
+    f.write(dumps(obj, pretty))
+
+
+def response_json(resp) -> Any:
+    """Drop-in for `resp.json()` that parses `resp.content` bytes directly."""
+    return loads(resp.content)
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+memory_budget.py - Batas memori per run (lot in-flight + byte foto) dengan backpressure
+
+Instance Render kecil; satu run bisa sekaligus memegang list katalog, dict
+detail tiap lot yang sedang diproses, bytes foto hasil download dan salinan
+multipart-nya. Dengan `MEMORY_BUDGET_MB` di-set, run membatasi:
+
+ - jumlah lot yang sedang diproses pipeline (`MAX_INFLIGHT_LOTS`, default
+   diturunkan dari budget)
+ - total bytes foto yang boleh dipegang bersamaan (`PHOTO_BYTES_BUDGET_MB`,
+   default seperempat budget); lot berikutnya MENUNGGU sampai ada lot yang
+   selesai menyimpan fotonya ke outbox (backpressure, bukan error)
+ - ukuran satu foto (`MAX_PHOTO_MB`); foto yang lebih besar tidak di-download
+   dan dikirim lewat URL saja
+ - di glibc, buffer >= 1 MB (bytes foto, body multipart) dialokasikan lewat
+   mmap supaya langsung kembali ke OS setelah dipakai, bukan tertahan di arena
+   malloc per thread
+
+Tanpa `MEMORY_BUDGET_MB` hanya batas ukuran per foto yang berlaku.
+"""
+
+import os
+import sys
+import logging
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# 0 = mode budget mati
+MEMORY_BUDGET_MB = float(os.getenv("MEMORY_BUDGET_MB", "0"))
+MAX_INFLIGHT_LOTS = int(os.getenv("MAX_INFLIGHT_LOTS", "0"))
+PHOTO_BYTES_BUDGET_MB = float(os.getenv("PHOTO_BYTES_BUDGET_MB", "0"))
+# batas sendPhoto Telegram untuk upload foto adalah 10 MB
+MAX_PHOTO_MB = float(os.getenv("MAX_PHOTO_MB", "10"))
+
+# glibc mallopt()
+_M_MMAP_THRESHOLD = -3
+_M_ARENA_MAX = -8
+
+# perkiraan kasar memori satu lot di pipeline (dict detail + caption + job)
+_LOT_COST_MB = 0.5
+
+
+def current_rss_mb() -> Optional[float]:
+    """Resident set size of this process right now (Linux /proc), or None."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / MB
+    except Exception:
+        return None
+
+
+def peak_rss_mb(children: bool = False) -> Optional[float]:
+    """Peak RSS of this process (or of the largest finished child), or None."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux: KiB, macOS: bytes
+    return peak / MB if sys.platform == "darwin" else peak / 1024
+
+
+def tune_malloc() -> bool:
+    """Make glibc return large freed buffers to the OS (best effort, Linux only)."""
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        import ctypes
+        libc = ctypes.CDLL("libc.so.6")
+        ok = libc.mallopt(_M_MMAP_THRESHOLD, MB) == 1
+        libc.mallopt(_M_ARENA_MAX, 2)
+        return ok
+    except Exception as e:
+        logger.debug(f"mallopt tidak tersedia: {e}")
+        return False
+
+
+class ByteBudget:
+    """Counting semaphore over bytes: `acquire(n)` blocks until `n` more bytes fit."""
+
+    def __init__(self, limit: int):
+        self.limit = max(1, int(limit))
+        self.used = 0
+        self.waits = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, n: int):
+        n = int(n)
+        with self._cond:
+            # permintaan lebih besar dari budget tetap jalan kalau tidak ada yang lain
+            if self.used and self.used + n > self.limit:
+                self.waits += 1
+                logger.debug(f"Budget foto penuh ({self.used}/{self.limit} bytes), menunggu")
+            while self.used and self.used + n > self.limit:
+                self._cond.wait()
+            self.used += n
+
+    def release(self, n: int):
+        with self._cond:
+            self.used = max(0, self.used - int(n))
+            self._cond.notify_all()
+
+    def hold(self, n: int) -> "_Hold":
+        """Context manager: acquire `n` bytes, release them on exit."""
+        return _Hold(self, n)
+
+
+class _Hold:
+    def __init__(self, budget: Optional[ByteBudget], n: int):
+        self.budget = budget
+        self.n = n
+
+    def __enter__(self):
+        if self.budget is not None:
+            self.budget.acquire(self.n)
+        return self
+
+    def __exit__(self, *exc):
+        if self.budget is not None:
+            self.budget.release(self.n)
+
+
+class MemoryBudget:
+    """Limits derived from `MEMORY_BUDGET_MB` (all None / unlimited when disabled)."""
+
+    def __init__(self, budget_mb: float = MEMORY_BUDGET_MB, max_in_flight: int = MAX_INFLIGHT_LOTS,
+                 photo_mb: float = PHOTO_BYTES_BUDGET_MB, max_photo_mb: float = MAX_PHOTO_MB):
+        self.budget_mb = max(0.0, budget_mb)
+        self.max_photo_bytes = int(max_photo_mb * MB) if max_photo_mb > 0 else None
+        self.in_flight: Optional[int] = None
+        self.photos: Optional[ByteBudget] = None
+        if not self.budget_mb:
+            return
+        tune_malloc()
+        photo_bytes = int((photo_mb or self.budget_mb / 4) * MB)
+        self.photos = ByteBudget(photo_bytes)
+        self.in_flight = max_in_flight or max(2, int(self.budget_mb / 4 / _LOT_COST_MB))
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.budget_mb)
+
+    def photo_hold(self, n_photos: int) -> _Hold:
+        """Reserve worst-case bytes for one lot's photos up front.
+
+        Reserving the whole lot at once (not per photo) means a lot never holds
+        half its photos while waiting for the rest, so lots cannot deadlock.
+        """
+        per_photo = self.max_photo_bytes or MB
+        n = per_photo * max(0, n_photos)
+        if self.photos is not None:
+            n = min(n, self.photos.limit)
+        return _Hold(self.photos if n else None, n)
+
+    def report(self) -> str:
+        peak = peak_rss_mb()
+        parts = [f"peak RSS {peak:.0f} MB" if peak is not None else "peak RSS ?"]
+        if self.enabled:
+            parts.append(f"budget {self.budget_mb:.0f} MB, {self.in_flight} lot in-flight")
+            if self.photos is not None:
+                parts.append(f"budget foto {self.photos.limit // MB} MB, {self.photos.waits}x menunggu")
+            if peak is not None and peak > self.budget_mb:
+                logger.warning(f"Peak RSS {peak:.0f} MB melewati MEMORY_BUDGET_MB={self.budget_mb:.0f}")
+        return ", ".join(parts)
+
+
+def budget_from_env() -> MemoryBudget:
+    return MemoryBudget()
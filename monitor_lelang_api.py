@@ -1,11 +1,20 @@
 #!/usr/bin/env python3
 import os
+import sys
 import time
-import json
 import requests
 import logging
 from typing import List
 
+import retry
+import jsoncodec
+from filters import FilterEngine, rules_from_env
+from subscribers import registry_from_env
+from delivery_queue import DeliveryQueue, drain
+from commands import LotView, CommandHandler
+from seen_filter import SeenFilter
+from reminders import ReminderScheduler, REMINDER_OFFSETS, parse_end, default_path as default_reminders_path
+
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 
 # Config via env vars
@@ -18,51 +27,67 @@ TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 SEEN_FILE = os.getenv("SEEN_FILE", "seen_api.json")
 USER_AGENT = "lelang-monitor/1.0"
+# jawab /ending, /search, /stats di sela interval cek (long-polling getUpdates)
+ENABLE_COMMANDS = os.getenv("ENABLE_COMMANDS", "1") == "1"
 
 if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
     logging.error("TELEGRAM_BOT_TOKEN dan TELEGRAM_CHAT_ID harus diset di environment variables.")
     raise SystemExit(1)
 
 KEYWORDS: List[str] = [k.strip().lower() for k in KEYWORD_INSTANSI.split(",") if k.strip()]
+# semua rule (KEYWORD_INSTANSI atau FILTER_RULES_FILE) dikompilasi sekali di awal
+FILTER = FilterEngine(rules_from_env(KEYWORD_INSTANSI))
+SUBSCRIBERS = registry_from_env(TELEGRAM_CHAT_ID)
+OUTBOX = DeliveryQueue()
+VIEW = LotView()
+REMINDERS = ReminderScheduler(default_reminders_path(SEEN_FILE), run_interval=CHECK_INTERVAL) if REMINDER_OFFSETS else None
+# snapshot Bloom seen-store ikut di-update supaya app.py (cron) tidak load penuh
+SEEN_FILTER = SeenFilter(SEEN_FILE)
 
 def load_seen():
     try:
-        with open(SEEN_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        with open(SEEN_FILE, "rb") as f:
+            data = jsoncodec.load(f)
             return set(data)
     except Exception:
         return set()
 
 def save_seen(seen_set):
     try:
-        with open(SEEN_FILE, "w", encoding="utf-8") as f:
-            json.dump(list(seen_set), f, ensure_ascii=False, indent=2)
+        with open(SEEN_FILE, "wb") as f:
+            jsoncodec.dump(list(seen_set), f, pretty=True)
     except Exception as e:
         logging.warning("Gagal menyimpan seen file: %s", e)
 
-def send_telegram_message(text):
+def send_telegram_message(text, chat_id=None):
     url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-    payload = {"chat_id": TELEGRAM_CHAT_ID, "text": text, "parse_mode": "HTML", "disable_web_page_preview": False}
+    payload = {"chat_id": chat_id or TELEGRAM_CHAT_ID, "text": text, "parse_mode": "HTML", "disable_web_page_preview": False}
     try:
-        r = requests.post(url, data=payload, timeout=20)
+        r = retry.post(url, retry.TELEGRAM_POLICY, data=payload, timeout=20)
         r.raise_for_status()
         return True
     except Exception as e:
         logging.error("Gagal kirim message: %s", e)
         return False
 
-def send_telegram_photo(photo_url, caption):
+def send_telegram_photo(photo_url, caption, chat_id=None):
+    """Kirim photo by URL (atau file_id). Return file_id dari Telegram kalau sukses,
+    "" kalau sukses lewat fallback message, None kalau gagal total."""
     url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendPhoto"
     # Telegram menerima URL langsung via field 'photo'
-    payload = {"chat_id": TELEGRAM_CHAT_ID, "photo": photo_url, "caption": caption, "parse_mode": "HTML"}
+    payload = {"chat_id": chat_id or TELEGRAM_CHAT_ID, "photo": photo_url, "caption": caption, "parse_mode": "HTML"}
     try:
-        r = requests.post(url, data=payload, timeout=30)
+        r = retry.post(url, retry.TELEGRAM_POLICY, data=payload, timeout=30)
         r.raise_for_status()
-        return True
     except Exception as e:
         logging.warning("Gagal kirim photo (fallback ke message). Error: %s", e)
         # fallback: kirim caption sebagai message
-        return send_telegram_message(caption)
+        return "" if send_telegram_message(caption, chat_id) else None
+    try:
+        sizes = jsoncodec.response_json(r).get("result", {}).get("photo") or []
+        return (sizes[-1].get("file_id") if sizes else None) or ""
+    except Exception:
+        return ""
 
 def format_msg(lot):
     lot_id = lot.get("id", "")
@@ -98,65 +123,124 @@ def find_cover_url(lot):
             return "https://lelang.go.id" + fu
     return None
 
-def matches_instansi(instansi_text: str) -> bool:
-    if not KEYWORDS:
-        return True
-    itm = (instansi_text or "").lower()
-    return any(k in itm for k in KEYWORDS)
+def matches_lot(lot) -> bool:
+    return FILTER.matches(lot)
+
+def deliver_message(msg, media):
+    """Sender untuk delivery queue. Chat berikutnya pakai file_id dari kiriman
+    pertama supaya Telegram tidak fetch ulang URL cover-nya."""
+    if msg["kind"] == "photo" and media:
+        m = media[0]
+        res = send_telegram_photo(m.get("file_id") or m.get("url"), msg["text"], msg["chat_id"])
+        if res:
+            m["file_id"] = res
+        return res is not None
+    return send_telegram_message(msg["text"], msg["chat_id"])
+
+def fire_reminders():
+    if REMINDERS is None:
+        return 0
+    n = REMINDERS.enqueue_due(OUTBOX)
+    REMINDERS.save()
+    return n
 
 def check_once(seen):
     logging.info("Memanggil API: %s", API_URL)
     try:
-        r = requests.get(API_URL, headers={"User-Agent": USER_AGENT}, timeout=20)
+        r = retry.get(requests, API_URL, retry.LIST_POLICY, headers={"User-Agent": USER_AGENT}, timeout=20)
         r.raise_for_status()
-        data = r.json()
+        data = jsoncodec.response_json(r)
     except Exception as e:
         logging.error("Gagal ambil data API: %s", e)
         return seen
 
     items = data.get("data", []) or []
     logging.info("Ditemukan %d lot", len(items))
+    VIEW.update(items)
+    if REMINDERS is not None:
+        REMINDERS.refresh(items)
+
+    if not os.path.exists(SEEN_FILE):
+        # run pertama: tandai katalog saat ini sebagai seen dan jangan kirim apa pun
+        # (untuk banyak target sekaligus pakai `python bootstrap.py`)
+        seen = set(seen) | {lot.get("id") for lot in items if lot.get("id")}
+        save_seen(seen)
+        SEEN_FILTER.sync(seen)
+        logging.info("%s belum ada, inisialisasi dengan %d lot tanpa kirim", SEEN_FILE, len(seen))
+        return seen
 
-    new_found = False
+    new_ids = []
     for lot in items:
         lot_id = lot.get("id")
         if not lot_id:
             continue
         if lot_id in seen:
             continue
-        instansi = lot.get("namaUnitKerja", "")
-        if not matches_instansi(instansi):
+        if not matches_lot(lot):
+            continue
+
+        chat_ids = SUBSCRIBERS.chat_ids(lot)
+        if not chat_ids:
             continue
 
         msg = format_msg(lot)
         cover = find_cover_url(lot)
-        # kirim photo kalau ada, else message
-        ok = False
-        if cover:
-            ok = send_telegram_photo(cover, msg)
-        else:
-            ok = send_telegram_message(msg)
-        if ok:
-            logging.info("Notifikasi dikirim untuk lot: %s", lot_id)
-            seen.add(lot_id)
-            new_found = True
-        else:
-            logging.warning("Gagal mengirim notifikasi untuk lot: %s — tetap menandai sebagai seen agar tidak loop", lot_id)
-            seen.add(lot_id)
-
-    if new_found:
+        media = [OUTBOX.put_media(url=cover)] if cover else []
+        kind = "photo" if cover else "text"
+        # lot dianggap seen setelah masuk antrian; pengiriman yang gagal di-retry
+        # dari antrian (bukan hilang seperti dulu)
+        for chat_id in chat_ids:
+            OUTBOX.enqueue(f"lot:{lot_id}:chat:{chat_id}", chat_id, msg, kind, media, lot_id=str(lot_id))
+        if REMINDERS is not None:
+            REMINDERS.track(str(lot_id), parse_end(lot), lot.get("namaLotLelang", "(tanpa judul)"),
+                            f"https://lelang.go.id/lot-lelang/{lot_id}", chat_ids)
+        seen.add(lot_id)
+        new_ids.append(lot_id)
+
+    if new_ids:
         save_seen(seen)
+        SEEN_FILTER.sync(seen, new_ids)
+    fire_reminders()
+    sent = drain(OUTBOX, deliver_message)
+    logging.info("%d notifikasi dikirim, status antrian: %s", sent, OUTBOX.stats())
     return seen
 
 def main():
     seen = load_seen()
-    logging.info("Monitor siap. Interval: %s detik. Keywords: %s", CHECK_INTERVAL, KEYWORDS)
+    logging.info("Monitor siap. Interval: %s detik. Keywords: %s, %d filter rule", CHECK_INTERVAL, KEYWORDS, len(FILTER))
+    # command hanya dijawab untuk chat subscriber, bukan siapa saja yang menemukan bot-nya
+    allowed_chats = [s.chat_id for s in SUBSCRIBERS.subscribers]
+    commands = CommandHandler(TELEGRAM_BOT_TOKEN, VIEW, send_telegram_message, allowed_chats) if ENABLE_COMMANDS else None
+    next_check = time.time()
     while True:
-        try:
-            seen = check_once(seen)
-        except Exception as e:
-            logging.exception("Error saat pengecekan: %s", e)
-        time.sleep(CHECK_INTERVAL)
+        if time.time() >= next_check:
+            next_check = time.time() + CHECK_INTERVAL
+            try:
+                seen = check_once(seen)
+            except Exception as e:
+                logging.exception("Error saat pengecekan: %s", e)
+        else:
+            # bangun di antara cek hanya untuk pengingat yang jatuh tempo
+            try:
+                if fire_reminders():
+                    drain(OUTBOX, deliver_message)
+            except Exception as e:
+                logging.exception("Error saat kirim pengingat: %s", e)
+        wake = next_check
+        nxt = REMINDERS.next_due() if REMINDERS is not None else None
+        if nxt is not None:
+            wake = max(time.time(), min(wake, nxt))
+        if commands is not None:
+            try:
+                commands.serve_until(wake)
+            except Exception as e:
+                logging.exception("Error saat melayani command: %s", e)
+        time.sleep(max(0, wake - time.time()))
 
 if __name__ == "__main__":
-    main()
+    if "--engine" in sys.argv:
+        # jalur asyncio (engine.py); command & pengingat tetap lewat loop biasa
+        import engine
+        engine.main(["--profile", "monitor"] + [a for a in sys.argv[1:] if a != "--engine"])
+    else:
+        main()
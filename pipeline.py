@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+pipeline.py - Pipeline bertahap (producer/consumer) untuk proses per-lot
+
+Dulu tiap lot selesai penuh (detail -> download foto -> kirim) sebelum lot
+berikutnya mulai, jadi koneksi ke api/file.lelang.go.id menganggur saat
+upload ke Telegram dan sebaliknya. Di sini tiap tahap punya thread worker
+sendiri dan antar tahap dihubungkan `queue.Queue` berukuran terbatas:
+
+ - tahap lambat menahan tahap sebelumnya (backpressure), memori tetap kecil
+ - jumlah item yang sedang diproses dibatasi `max_in_flight`
+ - hasil dikeluarkan sesuai urutan input (reorder buffer), jadi urutan pesan
+   ke Telegram tidak berubah walaupun tahap dijalankan paralel
+
+Total waktu mendekati tahap paling lambat, bukan jumlah semua tahap.
+"""
+
+import queue
+import logging
+import threading
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class Stage:
+    """One pipeline step: `func(value) -> value` run by `workers` threads."""
+
+    def __init__(self, name: str, func: Callable[[Any], Any], workers: int = 1):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+
+
+class Pipeline:
+    """Run items through `stages` concurrently, yielding results in input order.
+
+    `run(items)` yields `(item, result, error)` per item. If a stage raises, later
+    stages are skipped for that item and `error` carries the exception; the
+    pipeline itself keeps going.
+    """
+
+    def __init__(self, stages: List[Stage], queue_size: int = 4, max_in_flight: Optional[int] = None):
+        if not stages:
+            raise ValueError("pipeline butuh minimal satu stage")
+        self.stages = stages
+        self.queue_size = max(1, queue_size)
+        self.max_in_flight = max_in_flight or (sum(s.workers for s in stages) + self.queue_size * (len(stages) + 1))
+
+    def _work(self, stage: Stage, inbox: queue.Queue, outbox: queue.Queue, remaining: List[int], lock: threading.Lock):
+        while True:
+            job = inbox.get()
+            if job is _DONE:
+                with lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last:
+                    # worker terakhir tahap ini yang meneruskan sinyal selesai
+                    outbox.put(_DONE)
+                return
+            seq, item, value, error = job
+            if error is None:
+                try:
+                    value = stage.func(value)
+                except Exception as e:
+                    logger.debug(f"Stage {stage.name} gagal untuk item #{seq}: {e}")
+                    error = e
+            outbox.put((seq, item, value, error))
+
+    def run(self, items: Iterable[Any]) -> Iterator[Tuple[Any, Any, Optional[BaseException]]]:
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        slots = threading.BoundedSemaphore(self.max_in_flight)
+        stop = threading.Event()
+        threads = []
+
+        def feed():
+            try:
+                for seq, item in enumerate(items):
+                    slots.acquire()
+                    if stop.is_set():
+                        break
+                    queues[0].put((seq, item, item, None))
+            except Exception as e:
+                logger.error(f"Pipeline feeder error: {e}")
+            finally:
+                for _ in range(self.stages[0].workers):
+                    queues[0].put(_DONE)
+
+        threads.append(threading.Thread(target=feed, name="pipeline-feed", daemon=True))
+        for i, stage in enumerate(self.stages):
+            # sinyal selesai diteruskan sebanyak jumlah worker tahap berikutnya
+            nxt_workers = self.stages[i + 1].workers if i + 1 < len(self.stages) else 1
+            out = queues[i + 1]
+            remaining, lock = [stage.workers], threading.Lock()
+            relay = _Relay(out, nxt_workers)
+            for n in range(stage.workers):
+                threads.append(threading.Thread(target=self._work, args=(stage, queues[i], relay, remaining, lock),
+                                                name=f"pipeline-{stage.name}-{n}", daemon=True))
+        for t in threads:
+            t.start()
+
+        pending = {}
+        next_seq = 0
+        sink = queues[-1]
+        try:
+            while True:
+                job = sink.get()
+                if job is _DONE:
+                    break
+                seq, item, value, error = job
+                pending[seq] = (item, value, error)
+                while next_seq in pending:
+                    yield pending.pop(next_seq)
+                    next_seq += 1
+                    slots.release()
+        finally:
+            stop.set()
+            # konsumen berhenti lebih awal: lepas feeder yang menunggu slot
+            for _ in range(self.max_in_flight):
+                try:
+                    slots.release()
+                except ValueError:
+                    break
+
+
+class _Relay:
+    """Queue wrapper that fans one `_DONE` out to every worker of the next stage."""
+
+    def __init__(self, q: queue.Queue, copies: int):
+        self.q = q
+        self.copies = copies
+
+    def put(self, job):
+        if job is _DONE:
+            for _ in range(self.copies):
+                self.q.put(_DONE)
+        else:
+            self.q.put(job)
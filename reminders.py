@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+reminders.py - Pengingat "lelang selesai dalam 2 jam / 15 menit"
+
+Setiap lot yang sudah diumumkan didaftarkan ke `ReminderScheduler` beserta
+`tglSelesaiLelang`-nya. Jadwal disimpan di heap (fire_at terkecil di atas),
+jadi tiap putaran cukup melihat puncak heap, bukan scan semua lot.
+
+ - state disimpan atomik ke `REMINDERS_FILE` (default: di sebelah SEEN_FILE),
+   heap dibangun ulang saat start sehingga tahan restart
+ - kalau tanggal selesai berubah di upstream (`refresh` dari hasil fetch list),
+   jadwal lama otomatis basi dan jadwal baru dibuat
+ - pengingat yang jatuh tempo dikembalikan sebagai pesan untuk di-enqueue ke
+   delivery queue (jalur kirim Telegram yang sama, ikut rate limit-nya)
+ - `due` dipanggil tiap run (`REMINDER_RUN_INTERVAL`, default cron 30 menit):
+   offset yang lebih pendek dari interval itu dikirim di run terakhir sebelum
+   lelang selesai, bukan dibuang karena run berikutnya sudah lewat
+"""
+
+import os
+import html
+import time
+import heapq
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List, Dict, Any, Iterable, Tuple
+
+import jsoncodec
+
+logger = logging.getLogger(__name__)
+
+WIB = timezone(timedelta(hours=7))
+# menit sebelum tglSelesaiLelang, dipisah koma
+REMINDER_OFFSETS = [int(x) for x in os.getenv("REMINDER_OFFSETS", "120,15").split(",") if x.strip()]
+# lot yang sudah lewat selesai lebih dari ini dibuang dari state
+RETAIN_AFTER_END = 86400
+# jeda antar pemanggilan `due` (detik): app.py jalan sebagai cron tiap 30 menit
+# (render.yaml); monitor_lelang_api memakai CHECK_INTERVAL-nya sendiri
+RUN_INTERVAL = float(os.getenv("REMINDER_RUN_INTERVAL", "1800"))
+
+
+def default_path(seen_file: str) -> str:
+    return os.getenv("REMINDERS_FILE") or os.path.join(os.path.dirname(os.path.abspath(seen_file)), "reminders.json")
+
+
+def parse_end(lot: Dict[str, Any]) -> Optional[float]:
+    d = lot.get("tglSelesaiLelang") or lot.get("tglSelesai")
+    if not d:
+        return None
+    try:
+        dt = datetime.fromisoformat(str(d).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=WIB)
+    return dt.timestamp()
+
+
+def _offset_label(minutes: int) -> str:
+    if minutes % 60 == 0:
+        return f"{minutes // 60} jam"
+    return f"{minutes} menit"
+
+
+def format_reminder(entry: Dict[str, Any], offset: int) -> str:
+    end = datetime.fromtimestamp(entry["end"], WIB).strftime("%d %b %Y %H:%M")
+    return (
+        f"⏰ <b>Lelang selesai dalam {_offset_label(offset)}</b>\n"
+        f"{html.escape(entry.get('title') or '(tanpa judul)')}\n"
+        f"🗓 Selesai: {end} WIB\n"
+        f"🔗 <a href=\"{html.escape(entry.get('link') or '')}\">Lihat detail lelang</a>"
+    )
+
+
+class ReminderScheduler:
+    """Heap of (fire_at, lot_id, offset, end) over tracked lots, persisted as JSON."""
+
+    def __init__(self, path: str, offsets: Iterable[int] = REMINDER_OFFSETS, run_interval: float = RUN_INTERVAL):
+        self.path = path
+        self.offsets = sorted(set(offsets), reverse=True)
+        self.run_interval = run_interval
+        self.lots: Dict[str, Dict[str, Any]] = {}
+        self._heap: List[Tuple[float, str, int, float]] = []
+        self._dirty = False
+        self.load()
+
+    # ---------- persistence ----------
+
+    def load(self):
+        try:
+            with open(self.path, "rb") as f:
+                data = jsoncodec.load(f)
+            self.lots = data.get("lots", {}) if isinstance(data, dict) else {}
+        except FileNotFoundError:
+            self.lots = {}
+        except Exception as e:
+            logger.error(f"Gagal load {self.path}: {e}")
+            self.lots = {}
+        self._heap = []
+        for lot_id, entry in self.lots.items():
+            self._schedule(lot_id, entry)
+        logger.debug(f"Loaded {len(self.lots)} lot dengan pengingat dari {self.path}")
+
+    def save(self):
+        if not self._dirty:
+            return
+        try:
+            tmp = self.path + ".tmp"
+            with open(tmp, "wb") as f:
+                jsoncodec.dump({"lots": self.lots}, f)
+            os.replace(tmp, self.path)
+            self._dirty = False
+        except Exception as e:
+            logger.error(f"Gagal simpan {self.path}: {e}")
+
+    # ---------- scheduling ----------
+
+    def _fire_at(self, end: float, off: int) -> float:
+        # offset lebih pendek dari interval run: kirim di run terakhir sebelum selesai,
+        # kalau ditunggu sampai tepat `off` menit, run berikutnya bisa sudah lewat selesai
+        return end - max(off * 60, self.run_interval)
+
+    def _schedule(self, lot_id: str, entry: Dict[str, Any]):
+        fired = set(entry.get("fired", []))
+        for off in self.offsets:
+            if off not in fired:
+                heapq.heappush(self._heap, (self._fire_at(entry["end"], off), lot_id, off, entry["end"]))
+
+    def track(self, lot_id: str, end_ts: Optional[float], title: str, link: str, chat_ids: List[str]):
+        """Register (or update) an announced lot."""
+        if end_ts is None:
+            return
+        lot_id = str(lot_id)
+        entry = self.lots.get(lot_id)
+        if entry is not None and entry["end"] == end_ts:
+            merged = sorted(set(entry.get("chats", [])) | set(map(str, chat_ids)))
+            if merged != entry.get("chats"):
+                entry["chats"] = merged
+                self._dirty = True
+            return
+        chats = sorted(set(map(str, chat_ids)) | set(entry.get("chats", []) if entry else []))
+        entry = {"end": end_ts, "title": title, "link": link, "chats": chats, "fired": []}
+        self.lots[lot_id] = entry
+        self._schedule(lot_id, entry)
+        self._dirty = True
+
+    def refresh(self, items: Iterable[Dict[str, Any]]) -> int:
+        """Reschedule tracked lots whose tglSelesaiLelang changed upstream. Returns count changed."""
+        changed = 0
+        for lot in items:
+            raw = lot.get("lotLelangId") or lot.get("id")
+            entry = self.lots.get(str(raw)) if raw else None
+            if entry is None:
+                continue
+            end_ts = parse_end(lot)
+            if end_ts is not None and end_ts != entry["end"]:
+                logger.info(f"Tanggal selesai lot {raw} berubah, jadwal pengingat diperbarui")
+                self.track(str(raw), end_ts, entry.get("title"), entry.get("link"), entry.get("chats", []))
+                changed += 1
+        return changed
+
+    def next_due(self) -> Optional[float]:
+        """fire_at of the earliest live reminder (stale heap entries are dropped)."""
+        while self._heap:
+            fire_at, lot_id, off, end = self._heap[0]
+            entry = self.lots.get(lot_id)
+            if entry is None or entry["end"] != end or off in entry.get("fired", []):
+                heapq.heappop(self._heap)
+                continue
+            return fire_at
+        return None
+
+    def due(self, now: Optional[float] = None) -> List[Tuple[str, int, Dict[str, Any]]]:
+        """Pop every reminder due at `now`: list of (lot_id, offset_minutes, entry)."""
+        now = time.time() if now is None else now
+        out = []
+        while True:
+            fire_at = self.next_due()
+            if fire_at is None or fire_at > now:
+                break
+            _, lot_id, off, end = heapq.heappop(self._heap)
+            entry = self.lots[lot_id]
+            entry.setdefault("fired", []).append(off)
+            self._dirty = True
+            # telat sampai satu interval run (+ durasi run) itu normal untuk cron
+            if now >= end or now - fire_at > max(off * 30, 1.5 * self.run_interval):
+                # sudah lewat / telat jauh lebih dari itu (mis. bot mati lama, atau
+                # tanggal dimajukan): jangan kirim pengingat yang menyesatkan
+                continue
+            # kalau beberapa offset sekaligus jatuh tempo, cukup kirim yang terdekat
+            if any(o < off and self._fire_at(end, o) <= now for o in self.offsets):
+                continue
+            out.append((lot_id, off, entry))
+        self._prune(now)
+        return out
+
+    def _prune(self, now: float):
+        for lot_id in [k for k, e in self.lots.items() if e["end"] < now - RETAIN_AFTER_END]:
+            del self.lots[lot_id]
+            self._dirty = True
+
+    def enqueue_due(self, outbox, now: Optional[float] = None) -> int:
+        """Enqueue due reminders into the delivery queue. Returns messages enqueued."""
+        n = 0
+        for lot_id, off, entry in self.due(now):
+            text = format_reminder(entry, off)
+            for chat_id in entry.get("chats", []):
+                key = f"remind:{lot_id}:{off}:{int(entry['end'])}:chat:{chat_id}"
+                if outbox.enqueue(key, chat_id, text, "text", lot_id=lot_id):
+                    n += 1
+        if n:
+            logger.info(f"{n} pengingat masuk antrian")
+        return n
@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""
+retry.py - Retry policy + circuit breaker per host upstream
+
+Dipakai bersama oleh semua entry point untuk api.lelang.go.id,
+file.lelang.go.id dan api.telegram.org:
+ - jittered exponential backoff ("full jitter") menggantikan sleep tetap
+   0.6 / 0.4 / 0.25*attempt yang dulu tersebar di app.py
+ - circuit breaker per host: setelah `BREAKER_FAILURES` kegagalan beruntun,
+   host dianggap down dan request berikutnya langsung ditolak
+   (`CircuitOpenError`) sampai `BREAKER_RESET` detik lewat, lalu satu request
+   percobaan (half-open) menentukan host sudah pulih atau belum
+ - hedged GET (opsional): kalau request pertama belum selesai setelah
+   `hedge_after` detik, kirim request kedua dan pakai yang selesai duluan
+ - politeness untuk host lelang (`POLITE_HOSTS`): jumlah request paralel per
+   host diatur AIMD (naik +1 per window sehat, dipotong setengah saat 429/5xx/
+   timeout/latency melonjak) dan semua request ke host tsb berbagi satu
+   batas keras `UPSTREAM_RPM` request per menit (token bucket)
+"""
+
+import os
+import time
+import random
+import logging
+import weakref
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, wait, FIRST_COMPLETED
+from typing import Optional, Dict, Tuple, Type, Callable
+from urllib.parse import urlparse
+
+import requests
+
+import jsoncodec
+
+logger = logging.getLogger(__name__)
+
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_RESET = float(os.getenv("BREAKER_RESET_SECONDS", "60"))
+
+# host (suffix) yang kena limiter AIMD + budget RPM global; Telegram punya aturan sendiri
+POLITE_HOSTS = tuple(h.strip().lower() for h in os.getenv("POLITE_HOSTS", "lelang.go.id").split(",") if h.strip())
+UPSTREAM_RPM = float(os.getenv("UPSTREAM_RPM", "120"))
+AIMD_INITIAL = int(os.getenv("AIMD_INITIAL", "2"))
+AIMD_MAX = int(os.getenv("AIMD_MAX", "8"))
+# latency > faktor x rata-rata (EWMA) dianggap lonjakan
+LATENCY_SPIKE_FACTOR = float(os.getenv("LATENCY_SPIKE_FACTOR", "3"))
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a host whose circuit breaker is open."""
+
+
+# -----------------------------------------
+# RETRY POLICY
+# -----------------------------------------
+
+
+class RetryPolicy:
+    """Attempt count + full-jitter exponential backoff."""
+
+    def __init__(self, attempts: int = 3, base: float = 0.5, cap: float = 8.0,
+                 statuses: Tuple[int, ...] = RETRY_STATUSES,
+                 exceptions: Tuple[Type[BaseException], ...] = (requests.ConnectionError, requests.Timeout)):
+        self.attempts = max(1, attempts)
+        self.base = base
+        self.cap = cap
+        self.statuses = statuses
+        self.exceptions = exceptions
+
+    def delay(self, attempt: int) -> float:
+        """Backoff before attempt `attempt + 1` (attempt is 1-based)."""
+        return random.uniform(0, min(self.cap, self.base * (2 ** (attempt - 1))))
+
+    def sleep(self, attempt: int, retry_after: Optional[float] = None):
+        d = self.delay(attempt)
+        if retry_after is not None:
+            d = max(d, min(retry_after, self.cap * 4))
+        time.sleep(d)
+
+
+# Policy per jenis request
+LIST_POLICY = RetryPolicy(attempts=3, base=1.0, cap=10.0)
+DETAIL_POLICY = RetryPolicy(attempts=3, base=0.4, cap=4.0)
+# file.lelang.go.id kadang balas 403 sampai cookie/Referer "nyangkut", jadi 403 ikut di-retry
+PHOTO_POLICY = RetryPolicy(attempts=3, base=0.25, cap=2.0, statuses=RETRY_STATUSES + (403,))
+# POST ke Telegram tidak idempotent: jangan retry timeout (bisa saja sudah terkirim)
+TELEGRAM_POLICY = RetryPolicy(attempts=3, base=1.0, cap=30.0, exceptions=(requests.ConnectionError,))
+
+
+# -----------------------------------------
+# CIRCUIT BREAKER
+# -----------------------------------------
+
+
+class CircuitBreaker:
+    def __init__(self, host: str, failures: int = BREAKER_FAILURES, reset_after: float = BREAKER_RESET):
+        self.host = host
+        self.max_failures = failures
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_after:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._probing:
+                # satu request percobaan saja
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info(f"Circuit {self.host} pulih (closed)")
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.max_failures:
+                if self.opened_at is None or self._probing:
+                    logger.warning(f"Circuit {self.host} OPEN setelah {self.failures} kegagalan, jeda {self.reset_after:.0f}s")
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def host_of(url: str) -> str:
+    return (urlparse(url).hostname or "").lower()
+
+
+def breaker_for(url_or_host: str) -> CircuitBreaker:
+    host = host_of(url_or_host) if "://" in url_or_host else url_or_host.lower()
+    with _breakers_lock:
+        br = _breakers.get(host)
+        if br is None:
+            br = _breakers[host] = CircuitBreaker(host)
+        return br
+
+
+# -----------------------------------------
+# POLITENESS: AIMD PER HOST + RPM GLOBAL
+# -----------------------------------------
+
+
+class TokenBucket:
+    """Hard ceiling of `rate_per_minute` requests, shared by every caller."""
+
+    def __init__(self, rate_per_minute: float, burst: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst if burst is not None else max(1.0, min(10.0, self.rate * 5))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take one token now; returns how long the caller must wait before using it."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+    def take(self):
+        wait_for = self.reserve()
+        if wait_for:
+            time.sleep(wait_for)
+
+
+class AIMDLimiter:
+    """Adaptive in-flight limit for one host (additive increase, multiplicative decrease)."""
+
+    def __init__(self, host: str, initial: int = AIMD_INITIAL, maximum: int = AIMD_MAX, minimum: int = 1):
+        self.host = host
+        self.minimum = minimum
+        self.maximum = max(minimum, maximum)
+        self.limit = float(min(self.maximum, max(minimum, initial)))
+        self.inflight = 0
+        self.latency: Optional[float] = None  # EWMA detik
+        self._healthy = 0
+        self._last_cut = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.inflight >= int(self.limit):
+                self._cond.wait()
+            self.inflight += 1
+
+    def release(self, elapsed: float, congested: bool):
+        with self._cond:
+            self.inflight -= 1
+            self.record(elapsed, congested)
+            self._cond.notify_all()
+
+    def record(self, elapsed: float, congested: bool):
+        """Adjust the limit from one finished request (also used by the async engine)."""
+        spike = self.latency is not None and elapsed > max(1.0, self.latency * LATENCY_SPIKE_FACTOR)
+        if congested or spike:
+            now = time.monotonic()
+            # satu potongan per "RTT": request lain yang gagal bersamaan tidak memotong lagi
+            if now - self._last_cut > (self.latency or 1.0):
+                self.limit = max(self.minimum, self.limit / 2)
+                self._last_cut = now
+                logger.info(f"AIMD {self.host}: {'congestion' if congested else 'latency spike'} -> limit {int(self.limit)}")
+            self._healthy = 0
+        else:
+            # +1 setelah satu window (sebanyak limit) request sehat
+            self._healthy += 1
+            if self._healthy >= int(self.limit) and self.limit < self.maximum:
+                self.limit += 1
+                self._healthy = 0
+        self.latency = elapsed if self.latency is None else 0.8 * self.latency + 0.2 * elapsed
+
+
+_limiters: Dict[str, AIMDLimiter] = {}
+# budget bersama semua jalur fetch (thread maupun engine asyncio)
+BUDGET = TokenBucket(UPSTREAM_RPM)
+
+
+def is_polite_host(host: str) -> bool:
+    return any(host == h or host.endswith("." + h) for h in POLITE_HOSTS)
+
+
+def limiter_for(host: str) -> AIMDLimiter:
+    with _breakers_lock:
+        lim = _limiters.get(host)
+        if lim is None:
+            lim = _limiters[host] = AIMDLimiter(host)
+        return lim
+
+
+def _release_on_close(resp: requests.Response, limiter: AIMDLimiter, start: float):
+    """Keep the AIMD slot of a streamed response until its body is closed.
+
+    With `stream=True` the body (multi-MB photos) is read after `send()` returns;
+    the slot and the latency fed to AIMD must cover that transfer too. Callers
+    close the response when done (`read_capped` does); a finalizer is the
+    backstop for responses that are dropped without `close()`.
+    """
+    lock = threading.Lock()
+    released = []
+
+    def release():
+        with lock:
+            if released:
+                return
+            released.append(True)
+        limiter.release(time.monotonic() - start, False)
+
+    close = resp.close
+
+    def close_and_release():
+        try:
+            close()
+        finally:
+            release()
+
+    resp.close = close_and_release
+    weakref.finalize(resp, release)
+
+
+def _polite(send: Callable[[], requests.Response], host: str, stream: bool = False) -> Callable[[], requests.Response]:
+    """Wrap `send` with the global RPM budget and the host's AIMD limiter."""
+    limiter = limiter_for(host)
+
+    def wrapped() -> requests.Response:
+        BUDGET.take()
+        limiter.acquire()
+        start = time.monotonic()
+        congested = True
+        deferred = False
+        try:
+            resp = send()
+            congested = resp.status_code == 429 or resp.status_code >= 500
+            if stream and not congested:
+                _release_on_close(resp, limiter, start)
+                deferred = True
+            return resp
+        finally:
+            if not deferred:
+                limiter.release(time.monotonic() - start, congested)
+
+    return wrapped
+
+
+# -----------------------------------------
+# REQUEST HELPERS
+# -----------------------------------------
+
+_hedge_pool = ThreadPoolExecutor(max_workers=int(os.getenv("HEDGE_WORKERS", "4")), thread_name_prefix="hedge")
+
+
+def _hedged(send: Callable[[], requests.Response], hedge_after: float) -> requests.Response:
+    first = _hedge_pool.submit(send)
+    try:
+        return first.result(timeout=hedge_after)
+    except FutureTimeout:
+        pass
+    logger.debug(f"Request belum selesai setelah {hedge_after}s, kirim hedge request")
+    second = _hedge_pool.submit(send)
+    done, pending = wait([first, second], return_when=FIRST_COMPLETED)
+    for f in done:
+        if f.exception() is None:
+            return f.result()
+    # yang selesai duluan gagal: tunggu yang satunya
+    return pending.pop().result() if pending else first.result()
+
+
+def _retry_after(resp: requests.Response) -> Optional[float]:
+    raw = resp.headers.get("Retry-After") if resp is not None else None
+    if raw is None:
+        # Telegram menaruh retry_after di body JSON
+        try:
+            raw = (jsoncodec.response_json(resp).get("parameters") or {}).get("retry_after")
+        except Exception:
+            raw = None
+    try:
+        return float(raw) if raw is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def request(session, method: str, url: str, policy: RetryPolicy = DETAIL_POLICY,
+            hedge_after: Optional[float] = None, **kwargs) -> requests.Response:
+    """Send a request through the host's circuit breaker with retry/backoff.
+
+    Returns the last response (even a non-2xx one once retries are exhausted, so
+    callers keep their own status handling). Raises CircuitOpenError if the host is
+    known to be down, or the last exception if every attempt raised.
+    `hedge_after` (seconds) enables hedging; only use it for idempotent GETs.
+    Requests to POLITE_HOSTS (every send, including hedges and retries) also wait
+    for the global RPM budget and the host's AIMD concurrency limit.
+    """
+    breaker = breaker_for(url)
+    send = lambda: session.request(method, url, **kwargs)
+    if is_polite_host(breaker.host):
+        send = _polite(send, breaker.host, stream=bool(kwargs.get("stream")))
+    last_exc: Optional[BaseException] = None
+    resp = None
+    for attempt in range(1, policy.attempts + 1):
+        if not breaker.allow():
+            raise CircuitOpenError(f"circuit {breaker.host} open")
+        try:
+            resp = _hedged(send, hedge_after) if hedge_after else send()
+        except policy.exceptions as e:
+            breaker.record_failure()
+            last_exc, resp = e, None
+            logger.debug(f"{method} {url} attempt {attempt} error: {e}")
+            if attempt < policy.attempts:
+                policy.sleep(attempt)
+            continue
+        except Exception:
+            breaker.record_failure()
+            raise
+
+        if resp.status_code in policy.statuses:
+            # 4xx selain 429 bukan tanda host down: host menjawab, jadi probe
+            # half-open tetap harus ditutup (kalau tidak, circuit macet terbuka)
+            if resp.status_code >= 500 or resp.status_code == 429:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            logger.debug(f"{method} {url} attempt {attempt} status {resp.status_code}")
+            if attempt < policy.attempts:
+                # response yang dibuang: tutup (stream=True memegang koneksi + slot AIMD)
+                resp.close()
+                policy.sleep(attempt, _retry_after(resp))
+            continue
+        breaker.record_success()
+        return resp
+
+    if resp is not None:
+        return resp
+    raise last_exc if last_exc else RuntimeError(f"{method} {url} gagal")
+
+
+def get(session, url: str, policy: RetryPolicy = DETAIL_POLICY, **kwargs) -> requests.Response:
+    return request(session, "GET", url, policy, **kwargs)
+
+
+def post(url: str, policy: RetryPolicy = TELEGRAM_POLICY, session=None, **kwargs) -> requests.Response:
+    return request(session or requests, "POST", url, policy, **kwargs)
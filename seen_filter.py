@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+seen_filter.py - Bloom filter (mmap) di depan seen-store
+
+Seen-store (`SEEN_FILE`) adalah list JSON semua id lot yang pernah dikirim;
+dengan histori bertahun-tahun dari banyak KPKNL, load-nya makan detik dan
+puluhan MB di tiap cold start, padahal hampir semua pengecekan hanya butuh
+jawaban "lot ini pasti baru?". Di sini snapshot id seen disimpan sebagai
+Bloom filter di file (`SEEN_FILTER_FILE`, default `<SEEN_FILE>.bloom`) yang
+dibaca lewat mmap tanpa parsing:
+
+ - id yang tidak ada di filter PASTI baru -> langsung diproses
+ - id yang "mungkin ada" dicek ke seen-store asli, yang di-load di thread
+   terpisah (`SeenHistory`) sementara lot yang pasti baru sudah jalan
+
+Header snapshot mencatat ukuran + mtime `SEEN_FILE` saat snapshot dibuat.
+Kalau seen-store diubah penulis lain yang tidak ikut meng-update snapshot
+(engine.py, edit manual), snapshot dianggap basi dan diabaikan sampai dibangun ulang, jadi
+filter tidak pernah membuat lot lama terkirim ulang.
+"""
+
+import os
+import mmap
+import math
+import struct
+import hashlib
+import logging
+import threading
+from typing import Callable, Iterable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+SEEN_FILTER = os.getenv("SEEN_FILTER", "1") == "1"
+SEEN_FILTER_FP = float(os.getenv("SEEN_FILTER_FP", "0.01"))
+# kapasitas minimum snapshot baru; tumbuh 2x saat penuh
+SEEN_FILTER_MIN_CAPACITY = int(os.getenv("SEEN_FILTER_MIN_CAPACITY", "100000"))
+
+_MAGIC = b"LSB1"
+# magic, m (bit), k, count, capacity, seen_size, seen_mtime_ns
+_HEADER = struct.Struct("<4sQIQQQQ")
+
+
+def default_path(seen_file: str) -> str:
+    return os.getenv("SEEN_FILTER_FILE") or seen_file + ".bloom"
+
+
+def _stamp(seen_file: str):
+    try:
+        st = os.stat(seen_file)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def _positions(key: str, m: int, k: int):
+    d = hashlib.blake2b(str(key).encode("utf-8"), digest_size=16).digest()
+    h1 = int.from_bytes(d[:8], "little")
+    h2 = int.from_bytes(d[8:], "little") | 1
+    return [(h1 + i * h2) % m for i in range(k)]
+
+
+class BloomFile:
+    """Bloom filter whose bit array lives in a (memory-mapped) file."""
+
+    def __init__(self, mm: mmap.mmap, m: int, k: int, count: int, capacity: int):
+        self.mm = mm
+        self.m = m
+        self.k = k
+        self.count = count
+        self.capacity = capacity
+
+    @staticmethod
+    def params(capacity: int, fp_rate: float):
+        m = max(64, int(math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2))))
+        k = max(1, round(m / capacity * math.log(2)))
+        return m, k
+
+    @classmethod
+    def build(cls, path: str, ids: Iterable[str], n_hint: int, stamp, fp_rate: float = SEEN_FILTER_FP) -> "BloomFile":
+        """Write a fresh snapshot atomically (tmp + replace) and open it."""
+        capacity = max(SEEN_FILTER_MIN_CAPACITY, 2 * n_hint)
+        m, k = cls.params(capacity, fp_rate)
+        bits = bytearray((m + 7) // 8)
+        count = 0
+        for key in ids:
+            for p in _positions(key, m, k):
+                bits[p >> 3] |= 1 << (p & 7)
+            count += 1
+        size, mtime = stamp or (0, 0)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, m, k, count, capacity, size, mtime))
+            f.write(bits)
+        os.replace(tmp, path)
+        return cls.open(path, writable=True)
+
+    @classmethod
+    def open(cls, path: str, writable: bool = False) -> Optional["BloomFile"]:
+        try:
+            with open(path, "r+b" if writable else "rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        if len(mm) < _HEADER.size:
+            mm.close()
+            return None
+        magic, m, k, count, capacity, _, _ = _HEADER.unpack_from(mm, 0)
+        if magic != _MAGIC or len(mm) < _HEADER.size + (m + 7) // 8:
+            mm.close()
+            return None
+        return cls(mm, m, k, count, capacity)
+
+    def stamp(self):
+        _, _, _, _, _, size, mtime = _HEADER.unpack_from(self.mm, 0)
+        return size, mtime
+
+    def __contains__(self, key: str) -> bool:
+        mm, base = self.mm, _HEADER.size
+        for p in _positions(key, self.m, self.k):
+            if not mm[base + (p >> 3)] & (1 << (p & 7)):
+                return False
+        return True
+
+    def add(self, key: str):
+        mm, base = self.mm, _HEADER.size
+        for p in _positions(key, self.m, self.k):
+            i = base + (p >> 3)
+            mm[i] = mm[i] | (1 << (p & 7))
+        self.count += 1
+
+    def restamp(self, stamp):
+        size, mtime = stamp or (0, 0)
+        _HEADER.pack_into(self.mm, 0, _MAGIC, self.m, self.k, self.count, self.capacity, size, mtime)
+        self.mm.flush()
+
+    def close(self):
+        self.mm.close()
+
+
+class SeenFilter:
+    """Snapshot of a seen-store: `definitely_new(id)` without loading the store."""
+
+    def __init__(self, seen_file: str, path: Optional[str] = None, enabled: bool = SEEN_FILTER):
+        self.seen_file = seen_file
+        self.path = path or default_path(seen_file)
+        self.enabled = enabled
+        self.bloom: Optional[BloomFile] = None
+        self._synced = None
+        if enabled:
+            self._open()
+
+    def _open(self):
+        bloom = BloomFile.open(self.path)
+        if bloom is None:
+            return
+        if bloom.stamp() != _stamp(self.seen_file):
+            logger.info(f"Snapshot {self.path} basi ({self.seen_file} berubah), diabaikan sampai dibangun ulang")
+            bloom.close()
+            return
+        self.bloom = bloom
+
+    @property
+    def usable(self) -> bool:
+        return self.bloom is not None
+
+    def definitely_new(self, lot_id: str) -> bool:
+        return self.bloom is not None and str(lot_id) not in self.bloom
+
+    def sync(self, seen: Set[str], added: Iterable[str] = (), base=None):
+        """Bring the snapshot in line with a just-saved seen-store.
+
+        `base` is the `SEEN_FILE` stamp the caller's set was loaded from (see
+        `SeenHistory.stamp`); default is the stamp of this object's previous
+        sync. When the snapshot on disk still carries that stamp it already
+        holds everything in `seen` except `added`, so only those are added.
+        Otherwise (missing, stale, full) it is rebuilt from `seen`.
+        """
+        if not self.enabled:
+            return
+        base = base if base is not None else self._synced
+        stamp = _stamp(self.seen_file)
+        added = [str(x) for x in added]
+        try:
+            if self.bloom is not None:
+                self.bloom.close()
+                self.bloom = None
+            bloom = BloomFile.open(self.path, writable=True) if base is not None else None
+            if bloom is not None and bloom.stamp() == tuple(base) and bloom.count + len(added) <= bloom.capacity:
+                for key in added:
+                    bloom.add(key)
+                bloom.restamp(stamp)
+                bloom.close()
+            else:
+                if bloom is not None:
+                    bloom.close()
+                BloomFile.build(self.path, (str(x) for x in seen), len(seen), stamp).close()
+                logger.info(f"Snapshot seen {self.path} dibangun ulang ({len(seen)} id)")
+            self._synced = stamp
+            self._open()
+        except Exception as e:
+            # snapshot hanya akselerator: gagal = run berikutnya load penuh seperti dulu
+            logger.warning(f"Gagal update snapshot seen {self.path}: {e}")
+            self.bloom = None
+            self._synced = None
+
+
+class SeenHistory:
+    """Authoritative seen-store loaded in a background thread.
+
+    `stamp` is the `SEEN_FILE` (size, mtime) the set was loaded from, or None
+    if the file changed while loading.
+    """
+
+    def __init__(self, loader: Callable[[], Set[str]], seen_file: Optional[str] = None, background: bool = True):
+        self._loader = loader
+        self._seen_file = seen_file
+        self._seen: Optional[Set[str]] = None
+        self._error: Optional[BaseException] = None
+        self.stamp = None
+        self._thread = None
+        if background:
+            self._thread = threading.Thread(target=self._load, name="seen-load", daemon=True)
+            self._thread.start()
+        else:
+            self._load()
+
+    def _load(self):
+        try:
+            before = _stamp(self._seen_file) if self._seen_file else None
+            self._seen = self._loader()
+            if before is not None and before == _stamp(self._seen_file):
+                self.stamp = before
+        except BaseException as e:
+            self._error = e
+
+    def result(self) -> Set[str]:
+        if self._thread is not None:
+            self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self._seen
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+sharding.py - Koordinasi beberapa proses worker (lease shard + klaim lot)
+
+Dua salinan app.py yang jalan bersamaan dulu double-post karena masing-masing
+membaca SEEN_FILE sendiri. Modul ini menambahkan lapisan koordinasi:
+
+ - target/shard = (KPKNL, kategori), dari env `TARGETS`
+ - worker mengambil *lease* berbatas waktu per shard (`LEASE_TTL` detik),
+   memperpanjangnya selama run (`LeaseKeeper`), dan melepasnya di akhir;
+   lease milik worker yang mati kadaluarsa sehingga worker lain mengambil alih
+ - `claim(lot_id)` atomik: hanya satu worker di seluruh fleet yang berhasil
+   meng-klaim sebuah lot, jadi tiap lot dikirim tepat sekali
+
+Backend:
+ - SQLite (default, `COORDINATOR=sqlite:///path` atau path biasa) untuk
+   beberapa proses di satu host
+ - Redis (`COORDINATOR=redis://...`, butuh paket `redis`) untuk beberapa host;
+   SQLite bisa menggantikannya secara lokal karena interface-nya sama
+
+Tanpa `COORDINATOR` bot jalan seperti dulu (satu proses, tanpa lease/klaim).
+"""
+
+import os
+import time
+import uuid
+import socket
+import sqlite3
+import logging
+import threading
+from typing import Optional, List, Dict, Iterable
+
+logger = logging.getLogger(__name__)
+
+COORDINATOR = os.getenv("COORDINATOR", "")
+LEASE_TTL = float(os.getenv("LEASE_TTL", "120"))
+# batas shard per worker (0 = ambil semua yang bebas)
+MAX_SHARDS = int(os.getenv("MAX_SHARDS", "0"))
+CLAIM_TTL_DAYS = int(os.getenv("CLAIM_TTL_DAYS", "90"))
+
+CATALOG_URL = "https://api.lelang.go.id/api/v1/landing-page-kpknl/{}/katalog-lot-lelang"
+
+
+def default_worker_id() -> str:
+    return os.getenv("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+# -----------------------------------------
+# TARGETS
+# -----------------------------------------
+
+
+class Target:
+    """One shard: a KPKNL catalog, optionally narrowed to some categories."""
+
+    def __init__(self, kpknl: str, categories: Iterable[str] = (), url: Optional[str] = None):
+        self.kpknl = kpknl
+        self.categories = tuple(categories)
+        self.url = url or self._build_url()
+
+    @property
+    def key(self) -> str:
+        return f"{self.kpknl}:{'+'.join(self.categories) or '*'}"
+
+    def _build_url(self) -> str:
+        url = CATALOG_URL.format(self.kpknl)
+        if self.categories:
+            url += "?" + "&".join(f"namakategori[]={c}" for c in self.categories)
+        return url
+
+    def __repr__(self):
+        return f"Target({self.key})"
+
+
+def parse_targets(spec: str) -> List[Target]:
+    """`TARGETS` format: `<kpknl_id>[:Kategori|Kategori],...`
+
+    Contoh: `6705ef6e-...:Mobil,6705ef6e-...:Motor,0a1b2c3d-...`
+    """
+    targets = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        kpknl, _, cats = part.partition(":")
+        targets.append(Target(kpknl.strip(), [c.strip() for c in cats.split("|") if c.strip()]))
+    return targets
+
+
+def targets_from_env(default_url: str) -> List[Target]:
+    """Targets from `TARGETS`, or a single target wrapping the existing API_URL."""
+    spec = os.getenv("TARGETS", "")
+    if spec.strip():
+        return parse_targets(spec)
+    return [Target("default", url=default_url)]
+
+
+# -----------------------------------------
+# BACKENDS
+# -----------------------------------------
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    shard       TEXT PRIMARY KEY,
+    owner       TEXT NOT NULL,
+    expires_at  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS claims (
+    lot_id      TEXT PRIMARY KEY,
+    owner       TEXT NOT NULL,
+    claimed_at  REAL NOT NULL
+);
+-- penanda shard sudah di-seed; tidak pernah kadaluarsa (tidak ikut purge)
+CREATE TABLE IF NOT EXISTS seeds (
+    marker      TEXT PRIMARY KEY,
+    owner       TEXT NOT NULL,
+    seeded_at   REAL NOT NULL
+);
+"""
+
+
+class SQLiteCoordinator:
+    """Lease + claim store in a local SQLite file; one connection per thread."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._conn() as c:
+            c.executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def acquire(self, shard: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        with self._conn() as c:
+            cur = c.execute(
+                "INSERT INTO leases(shard, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(shard) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE leases.expires_at < ? OR leases.owner = excluded.owner",
+                (shard, owner, now + ttl, now),
+            )
+        return cur.rowcount == 1
+
+    def renew(self, shard: str, owner: str, ttl: float) -> bool:
+        with self._conn() as c:
+            cur = c.execute("UPDATE leases SET expires_at = ? WHERE shard = ? AND owner = ?", (time.time() + ttl, shard, owner))
+        return cur.rowcount == 1
+
+    def release(self, shard: str, owner: str):
+        with self._conn() as c:
+            c.execute("DELETE FROM leases WHERE shard = ? AND owner = ?", (shard, owner))
+
+    def claim(self, lot_id: str, owner: str) -> bool:
+        with self._conn() as c:
+            cur = c.execute("INSERT OR IGNORE INTO claims(lot_id, owner, claimed_at) VALUES (?, ?, ?)", (lot_id, owner, time.time()))
+        return cur.rowcount == 1
+
+    def claim_many(self, lot_ids: Iterable[str], owner: str) -> int:
+        now = time.time()
+        with self._conn() as c:
+            before = c.total_changes
+            c.executemany("INSERT OR IGNORE INTO claims(lot_id, owner, claimed_at) VALUES (?, ?, ?)", [(i, owner, now) for i in lot_ids])
+            return c.total_changes - before
+
+    def unclaim(self, lot_id: str, owner: str):
+        with self._conn() as c:
+            c.execute("DELETE FROM claims WHERE lot_id = ? AND owner = ?", (lot_id, owner))
+
+    def mark_seeded(self, marker: str, owner: str) -> bool:
+        """Record a shard seed marker (no expiry). True only for the first caller."""
+        with self._conn() as c:
+            cur = c.execute("INSERT OR IGNORE INTO seeds(marker, owner, seeded_at) VALUES (?, ?, ?)", (marker, owner, time.time()))
+        return cur.rowcount == 1
+
+    def purge(self, keep_days: int = CLAIM_TTL_DAYS):
+        with self._conn() as c:
+            c.execute("DELETE FROM claims WHERE claimed_at < ?", (time.time() - keep_days * 86400,))
+
+
+class RedisCoordinator:
+    """Same interface on a Redis-compatible server (SET NX PX + owner-checked Lua)."""
+
+    _RENEW = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('pexpire', KEYS[1], ARGV[2]) else return 0 end"
+    _RELEASE = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+
+    def __init__(self, url: str, prefix: str = "lelang:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("COORDINATOR=redis://... butuh paket `redis` (pip install redis)") from e
+        self.r = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self._renew = self.r.register_script(self._RENEW)
+        self._release = self.r.register_script(self._RELEASE)
+
+    def acquire(self, shard: str, owner: str, ttl: float) -> bool:
+        key = f"{self.prefix}lease:{shard}"
+        if self.r.set(key, owner, nx=True, px=int(ttl * 1000)):
+            return True
+        # lease sendiri dari run sebelumnya: perpanjang
+        return bool(self._renew(keys=[key], args=[owner, int(ttl * 1000)]))
+
+    def renew(self, shard: str, owner: str, ttl: float) -> bool:
+        return bool(self._renew(keys=[f"{self.prefix}lease:{shard}"], args=[owner, int(ttl * 1000)]))
+
+    def release(self, shard: str, owner: str):
+        self._release(keys=[f"{self.prefix}lease:{shard}"], args=[owner])
+
+    def claim(self, lot_id: str, owner: str) -> bool:
+        return bool(self.r.set(f"{self.prefix}claim:{lot_id}", owner, nx=True, ex=CLAIM_TTL_DAYS * 86400))
+
+    def claim_many(self, lot_ids: Iterable[str], owner: str) -> int:
+        pipe = self.r.pipeline(transaction=False)
+        for lot_id in lot_ids:
+            pipe.set(f"{self.prefix}claim:{lot_id}", owner, nx=True, ex=CLAIM_TTL_DAYS * 86400)
+        return sum(1 for ok in pipe.execute() if ok)
+
+    def unclaim(self, lot_id: str, owner: str):
+        self._release(keys=[f"{self.prefix}claim:{lot_id}"], args=[owner])
+
+    def mark_seeded(self, marker: str, owner: str) -> bool:
+        # tanpa EX: penanda seed tidak pernah kadaluarsa
+        return bool(self.r.set(f"{self.prefix}{marker}", owner, nx=True))
+
+    def purge(self, keep_days: int = CLAIM_TTL_DAYS):
+        # klaim di Redis kadaluarsa sendiri (EX)
+        pass
+
+
+def coordinator_from_env(spec: str = COORDINATOR):
+    """Build the coordinator named by `COORDINATOR`, or None when unset."""
+    spec = (spec or "").strip()
+    if not spec:
+        return None
+    if spec.startswith(("redis://", "rediss://", "unix://")):
+        return RedisCoordinator(spec)
+    if spec.startswith("sqlite:///"):
+        spec = spec[len("sqlite:///"):]
+    return SQLiteCoordinator(spec)
+
+
+# -----------------------------------------
+# LEASES
+# -----------------------------------------
+
+
+class LeaseKeeper(threading.Thread):
+    """Acquire leases on free shards and keep renewing them until `stop()`."""
+
+    def __init__(self, coordinator, targets: List[Target], owner: Optional[str] = None,
+                 ttl: float = LEASE_TTL, max_shards: int = MAX_SHARDS):
+        super().__init__(name="lease-keeper", daemon=True)
+        self.coordinator = coordinator
+        self.targets = targets
+        self.owner = owner or default_worker_id()
+        self.ttl = ttl
+        self.max_shards = max_shards
+        self.held: Dict[str, Target] = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def acquire(self) -> List[Target]:
+        """Try every shard once; returns the targets this worker now owns."""
+        for t in self.targets:
+            if self.max_shards and len(self.held) >= self.max_shards:
+                break
+            try:
+                if self.coordinator.acquire(t.key, self.owner, self.ttl):
+                    with self._lock:
+                        self.held[t.key] = t
+                    logger.info(f"Lease shard {t.key} diambil oleh {self.owner}")
+                else:
+                    logger.info(f"Shard {t.key} sedang dipegang worker lain, lewati")
+            except Exception as e:
+                logger.warning(f"Gagal ambil lease {t.key}: {e}")
+        return self.owned()
+
+    def owned(self) -> List[Target]:
+        with self._lock:
+            return [t for t in self.targets if t.key in self.held]
+
+    def holds(self, target: Target) -> bool:
+        with self._lock:
+            return target.key in self.held
+
+    def run(self):
+        while not self._stop_event.wait(self.ttl / 3):
+            for key in list(self.held):
+                try:
+                    ok = self.coordinator.renew(key, self.owner, self.ttl)
+                except Exception as e:
+                    logger.warning(f"Gagal perpanjang lease {key}: {e}")
+                    continue
+                if not ok:
+                    # kadaluarsa dan diambil worker lain; klaim lot tetap mencegah double-post
+                    logger.warning(f"Lease shard {key} lepas dari {self.owner}")
+                    with self._lock:
+                        self.held.pop(key, None)
+
+    def stop(self):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout=5)
+        for key in list(self.held):
+            try:
+                self.coordinator.release(key, self.owner)
+            except Exception as e:
+                logger.debug(f"Gagal lepas lease {key}: {e}")
+        with self._lock:
+            self.held.clear()
+
+
+def seed_marker(target: Target) -> str:
+    """Marker recording that a shard's existing lots were seeded (not broadcast).
+
+    Passed to `mark_seeded`; unlike lot claims it never expires, otherwise an
+    old shard would look new again after CLAIM_TTL_DAYS and be re-seeded.
+    """
+    return f"seeded:{target.key}"
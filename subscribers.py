@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+subscribers.py - Registry subscriber (chat Telegram) dengan filter per chat
+
+Satu deployment bisa melayani banyak dealer: tiap chat ID punya filter rule
+sendiri (format sama dengan `filters.py`). Semua filter subscriber dikompilasi
+jadi satu `FilterEngine`, sehingga automaton keyword berperan sebagai index
+instansi/kategori/keyword -> subscriber: lot hanya "menyentuh" subscriber yang
+keyword-nya benar-benar muncul, tanpa scan seluruh daftar subscriber.
+
+Format `SUBSCRIBERS_FILE` (JSON):
+
+    [
+        {"chat_id": "-100123", "name": "dealer-solo",
+         "filter": {"instansi": ["kpknl surakarta"], "max_limit": 150000000}},
+        {"chat_id": "-100456", "filter": {"kategori": ["motor"]}}
+    ]
+
+Kalau `SUBSCRIBERS_FILE` tidak diset, registry berisi satu subscriber
+`TELEGRAM_CHAT_ID` tanpa filter (perilaku lama). File yang diset tapi gagal
+di-load menghentikan proses, bukan jatuh ke chat default.
+"""
+
+import os
+import logging
+from typing import Optional, List, Dict, Any
+
+from filters import FilterEngine
+import jsoncodec
+
+logger = logging.getLogger(__name__)
+
+
+class Subscriber:
+    def __init__(self, chat_id: str, name: Optional[str] = None, rule: Optional[Dict[str, Any]] = None):
+        self.chat_id = str(chat_id)
+        self.name = name or self.chat_id
+        self.rule = dict(rule or {})
+
+    def __repr__(self) -> str:
+        return f"Subscriber({self.name!r}, chat_id={self.chat_id!r})"
+
+
+class SubscriberRegistry:
+    """Subscribers plus one compiled FilterEngine over all their filters."""
+
+    def __init__(self, subscribers: List[Subscriber]):
+        # dedupe by chat_id, subscriber terakhir menang
+        by_chat: Dict[str, Subscriber] = {}
+        for sub in subscribers:
+            by_chat[sub.chat_id] = sub
+        self.subscribers: List[Subscriber] = list(by_chat.values())
+        rules = []
+        for sub in self.subscribers:
+            rule = dict(sub.rule)
+            rule["name"] = sub.chat_id
+            rules.append(rule)
+        self._engine = FilterEngine(rules)
+
+    def __len__(self) -> int:
+        return len(self.subscribers)
+
+    def match(self, lot: Dict[str, Any], detail: Optional[Dict[str, Any]] = None) -> List[Subscriber]:
+        """Return the subscribers whose filter matches this lot, in registry order."""
+        return [self.subscribers[i] for i in self._engine.match_ids(lot, detail)]
+
+    def chat_ids(self, lot: Dict[str, Any], detail: Optional[Dict[str, Any]] = None) -> List[str]:
+        return [s.chat_id for s in self.match(lot, detail)]
+
+    def candidate_chat_ids(self, lot: Dict[str, Any]) -> List[str]:
+        """Chats that may match this list item once its detail is known; empty = skip the detail fetch."""
+        return [self.subscribers[i].chat_id for i in self._engine.candidate_ids(lot)]
+
+    def detail_may_add(self, lot: Dict[str, Any]) -> bool:
+        """True if the detail could match chats that the list item alone does not."""
+        return len(self._engine.candidate_ids(lot)) > len(self._engine.match_ids(lot, None))
+
+
+def load_subscribers(path: str) -> List[Subscriber]:
+    with open(path, "rb") as f:
+        data = jsoncodec.load(f)
+    if isinstance(data, dict):
+        data = data.get("subscribers", [])
+    subs = []
+    for entry in data or []:
+        if not isinstance(entry, dict) or not entry.get("chat_id"):
+            continue
+        subs.append(Subscriber(entry["chat_id"], entry.get("name"), entry.get("filter")))
+    return subs
+
+
+def registry_from_env(default_chat_id: Optional[str] = None) -> SubscriberRegistry:
+    """Registry from `SUBSCRIBERS_FILE` if set, else a single unfiltered chat.
+
+    A `SUBSCRIBERS_FILE` that cannot be loaded raises instead of falling back:
+    the fallback chat has no filter, so a typo would send every lot there and
+    nothing to the real subscribers.
+    """
+    path = os.getenv("SUBSCRIBERS_FILE")
+    if path:
+        try:
+            subs = load_subscribers(path)
+        except Exception as e:
+            logger.error(f"Gagal load {path}: {e}")
+            raise RuntimeError(f"SUBSCRIBERS_FILE {path} tidak bisa di-load: {e}") from e
+        logger.info(f"Loaded {len(subs)} subscriber dari {path}")
+        return SubscriberRegistry(subs)
+    subs = [Subscriber(default_chat_id)] if default_chat_id else []
+    return SubscriberRegistry(subs)
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+test_commands.py - LotView inkremental dan chat yang boleh memakai command
+
+    python -m pytest -q test_commands.py
+"""
+
+import time
+
+import commands
+import jsoncodec
+from commands import LotView, CommandHandler
+
+LOT = {"lotLelangId": "1", "namaUnitKerja": "KPKNL Surakarta", "namaKategori": "Mobil",
+       "nilaiLimit": 100000000, "tglSelesaiLelang": "2030-01-01T10:00:00", "namaLotLelang": "Avanza"}
+
+
+def test_changed_lot_is_reindexed():
+    view = LotView()
+    view.update([LOT])
+    # waktu selesai, kota dan harga sama; instansi dan kategori berubah
+    moved = dict(LOT, namaUnitKerja="KPKNL Semarang", namaKategori="Motor")
+    view.update([moved])
+    assert view.lots["1"] is moved
+    assert view.by_instansi == {"KPKNL Semarang": 1}
+    assert view.by_kategori == {"Motor": 1}
+    assert view.ending(time.time() + 10 * 365 * 86400) == [moved]
+
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, updates):
+        self.content = jsoncodec.dumps({"result": updates})
+
+
+def poll(monkeypatch, allowed_chats, chat_ids):
+    updates = [{"update_id": i, "message": {"text": "/stats", "chat": {"id": c}, "date": time.time()}}
+               for i, c in enumerate(chat_ids)]
+    monkeypatch.setattr(commands.retry, "get", lambda *a, **k: FakeResponse(updates))
+    sent = []
+    handler = CommandHandler("token", LotView(), lambda text, chat_id: sent.append(chat_id), allowed_chats)
+    handler.poll(timeout=0)
+    return sent
+
+
+def test_only_subscriber_chats_answered(monkeypatch):
+    assert poll(monkeypatch, ["-100123"], [-100123, 555]) == ["-100123"]
+    # registry kosong: tidak ada yang dijawab, bukan semua
+    assert poll(monkeypatch, [], [-100123, 555]) == []
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+test_dedupe.py - MinHash + LSH: lot ulang, nomor rangka / nopol, threshold
+
+    python -m pytest -q test_dedupe.py
+"""
+
+import importlib
+
+import dedupe
+from dedupe import DedupeIndex
+
+TITLE = "Satu unit mobil Toyota Avanza 1.3 G MT warna hitam AD 1234 XY tahun 2015"
+
+
+def lot(lot_id, title=TITLE):
+    return {"lotLelangId": lot_id, "namaLotLelang": title}
+
+
+def detail(rangka=None, nopol=None, nama="Toyota Avanza"):
+    return {"content": {"barangs": [{"nama": nama, "nomorRangka": rangka, "nopol": nopol}]}}
+
+
+def test_default_mode_is_off(monkeypatch):
+    monkeypatch.delenv("DEDUPE_MODE", raising=False)
+    try:
+        assert importlib.reload(dedupe).DEDUPE_MODE == "off"
+        assert dedupe.index_from_env() is None
+    finally:
+        importlib.reload(dedupe)
+
+
+def test_relisted_title_matches():
+    index = DedupeIndex(None)
+    index.observe(lot("a"))
+    match = index.lookup(lot("b", TITLE + " (lelang ulang)"))
+    assert match is not None and match.lot_id == "a" and match.reason == "judul mirip"
+    assert index.lookup(lot("c", "Sebidang tanah dan bangunan SHM 123 di Sukoharjo")) is None
+
+
+def test_identifier_match_despite_different_title():
+    index = DedupeIndex(None)
+    index.observe(lot("a"), detail(rangka="MHKM1BA3JFK012345"))
+    match = index.lookup(lot("b", "Sepeda motor Honda Beat"), detail(rangka="mhkm1ba3-jfk012345"))
+    assert match is not None and match.lot_id == "a" and match.reason == "nomor rangka"
+    assert match.score == 1.0
+
+    index.observe(lot("c", "Truk Mitsubishi Colt Diesel"), detail(nopol="AD 8765 ZZ"))
+    match = index.lookup(lot("d", "Bus Isuzu Elf"), detail(nopol="ad-8765-zz"))
+    assert match is not None and match.lot_id == "c" and match.reason == "nopol"
+
+
+def test_identifier_mismatch_vetoes_similar_title():
+    index = DedupeIndex(None)
+    index.observe(lot("a"), detail(rangka="MHKM1BA3JFK012345", nopol="AD 1234 XY"))
+    # judul + barang identik, tapi nomor rangka / nopol lain: barang berbeda
+    assert index.lookup(lot("b"), detail(rangka="MHKM1BA3JFK099999")) is None
+    assert index.lookup(lot("c"), detail(nopol="AD 5678 AB")) is None
+    # tanpa nomor di detail baru: tetap dicocokkan lewat judul
+    assert index.lookup(lot("d"), detail()) is not None
+
+
+def test_threshold():
+    relist = lot("b", TITLE + " (lelang ulang)")
+    score = DedupeIndex(None, threshold=0.0)
+    score.observe(lot("a"))
+    estimate = score.lookup(relist).score
+    assert 0.0 < estimate < 1.0
+
+    at = DedupeIndex(None, threshold=estimate)
+    at.observe(lot("a"))
+    assert at.lookup(relist) is not None
+
+    above = DedupeIndex(None, threshold=min(1.0, estimate + 0.01))
+    above.observe(lot("a"))
+    assert above.lookup(relist) is None
+    # lot identik selalu lolos threshold berapa pun
+    assert above.lookup(lot("b")) is not None
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+test_digest.py - Ringkasan lot per chat (mode digest)
+
+    python -m pytest -q test_digest.py
+"""
+
+import json
+
+import pytest
+
+import app
+from delivery_queue import DeliveryQueue
+from subscribers import Subscriber, SubscriberRegistry
+
+LOTS = [
+    {"lotLelangId": "lot-1", "namaLotLelang": "Toyota Avanza", "namaUnitKerja": "KPKNL Surakarta", "namaKategori": "Mobil"},
+    {"lotLelangId": "lot-2", "namaLotLelang": "Honda Jazz", "namaUnitKerja": "KPKNL Surakarta", "namaKategori": "Mobil"},
+    {"lotLelangId": "lot-3", "namaLotLelang": "Honda Beat", "namaUnitKerja": "KPKNL Semarang", "namaKategori": "Motor"},
+]
+
+
+@pytest.fixture
+def outbox(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "DIGEST_ALBUM_SIZE", 0)
+    monkeypatch.setattr(app, "SUBSCRIBERS", SubscriberRegistry([
+        Subscriber("-100", rule={"kategori": ["mobil"]}),
+        Subscriber("-200"),
+    ]))
+    return DeliveryQueue(str(tmp_path / "outbox.sqlite3"))
+
+
+def texts(outbox, chat_id):
+    return [m["text"] for m in outbox.due() if m["chat_id"] == chat_id]
+
+
+def test_header_counts_lots_of_each_chat(outbox):
+    app.enqueue_digest(None, LOTS, outbox)
+    assert texts(outbox, "-100")[0].startswith("📢 <b>2 lot lelang baru</b>")
+    assert texts(outbox, "-200")[0].startswith("📢 <b>3 lot lelang baru</b>")
+
+
+def test_detail_only_match_left_for_pipeline(outbox, monkeypatch):
+    monkeypatch.setattr(app, "SUBSCRIBERS", SubscriberRegistry([
+        Subscriber("-100", rule={"kategori": ["mobil"]}),
+        Subscriber("-300", rule={"instansi": ["kpknl semarang"], "keywords": ["innova"]}),
+    ]))
+    # lot-3 (Semarang) hanya bisa cocok -300 lewat barangs di detail
+    handled = app.enqueue_digest(None, LOTS, outbox)
+    assert "lot-3" not in handled
+    assert texts(outbox, "-300") == []
+
+
+def test_digest_burst_sends_detail_matches_per_lot(tmp_path, monkeypatch):
+    seen_file = tmp_path / "seen_api.json"
+    seen_file.write_text("[]")
+    monkeypatch.setattr(app, "SEEN_FILE", str(seen_file))
+    monkeypatch.setattr(app, "QUEUE_FILE", str(tmp_path / "outbox.sqlite3"))
+    monkeypatch.setattr(app, "ARCHIVE_FILE", "")
+    monkeypatch.setattr(app, "REMINDER_OFFSETS", [])
+    monkeypatch.setattr(app, "DEDUPE", None)
+    monkeypatch.setattr(app, "FRESHNESS", None)
+    monkeypatch.setattr(app, "DIGEST_ALBUM_SIZE", 0)
+    monkeypatch.setattr(app, "use_digest", lambda n: True)
+    monkeypatch.setattr(app, "coordinator_from_env", lambda: None)
+    monkeypatch.setattr(app, "fetch_list", lambda session, url: [dict(lot) for lot in LOTS])
+    monkeypatch.setattr(app, "SUBSCRIBERS", SubscriberRegistry([
+        Subscriber("-100", rule={"kategori": ["mobil"]}),
+        Subscriber("-300", rule={"instansi": ["kpknl semarang"], "keywords": ["innova"]}),
+    ]))
+    prepared = []
+    monkeypatch.setattr(app, "prepare_lot", lambda session, lot, archive=None, planner=None:
+                        prepared.append(lot["lotLelangId"]) or {"lot_id": lot["lotLelangId"]})
+    monkeypatch.setattr(app, "attach_media", lambda session, job, outbox: job)
+    monkeypatch.setattr(app, "enqueue_lot", lambda job, outbox, reminders=None: True)
+    monkeypatch.setattr(app.sys, "argv", ["app.py", "--fetch-only"])
+    monkeypatch.setenv("FETCH_PLAN_FILE", str(tmp_path / "fetch_plan.json"))
+
+    app.main()
+
+    assert prepared == ["lot-3"]
+    assert sorted(json.loads(seen_file.read_text())) == ["lot-1", "lot-2", "lot-3"]
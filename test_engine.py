@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+test_engine.py - Engine asyncio (engine.py) terhadap server fixture aiohttp lokal
+
+Server fixture melayani katalog dan Bot API Telegram palsu di event loop yang
+sama dengan engine. Jalankan dengan:
+
+    python -m pytest -q test_engine.py
+"""
+
+import json
+import asyncio
+
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web  # noqa: E402
+
+import engine  # noqa: E402
+
+
+class FixtureServer:
+    """Katalog `/list` + Bot API palsu; mencatat teks tiap sendMessage di `sent`."""
+
+    def __init__(self, lots):
+        self.lots = lots
+        self.sent = []
+        # teks yang dibalas 400 oleh Bot API palsu
+        self.reject = set()
+        self.on_send = None
+        self.url = ""
+
+    async def list_handler(self, request):
+        return web.json_response({"data": self.lots})
+
+    async def send_message(self, request):
+        form = await request.post()
+        if self.on_send:
+            self.on_send(form["text"])
+        if form["text"] in self.reject:
+            return web.json_response({"ok": False, "description": "Bad Request"}, status=400)
+        self.sent.append(form["text"])
+        return web.json_response({"ok": True, "result": {"message_id": len(self.sent)}})
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_get("/list", self.list_handler)
+        app.router.add_post("/bot{token}/sendMessage", self.send_message)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.runner.cleanup()
+
+
+class FakeProfile(engine.Profile):
+    """Lot `{"id": ...}` jadi satu pesan teks; lama prepare per lot bisa diatur.
+
+    `held` berisi lot yang sudah mulai diproses tapi belum sampai ke Bot API,
+    `peak` jumlah terbesarnya selama run.
+    """
+
+    name = "test"
+    seed_first_run = True
+
+    def __init__(self, server, seen_file, delays=None):
+        super().__init__()
+        self.list_url = f"{server.url}/list"
+        self.token = "T"
+        self.chat_id = "-100"
+        self.seen_file = str(seen_file)
+        self.delays = delays or {}
+        self.held = set()
+        self.peak = 0
+        server.on_send = self.held.discard
+
+    async def prepare(self, http, lot):
+        self.held.add(lot["id"])
+        self.peak = max(self.peak, len(self.held))
+        await asyncio.sleep(self.delays.get(lot["id"], 0))
+        return [{"chat_id": self.chat_id, "kind": "text", "text": lot["id"], "lot_id": lot["id"]}]
+
+
+@pytest.fixture
+def telegram_api(monkeypatch):
+    def point_at(server):
+        monkeypatch.setattr(engine, "TELEGRAM_API", server.url)
+    return point_at
+
+
+def run_engine(lots, tmp_path, telegram_api, seen=(), concurrency=engine.ENGINE_CONCURRENCY,
+               delays=None, reject=(), mark_failed_seen=False):
+    """One engine.run_once against a fresh fixture server; returns (server, profile, sent count).
+
+    `seen=None` runs without a seen file (first run).
+    """
+    seen_file = tmp_path / "seen.json"
+    if seen is not None:
+        seen_file.write_text(json.dumps(list(seen)))
+
+    async def go():
+        async with FixtureServer(lots) as server:
+            telegram_api(server)
+            server.reject = set(reject)
+            profile = FakeProfile(server, seen_file, delays)
+            profile.mark_failed_seen = mark_failed_seen
+            async with engine.AsyncHTTP(profile.user_agent) as http:
+                n = await engine.run_once(http, profile, concurrency)
+            return server, profile, n
+
+    return asyncio.run(go())
+
+
+def test_in_flight_bound_holds_until_delivered(tmp_path, telegram_api):
+    lots = [{"id": f"lot-{i}"} for i in range(30)]
+    # lot awal paling lambat: tanpa batas, lot lain selesai lalu menunggu giliran kirim
+    delays = {lot["id"]: 0.01 * (30 - i) for i, lot in enumerate(lots)}
+    server, profile, n = run_engine(lots, tmp_path, telegram_api, concurrency=4, delays=delays)
+    assert n == 30
+    assert profile.peak <= 4
+
+
+def test_core_profile_has_own_seen_file():
+    profile = engine.CoreProfile()
+    assert profile.seed_first_run
+    assert profile.seen_file != engine.AppProfile().seen_file
+
+
+def test_delivery_follows_list_order(tmp_path, telegram_api):
+    lots = [{"id": f"lot-{i}"} for i in range(10)]
+    # persiapan selesai terbalik: lot terakhir duluan
+    delays = {lot["id"]: 0.02 * (10 - i) for i, lot in enumerate(lots)}
+    server, _, n = run_engine(lots, tmp_path, telegram_api, seen=["lot-4"], delays=delays)
+    assert n == 9
+    assert server.sent == [lot["id"] for lot in lots if lot["id"] != "lot-4"]
+    assert sorted(json.loads((tmp_path / "seen.json").read_text())) == sorted(lot["id"] for lot in lots)
+
+
+@pytest.mark.parametrize("mark_failed_seen", [False, True])
+def test_failed_lot_seen_only_with_mark_failed_seen(tmp_path, telegram_api, mark_failed_seen):
+    lots = [{"id": "lot-1"}, {"id": "lot-2"}]
+    server, _, n = run_engine(lots, tmp_path, telegram_api, reject=["lot-1"], mark_failed_seen=mark_failed_seen)
+    assert n == 1
+    assert server.sent == ["lot-2"]
+    seen = set(json.loads((tmp_path / "seen.json").read_text()))
+    assert seen == ({"lot-1", "lot-2"} if mark_failed_seen else {"lot-2"})
+
+
+def test_first_run_seeds_without_sending(tmp_path, telegram_api):
+    lots = [{"id": f"lot-{i}"} for i in range(3)]
+    server, _, n = run_engine(lots, tmp_path, telegram_api, seen=None)
+    assert n == 0
+    assert server.sent == []
+    assert sorted(json.loads((tmp_path / "seen.json").read_text())) == ["lot-0", "lot-1", "lot-2"]
+
+    # run berikutnya hanya mengirim lot yang benar-benar baru
+    lots.append({"id": "lot-3"})
+    server, _, n = run_engine(lots, tmp_path, telegram_api, seen=None)
+    assert server.sent == ["lot-3"]
+
+
+def test_check_unsharded():
+    engine.check_unsharded("")
+    with pytest.raises(SystemExit, match="COORDINATOR"):
+        engine.check_unsharded("redis://localhost:6379/0")
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+test_filters.py - Konfigurasi rule filter
+
+    python -m pytest -q test_filters.py
+"""
+
+import pytest
+
+from filters import FilterEngine, rules_from_env
+from subscribers import registry_from_env
+
+
+def test_broken_rules_file_fails_closed(tmp_path, monkeypatch):
+    path = tmp_path / "rules.json"
+    path.write_text('[{"name": "avanza", "keywords": ["avanza"]')  # JSON terpotong
+    monkeypatch.setenv("FILTER_RULES_FILE", str(path))
+    with pytest.raises(RuntimeError):
+        rules_from_env("KPKNL Surakarta")
+
+
+def test_broken_subscribers_file_fails_closed(tmp_path, monkeypatch):
+    path = tmp_path / "subscribers.json"
+    path.write_text('[{"chat_id": "-100123", "filter": {"kategori": ["mobil"]}')  # JSON terpotong
+    monkeypatch.setenv("SUBSCRIBERS_FILE", str(path))
+    # jangan jatuh ke TELEGRAM_CHAT_ID tanpa filter
+    with pytest.raises(RuntimeError):
+        registry_from_env("1")
+    monkeypatch.setenv("SUBSCRIBERS_FILE", str(tmp_path / "tidak-ada.json"))
+    with pytest.raises(RuntimeError):
+        registry_from_env("1")
+
+
+def test_missing_rules_file_fails_closed(tmp_path, monkeypatch):
+    monkeypatch.setenv("FILTER_RULES_FILE", str(tmp_path / "tidak-ada.json"))
+    with pytest.raises(RuntimeError):
+        rules_from_env()
+
+
+def test_default_instansi_rule(monkeypatch):
+    monkeypatch.delenv("FILTER_RULES_FILE", raising=False)
+    engine = FilterEngine(rules_from_env("KPKNL Surakarta"))
+    assert engine.matches({"namaUnitKerja": "KPKNL Surakarta"})
+    assert not engine.matches({"namaUnitKerja": "KPKNL Semarang"})
+
+
+RULES = [
+    {"name": "solo-mobil", "instansi": ["kpknl surakarta"], "kategori": ["mobil"]},
+    {"name": "avanza", "keywords": ["avanza"], "max_limit": 150000000},
+    {"name": "sukoharjo", "kota": ["sukoharjo"]},
+]
+DETAIL = {"content": {"barangs": [{"nama": "Toyota Avanza"}], "seller": {"namaKota": "Sukoharjo"}}}
+
+
+def test_candidates_cover_detail_matches():
+    engine = FilterEngine(RULES)
+    lot = {"namaLotLelang": "Satu unit kendaraan", "namaUnitKerja": "KPKNL Semarang",
+           "namaKategori": "Motor", "nilaiLimit": 90000000}
+    # keyword barangs dan kota seller baru kelihatan di detail
+    assert engine.match(lot) == []
+    assert engine.match(lot, DETAIL) == ["avanza", "sukoharjo"]
+    assert set(engine.candidate_ids(lot)) >= set(engine.match_ids(lot, DETAIL))
+
+
+def test_candidates_exclude_list_only_mismatch():
+    engine = FilterEngine(RULES[:2])
+    # instansi/kategori salah, harga di atas max_limit: detail tidak bisa mengubahnya
+    lot = {"namaLotLelang": "Toyota Avanza", "namaUnitKerja": "KPKNL Semarang",
+           "namaKategori": "Mobil", "nilaiLimit": 300000000}
+    assert engine.candidate_ids(lot) == []
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+test_freshness.py - Kapan lot dianggap "delivered"
+
+    python -m pytest -q test_freshness.py
+"""
+
+import app
+from delivery_queue import DeliveryQueue, drain
+from freshness import FreshnessTracker
+
+
+def delivered(tracker, lot_id):
+    return tracker._conn().execute("SELECT delivered FROM freshness WHERE lot_id = ?", (lot_id,)).fetchone()[0]
+
+
+def test_only_lot_and_digest_messages_mark_delivered(tmp_path, monkeypatch):
+    tracker = FreshnessTracker(str(tmp_path / "freshness.sqlite3"))
+    tracker.observe({"lotLelangId": i} for i in ("lot-1", "lot-2", "lot-3", "lot-4"))
+    monkeypatch.setattr(app, "FRESHNESS", tracker)
+    monkeypatch.setattr(app, "deliver_message", lambda msg, media: True)
+
+    outbox = DeliveryQueue(str(tmp_path / "outbox.sqlite3"))
+    outbox.enqueue(app.lot_idem_key("lot-1", "-100"), "-100", "lot", lot_id="lot-1")
+    outbox.enqueue("digest:abc:1:chat:-100", "-100", "digest", lot_ids=["lot-2", "lot-3"])
+    # pengingat membawa lot_id, tapi bukan pengiriman pertama lot-nya
+    outbox.enqueue("remind:lot-4:15:0:chat:-100", "-100", "pengingat", lot_id="lot-4")
+    assert drain(outbox, app.deliver_and_track) == 3
+    tracker.flush()
+
+    assert all(delivered(tracker, i) is not None for i in ("lot-1", "lot-2", "lot-3"))
+    assert delivered(tracker, "lot-4") is None
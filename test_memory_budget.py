@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+test_memory_budget.py - Regression test peak RSS untuk satu run app.main
+
+Menjalankan `app.main()` di subprocess terhadap server fixture lokal (katalog
+10k lot, detail, foto besar, dan Bot API Telegram palsu), lalu gagal kalau
+peak RSS proses itu melewati target. Jalankan dengan:
+
+    python -m pytest -q test_memory_budget.py
+
+Env:
+    PEAK_RSS_TARGET_MB  target peak RSS run dengan budget (default = budget, 128)
+    FIXTURE_LOTS        jumlah lot di katalog (default 10000)
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from memory_budget import ByteBudget, MemoryBudget, MB
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_LOTS = int(os.getenv("FIXTURE_LOTS", "10000"))
+NEW_LOTS = 150
+PHOTO_BYTES = 3 * MB
+BUDGET_MB = 128
+PEAK_RSS_TARGET_MB = float(os.getenv("PEAK_RSS_TARGET_MB", str(BUDGET_MB)))
+
+pytestmark = pytest.mark.skipif(sys.platform != "linux", reason="peak RSS diukur lewat getrusage Linux")
+
+
+def fixture_lot(i: int) -> dict:
+    return {
+        "lotLelangId": f"lot-{i:06d}",
+        "namaLotLelang": f"Satu unit mobil Toyota Avanza tahun {2005 + i % 18} No. Pol AD {1000 + i} XY",
+        "namaUnitKerja": "KPKNL Surakarta",
+        "unitKerjaId": f"unit-{i % 40}",
+        "namaLokasi": "Kota Surakarta",
+        "nilaiLimit": 50_000_000 + i,
+        "tglMulaiLelang": "2024-05-01T09:00:00+07:00",
+        "tglSelesaiLelang": "2031-05-14T10:00:00+07:00",
+        "photos": [{"file": {"fileUrl": f"/photo/{i}-{k}.jpg"}} for k in range(3)],
+    }
+
+
+def fixture_detail(lot_id: str) -> dict:
+    i = int(lot_id.rsplit("-", 1)[1])
+    data = fixture_lot(i)
+    data.update({
+        "caraPenawaran": "TERTUTUP_CLOSED_BIDDING",
+        "uangJaminan": 10_000_000,
+        "views": i,
+        "content": {
+            "seller": {"namaOrganisasiPenjual": "PT Bank Contoh Tbk"},
+            "organizer": {"namaUnitKerja": "KPKNL Surakarta", "namaBank": "BRI"},
+            "barangs": [{"nama": f"Mobil {k}", "tahun": 2015, "nopol": f"AD {k} ZZ",
+                         "uraian": "Kondisi apa adanya, dokumen lengkap. " * 5} for k in range(3)],
+        },
+    })
+    return {"data": data}
+
+
+class FixtureServer:
+    """Katalog + detail + foto + Bot API palsu di satu ThreadingHTTPServer."""
+
+    def __init__(self, n_lots: int):
+        self.catalog = json.dumps({"data": [fixture_lot(i) for i in range(n_lots)]}).encode()
+        self.photo = b"\xff\xd8\xff\xe0" + os.urandom(PHOTO_BYTES - 4)
+        self.sent = []
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def reply(self, body: bytes, ctype: str = "application/json", status: int = 200):
+                self.send_response(status)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.startswith("/list"):
+                    self.reply(server.catalog)
+                elif self.path.startswith("/detail/"):
+                    self.reply(json.dumps(fixture_detail(self.path.rsplit("/", 1)[1])).encode())
+                elif self.path.startswith("/photo/"):
+                    self.reply(server.photo, "image/jpeg")
+                else:
+                    self.reply(b"<html></html>", "text/html")
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                remaining = length
+                while remaining:
+                    remaining -= len(self.rfile.read(min(remaining, 1 << 20)))
+                method = self.path.rsplit("/", 1)[1]
+                with server.lock:
+                    server.sent.append((method, length))
+                    n = len(server.sent)
+                self.reply(json.dumps({"ok": True, "result": {"message_id": n, "photo": [{"file_id": f"F{n}"}]}}).encode())
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        # app memutus download foto yang kebesaran di tengah jalan; bukan error fixture
+        self.httpd.handle_error = lambda request, client_address: None
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture(scope="module")
+def server():
+    srv = FixtureServer(FIXTURE_LOTS)
+    yield srv
+    srv.close()
+
+
+def run_app(server: FixtureServer, workdir, **env_extra) -> float:
+    """Run app.main() in a fresh interpreter; returns its peak RSS in MB."""
+    # semua lot kecuali NEW_LOTS terakhir sudah pernah dikirim
+    with open(os.path.join(workdir, "seen_api.json"), "w") as f:
+        json.dump([f"lot-{i:06d}" for i in range(FIXTURE_LOTS - NEW_LOTS)], f)
+    # semua state run (termasuk freshness/dedupe) di workdir, bukan di root repo
+    env = {k: v for k, v in os.environ.items() if k != "COORDINATOR"}
+    env.update({
+        "API_URL": f"{server.url}/list",
+        "DETAIL_URL": f"{server.url}/detail/{{}}",
+        "BASE_PHOTO_URL": server.url,
+        "SITE_URL": server.url,
+        "TELEGRAM_API": server.url,
+        "TELEGRAM_TOKEN": "test",
+        "TELEGRAM_CHAT_ID": "1",
+        "SEEN_FILE": os.path.join(workdir, "seen_api.json"),
+        "DELIVERY_QUEUE_FILE": os.path.join(workdir, "outbox.sqlite3"),
+        "ARCHIVE_FILE": os.path.join(workdir, "archive.sqlite3"),
+        "DEDUPE_FILE": os.path.join(workdir, "dedupe.sqlite3"),
+        "DEDUPE_MODE": "off",
+        "FRESHNESS_FILE": os.path.join(workdir, "freshness.sqlite3"),
+        "FETCH_PLAN_FILE": os.path.join(workdir, "fetch_plan.json"),
+        "REMINDERS_FILE": os.path.join(workdir, "reminders.json"),
+        "SEEN_FILTER_FILE": os.path.join(workdir, "seen_api.json.bloom"),
+        "DELIVERY_SEND_INTERVAL": "0",
+        "DIGEST_THRESHOLD": "0",
+        "POLITE_HOSTS": "",
+        "UPSTREAM_RPM": "0",
+    })
+    env.update({k: str(v) for k, v in env_extra.items()})
+    code = "import app, memory_budget; app.main(); print('PEAK_RSS_MB', memory_budget.peak_rss_mb())"
+    proc = subprocess.run([sys.executable, "-c", code], cwd=REPO, env=env, capture_output=True, text=True, timeout=600)
+    assert proc.returncode == 0, proc.stderr[-4000:]
+    line = [l for l in proc.stdout.splitlines() if l.startswith("PEAK_RSS_MB")][-1]
+    return float(line.split()[1])
+
+
+@pytest.mark.parametrize("photo_env", [
+    {},
+    # banyak foto paralel: tanpa budget peak RSS run ini sekitar 2x target
+    {"MAX_PHOTOS_UPLOAD": 3, "PHOTO_STAGE_WORKERS": 4, "PHOTO_DOWNLOAD_WORKERS": 4},
+], ids=["default", "parallel-photos"])
+def test_peak_rss_within_budget(server, tmp_path, photo_env):
+    server.sent.clear()
+    start = time.time()
+    peak = run_app(server, str(tmp_path), MEMORY_BUDGET_MB=BUDGET_MB, **photo_env)
+    photos = [s for s in server.sent if s[0] == "sendPhoto"]
+    # semua lot baru benar-benar terkirim (bukan lolos karena tidak ada yang diproses)
+    assert any(length > PHOTO_BYTES for _, length in photos)
+    assert len(photos) >= NEW_LOTS
+    assert peak <= PEAK_RSS_TARGET_MB, (
+        f"peak RSS {peak:.1f} MB > target {PEAK_RSS_TARGET_MB} MB "
+        f"({len(server.sent)} panggilan Telegram, {time.time() - start:.1f}s)")
+
+
+def test_oversized_photo_not_downloaded(server, tmp_path):
+    server.sent.clear()
+    run_app(server, str(tmp_path), MEMORY_BUDGET_MB=BUDGET_MB, MAX_PHOTO_MB=1)
+    photos = [s for s in server.sent if s[0] == "sendPhoto"]
+    # foto 3 MB > MAX_PHOTO_MB: dikirim lewat URL, tidak ada upload binary
+    assert photos and all(length < PHOTO_BYTES for _, length in photos)
+
+
+def test_byte_budget_backpressure():
+    budget = ByteBudget(10)
+    budget.acquire(6)
+    got = threading.Event()
+
+    def second():
+        budget.acquire(6)
+        got.set()
+
+    t = threading.Thread(target=second, daemon=True)
+    t.start()
+    assert not got.wait(0.2)
+    budget.release(6)
+    assert got.wait(2)
+    assert budget.used == 6 and budget.waits == 1
+
+
+def test_photo_hold_fits_budget():
+    mb = MemoryBudget(budget_mb=16, max_in_flight=0, photo_mb=0, max_photo_mb=10)
+    assert mb.in_flight >= 2
+    # dua foto 10 MB > budget foto 4 MB: dipotong ke budget supaya tetap bisa jalan
+    hold = mb.photo_hold(2)
+    assert hold.n == mb.photos.limit
+    assert MemoryBudget(budget_mb=0).photo_hold(2).budget is None
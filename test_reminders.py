@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+test_reminders.py - Pengingat lelang selesai dengan app.py sebagai cron 30 menit
+
+    python -m pytest -q test_reminders.py
+"""
+
+from collections import Counter
+
+from reminders import ReminderScheduler
+
+CRON = 1800
+T0 = 1_700_000_000.0
+
+
+def test_thirty_minute_cron_sends_every_offset(tmp_path):
+    sched = ReminderScheduler(str(tmp_path / "reminders.json"), offsets=[120, 15], run_interval=CRON)
+    # lot yang selesai tersebar tiap menit selama 6 jam setelah diumumkan
+    for i in range(360):
+        sched.track(f"lot-{i}", T0 + 3 * 3600 + i * 60, f"lot {i}", "", ["-100"])
+    fired = Counter()
+    for run in range(1, 24):
+        # due() dipanggil di akhir run, beberapa detik setelah cron mulai
+        for lot_id, off, _ in sched.due(T0 + run * CRON + 45):
+            fired[off] += 1
+    assert fired == {120: 360, 15: 360}
+
+
+def test_offsets_within_one_run_send_nearest(tmp_path):
+    sched = ReminderScheduler(str(tmp_path / "reminders.json"), offsets=[120, 15, 5], run_interval=CRON)
+    end = T0 + 20 * 60
+    sched.track("lot-1", end, "lot 1", "", ["-100"])
+    # run terakhir sebelum selesai: 15 dan 5 menit jatuh di run yang sama, cukup satu
+    assert [off for _, off, _ in sched.due(T0)] == [5]
+    assert sched.due(T0 + CRON) == []
+
+
+def test_long_outage_drops_stale_reminder(tmp_path):
+    sched = ReminderScheduler(str(tmp_path / "reminders.json"), offsets=[120, 15], run_interval=CRON)
+    end = T0 + 4 * 3600
+    sched.track("lot-1", end, "lot 1", "", ["-100"])
+    # bot mati: run berikutnya baru 50 menit sebelum selesai -> "2 jam" menyesatkan
+    assert sched.due(end - 50 * 60) == []
+    assert [off for _, off, _ in sched.due(end - 10 * 60)] == [15]
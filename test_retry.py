@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+test_retry.py - Circuit breaker retry.request
+
+    python -m pytest -q test_retry.py
+"""
+
+import time
+
+import pytest
+
+import retry
+from retry import CircuitOpenError, RetryPolicy
+
+# 403 ikut di-retry seperti PHOTO_POLICY, tanpa jeda backoff
+POLICY = RetryPolicy(attempts=2, base=0, cap=0, statuses=retry.RETRY_STATUSES + (403,))
+
+
+class FakeResponse:
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+        self.headers = {}
+        self.closed = False
+
+    def json(self):
+        return {}
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSession:
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        return FakeResponse(self.statuses.pop(0) if self.statuses else 200)
+
+
+def open_breaker(host: str) -> retry.CircuitBreaker:
+    br = retry.breaker_for(host)
+    for _ in range(br.max_failures):
+        br.record_failure()
+    assert br.state == "open"
+    # jeda reset sudah lewat: berikutnya satu request probe (half-open)
+    br.opened_at = time.monotonic() - br.reset_after
+    assert br.state == "half-open"
+    return br
+
+
+def test_half_open_probe_with_403_closes_probe():
+    host = "photo-403.test"
+    br = open_breaker(host)
+    resp = retry.request(FakeSession([403, 403]), "GET", f"http://{host}/a.jpg", POLICY)
+    assert resp.status_code == 403
+    assert br.state == "closed" and not br._probing
+    # host tidak dianggap down: request berikutnya tetap jalan
+    assert retry.request(FakeSession([200]), "GET", f"http://{host}/b.jpg", POLICY).status_code == 200
+
+
+def test_half_open_probe_with_5xx_reopens():
+    host = "photo-503.test"
+    br = open_breaker(host)
+    session = FakeSession([503])
+    with pytest.raises(CircuitOpenError):
+        retry.request(session, "GET", f"http://{host}/a.jpg", POLICY)
+    assert session.calls == 1
+    assert br.state == "open" and not br._probing
+
+
+def test_streamed_body_holds_aimd_slot_until_closed(monkeypatch):
+    host = "polite-stream.test"
+    monkeypatch.setattr(retry, "POLITE_HOSTS", (host,))
+    monkeypatch.setattr(retry, "BUDGET", retry.TokenBucket(0))
+    limiter = retry.limiter_for(host)
+    resp = retry.request(FakeSession([200]), "GET", f"http://{host}/a.jpg", POLICY, stream=True)
+    # body belum dibaca: transfer masih dihitung in-flight
+    assert limiter.inflight == 1
+    resp.close()
+    resp.close()
+    assert limiter.inflight == 0 and resp.closed
+
+
+def test_unstreamed_and_retried_responses_release_slot(monkeypatch):
+    host = "polite-plain.test"
+    monkeypatch.setattr(retry, "POLITE_HOSTS", (host,))
+    monkeypatch.setattr(retry, "BUDGET", retry.TokenBucket(0))
+    limiter = retry.limiter_for(host)
+    assert retry.request(FakeSession([200]), "GET", f"http://{host}/a", POLICY).status_code == 200
+    assert limiter.inflight == 0
+    # 403 di-retry lalu 200: response yang dibuang ikut ditutup, slot-nya kembali
+    session = FakeSession([403, 200])
+    resp = retry.request(session, "GET", f"http://{host}/b.jpg", POLICY, stream=True)
+    assert session.calls == 2 and limiter.inflight == 1
+    resp.close()
+    assert limiter.inflight == 0
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+test_seen_filter.py - Snapshot Bloom seen-store: basi, sync inkremental, cek ke histori
+
+    python -m pytest -q test_seen_filter.py
+"""
+
+import sys
+import json
+
+import pytest
+
+import app
+import seen_filter
+from seen_filter import BloomFile, SeenFilter, SeenHistory, _stamp
+
+
+@pytest.fixture(autouse=True)
+def default_snapshot_path(monkeypatch):
+    monkeypatch.delenv("SEEN_FILTER_FILE", raising=False)
+
+
+def write_seen(path, ids):
+    path.write_text(json.dumps(sorted(ids)))
+
+
+def test_stale_snapshot_ignored(tmp_path):
+    seen_file = tmp_path / "seen_api.json"
+    write_seen(seen_file, {"lot-1"})
+    SeenFilter(str(seen_file)).sync({"lot-1"})
+    assert SeenFilter(str(seen_file)).usable
+
+    # penulis lain (engine.py, edit manual) mengubah seen-store tanpa update snapshot
+    write_seen(seen_file, {"lot-1", "lot-2", "lot-3"})
+    stale = SeenFilter(str(seen_file))
+    assert not stale.usable
+    # tanpa snapshot tidak ada yang "pasti baru": semua dicek ke histori
+    assert not stale.definitely_new("lot-2")
+    assert not stale.definitely_new("lot-99")
+
+
+def test_incremental_sync_adds_only_new_ids(tmp_path, monkeypatch):
+    seen_file = tmp_path / "seen_api.json"
+    seen = {f"lot-{i}" for i in range(100)}
+    write_seen(seen_file, seen)
+    SeenFilter(str(seen_file)).sync(seen)
+
+    # run berikutnya: histori di-load dari file yang sama dengan stamp snapshot
+    history = SeenHistory(lambda: set(json.loads(seen_file.read_text())), str(seen_file), background=False)
+    assert history.stamp == _stamp(str(seen_file))
+    filt = SeenFilter(str(seen_file))
+    before = filt.bloom.count
+
+    def no_rebuild(*a, **k):
+        raise AssertionError("snapshot dibangun ulang")
+
+    monkeypatch.setattr(BloomFile, "build", no_rebuild)
+    added = {"lot-100", "lot-101"}
+    seen = history.result() | added
+    write_seen(seen_file, seen)
+    filt.sync(seen, added, base=history.stamp)
+
+    assert filt.usable
+    assert filt.bloom.count == before + len(added)
+    assert filt.bloom.stamp() == _stamp(str(seen_file))
+    assert not any(filt.definitely_new(i) for i in seen)
+
+
+def test_snapshot_base_mismatch_rebuilds(tmp_path):
+    seen_file = tmp_path / "seen_api.json"
+    write_seen(seen_file, {"lot-1"})
+    SeenFilter(str(seen_file)).sync({"lot-1"})
+    # histori di-load dari seen-store yang sudah diubah penulis lain: snapshot
+    # (stamp lama) tidak memuat lot-2, jadi harus dibangun ulang, bukan ditambah lot-3 saja
+    write_seen(seen_file, {"lot-1", "lot-2"})
+    base = _stamp(str(seen_file))
+    write_seen(seen_file, {"lot-1", "lot-2", "lot-3"})
+    filt = SeenFilter(str(seen_file))
+    filt.sync({"lot-1", "lot-2", "lot-3"}, {"lot-3"}, base=base)
+    assert filt.bloom.count == 3
+    assert not filt.definitely_new("lot-2")
+
+
+def test_snapshot_positive_checked_against_history(tmp_path, monkeypatch):
+    seen_file = tmp_path / "seen_api.json"
+    write_seen(seen_file, {"lot-old"})
+    # snapshot juga memuat lot-fp: positif palsu Bloom untuk lot yang belum pernah dikirim
+    BloomFile.build(seen_filter.default_path(str(seen_file)), ["lot-old", "lot-fp"], 2, _stamp(str(seen_file))).close()
+    snapshot = SeenFilter(str(seen_file))
+    assert snapshot.usable and not snapshot.definitely_new("lot-fp") and snapshot.definitely_new("lot-new")
+    snapshot.bloom.close()
+    catalog = [{"lotLelangId": i, "namaLotLelang": i} for i in ("lot-old", "lot-fp", "lot-new")]
+
+    monkeypatch.setattr(app, "SEEN_FILE", str(seen_file))
+    monkeypatch.setattr(app, "QUEUE_FILE", str(tmp_path / "outbox.sqlite3"))
+    monkeypatch.setattr(app, "ARCHIVE_FILE", "")
+    monkeypatch.setattr(app, "REMINDER_OFFSETS", [])
+    monkeypatch.setattr(app, "DEDUPE", None)
+    monkeypatch.setattr(app, "FRESHNESS", None)
+    monkeypatch.setattr(app, "use_digest", lambda n: False)
+    monkeypatch.setattr(app, "coordinator_from_env", lambda: None)
+    monkeypatch.setattr(app, "fetch_list", lambda session, url: [dict(lot) for lot in catalog])
+    monkeypatch.setattr(app, "attach_media", lambda session, job, outbox: job)
+    monkeypatch.setattr(app, "prepare_lot", lambda session, lot, archive=None, planner=None: {"lot_id": lot["lotLelangId"]})
+    queued = []
+    monkeypatch.setattr(app, "enqueue_lot", lambda job, outbox, reminders=None: queued.append(job["lot_id"]) or True)
+    monkeypatch.setattr(sys, "argv", ["app.py", "--fetch-only"])
+    monkeypatch.setenv("FETCH_PLAN_FILE", str(tmp_path / "fetch_plan.json"))
+
+    app.main()
+
+    # lot-old positif di snapshot dan ada di histori -> dilewati;
+    # lot-fp positif di snapshot tapi tidak ada di histori -> tetap dikirim
+    assert sorted(queued) == ["lot-fp", "lot-new"]
+    assert set(json.loads(seen_file.read_text())) == {"lot-old", "lot-fp", "lot-new"}
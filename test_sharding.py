@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+test_sharding.py - Klaim lot lintas worker dan penanda seed shard
+
+    python -m pytest -q test_sharding.py
+"""
+
+import sys
+import json
+
+import pytest
+
+import app
+from sharding import SQLiteCoordinator, Target, seed_marker
+
+LOT = {"lotLelangId": "lot-1", "namaLotLelang": "Satu unit mobil", "namaUnitKerja": "KPKNL Surakarta"}
+
+
+@pytest.fixture
+def coordinator(tmp_path):
+    return SQLiteCoordinator(str(tmp_path / "coord.sqlite3"))
+
+
+@pytest.fixture
+def run_main(tmp_path, monkeypatch, coordinator):
+    """app.main() against one catalog lot; returns a function running one cron pass."""
+    seen_file = tmp_path / "seen_api.json"
+    seen_file.write_text("[]")
+    monkeypatch.setattr(app, "SEEN_FILE", str(seen_file))
+    monkeypatch.setattr(app, "QUEUE_FILE", str(tmp_path / "outbox.sqlite3"))
+    monkeypatch.setattr(app, "ARCHIVE_FILE", "")
+    monkeypatch.setattr(app, "REMINDER_OFFSETS", [])
+    monkeypatch.setattr(app, "DEDUPE", None)
+    monkeypatch.setattr(app, "FRESHNESS", None)
+    monkeypatch.setattr(app, "use_digest", lambda n: False)
+    monkeypatch.setattr(app, "coordinator_from_env", lambda: coordinator)
+    monkeypatch.setattr(app, "fetch_list", lambda session, url: [dict(LOT)])
+    monkeypatch.setattr(app, "attach_media", lambda session, job, outbox: job)
+    monkeypatch.setattr(sys, "argv", ["app.py", "--fetch-only"])
+    monkeypatch.setenv("FETCH_PLAN_FILE", str(tmp_path / "fetch_plan.json"))
+    # shard sudah di-seed sebelumnya: lot di katalog adalah lot baru
+    coordinator.mark_seeded(seed_marker(Target("default", url=app.API_URL)), "earlier")
+
+    def once(prepare, enqueue):
+        monkeypatch.setattr(app, "prepare_lot", prepare)
+        monkeypatch.setattr(app, "enqueue_lot", enqueue)
+        app.main()
+        return set(json.loads(seen_file.read_text()))
+
+    return once
+
+
+def job_for(session, lot, archive=None, planner=None):
+    return {"lot_id": str(lot["lotLelangId"]), "lot": lot}
+
+
+def failing_stage(session, lot, archive=None, planner=None):
+    raise RuntimeError("detail gagal")
+
+
+@pytest.mark.parametrize("failure", ["enqueue-false", "stage-error"])
+def test_failed_lot_releases_claim(run_main, coordinator, failure):
+    if failure == "enqueue-false":
+        seen = run_main(job_for, lambda job, outbox, reminders=None: False)
+    else:
+        seen = run_main(failing_stage, lambda job, outbox, reminders=None: True)
+    assert "lot-1" not in seen
+    # klaim sudah dilepas: run berikutnya boleh mengklaim dan mengirim lagi
+    queued = []
+    seen = run_main(job_for, lambda job, outbox, reminders=None: queued.append(job["lot_id"]) or True)
+    assert queued == ["lot-1"]
+    assert "lot-1" in seen
+    assert not coordinator.claim("lot-1", "other-worker")
+
+
+def test_seed_marker_survives_purge(coordinator):
+    marker = seed_marker(Target("kpknl-a"))
+    assert coordinator.mark_seeded(marker, "w1")
+    assert not coordinator.mark_seeded(marker, "w2")
+    coordinator.claim("lot-old", "w1")
+    coordinator.purge(keep_days=-1)
+    assert coordinator.claim("lot-old", "w2")
+    assert not coordinator.mark_seeded(marker, "w3")
+
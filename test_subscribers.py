@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+test_subscribers.py - Filter subscriber dicocokkan sebelum fetch detail
+
+    python -m pytest -q test_subscribers.py
+"""
+
+import pytest
+
+import app
+from subscribers import Subscriber, SubscriberRegistry
+
+DETAIL = {"content": {"barangs": [{"nama": "Toyota Avanza", "nomorRangka": "MHKM1BA3JFK012345"}]}}
+
+
+@pytest.fixture
+def fetched(monkeypatch):
+    monkeypatch.setattr(app, "DEDUPE", None)
+    monkeypatch.setattr(app, "FRESHNESS", None)
+    calls = []
+
+    def fetch_detail(session, lot_id, referer=None, planner=None):
+        calls.append(lot_id)
+        return DETAIL if lot_id == "lot-3" else {"content": {"barangs": [{"nama": "Tanah SHM"}]}}
+
+    monkeypatch.setattr(app, "fetch_detail", fetch_detail)
+    monkeypatch.setattr(app, "SUBSCRIBERS", SubscriberRegistry([
+        Subscriber("-100", rule={"instansi": ["kpknl surakarta"], "kategori": ["mobil"]}),
+        Subscriber("-200", rule={"keywords": ["avanza"]}),
+    ]))
+    return calls
+
+
+def test_no_possible_subscriber_skips_detail(fetched, monkeypatch):
+    lot = {"lotLelangId": "lot-1", "namaLotLelang": "Sebidang tanah", "namaUnitKerja": "KPKNL Semarang",
+           "namaKategori": "Tanah"}
+    # -200 tetap kandidat (keyword bisa muncul di barangs): detail di-fetch, lalu tidak cocok
+    job = app.prepare_lot(None, lot)
+    assert fetched == ["lot-1"]
+    assert job["chat_ids"] == []
+
+    # hanya rule instansi/kategori: item list sudah cukup untuk memastikan tidak cocok
+    monkeypatch.setattr(app, "SUBSCRIBERS", SubscriberRegistry([app.SUBSCRIBERS.subscribers[0]]))
+    job = app.prepare_lot(None, dict(lot, lotLelangId="lot-2"))
+    assert fetched == ["lot-1"]
+    assert job["chat_ids"] == [] and not job["detail"]
+
+
+def test_detail_only_keyword_still_matches(fetched):
+    lot = {"lotLelangId": "lot-3", "namaLotLelang": "Satu unit kendaraan", "namaUnitKerja": "KPKNL Semarang"}
+    job = app.prepare_lot(None, lot)
+    assert fetched == ["lot-3"]
+    assert job["chat_ids"] == ["-200"]